@@ -0,0 +1,212 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+from dataclasses import asdict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+from backend.benchmarks.fixtures import SCENARIOS, FixtureOptions, FixtureServer
+
+TARGETS = ("service", "history", "api", "sanitize")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m backend.benchmarks",
+        description=(
+            "Capture synthetic pages from a local fixture server and report latency percentiles, "
+            "throughput, peak RSS and bytes on disk. Runs offline; results are written as JSON."
+        ),
+    )
+    parser.add_argument("--targets", default=",".join(TARGETS), help=f"Comma-separated subset of {', '.join(TARGETS)}.")
+    parser.add_argument(
+        "--scenarios",
+        default=",".join(SCENARIOS),
+        help=f"Page types for the service/api targets: {', '.join(SCENARIOS)}.",
+    )
+    parser.add_argument("--concurrency", default="1,8,32", help="Comma-separated concurrency levels (default: 1,8,32).")
+    parser.add_argument("--requests", type=int, default=50, help="Operations per scenario and level (default: 50).")
+    parser.add_argument("--article-mb", type=float, default=2.0, help="Size of article pages in MB (default: 2).")
+    parser.add_argument("--slow-delay", type=float, default=0.5, help="Seconds before slow pages answer.")
+    parser.add_argument("--assets-per-page", type=int, default=200, help="Images on asset-heavy pages (default: 200).")
+    parser.add_argument("--history-rows", type=int, default=50_000, help="Rows queried by the history list benchmark.")
+    parser.add_argument("--compression", default="", help='Precompressed copies to write, e.g. "gzip" or "br,gzip".')
+    parser.add_argument("--browser", action="store_true", help="Escalate SPA shells to Chromium (needs Playwright).")
+    parser.add_argument("--output", type=Path, help="Result file (default: data/benchmarks/bench-<timestamp>.json).")
+    parser.add_argument("--compare", type=Path, help="Earlier result file to print the differences against.")
+    parser.add_argument("--workdir", type=Path, help="Where snapshots are written (default: a temporary directory).")
+    parser.add_argument("--keep", action="store_true", help="Keep the working directory afterwards.")
+    parser.add_argument("--verbose", action="store_true", help="Show the service's own log output.")
+    return parser.parse_args()
+
+
+def _split(value: str) -> list[str]:
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def configure_environment(workdir: Path, compression: list[str], browser: bool) -> None:
+    """Point the application's settings at ``workdir``; must run before ``backend.core.config`` is imported."""
+    api_dir = workdir / "api"
+    os.environ.update(
+        {
+            "SNAPSHOT_ROOT": str(api_dir / "snapshots"),
+            "CATALOG_DB": str(api_dir / "catalog.sqlite3"),
+            "HISTORY_DB": str(api_dir / "history.sqlite3"),
+            "HISTORY_FILE": str(api_dir / "history.jsonl"),
+            "JOB_QUEUE_FILE": str(api_dir / "jobs.sqlite3"),
+            "STORAGE_BACKEND": "local",
+            "SNAPSHOT_COMPRESSION": json.dumps(compression),
+            "JOB_WORKERS": "0",
+            # Every fixture page is on one host; politeness limits would measure nothing but the limiter.
+            "HOST_RATE_LIMIT": "0",
+            "BROWSER_HOST_RATE_LIMIT": "0",
+            "CAPTURE_CACHE_TTL": "0",
+        }
+    )
+    if not browser:
+        os.environ["RENDER_CLASSIFIER"] = "false"
+        os.environ["JS_HEAVY_HOSTS"] = "[]"
+
+
+async def run(args: argparse.Namespace, workdir: Path) -> list:
+    # Imported late so the settings pick up configure_environment().
+    from backend.benchmarks.targets import (
+        HISTORY_SCENARIOS,
+        api_client,
+        bench_api,
+        bench_history,
+        bench_sanitize,
+        bench_service,
+    )
+
+    targets = _split(args.targets)
+    scenarios = _split(args.scenarios)
+    levels = [int(level) for level in _split(args.concurrency)]
+    compression = _split(args.compression)
+    options = FixtureOptions(
+        article_bytes=int(args.article_mb * 1024 * 1024),
+        slow_delay=args.slow_delay,
+        assets_per_page=args.assets_per_page,
+    )
+    results = []
+    with FixtureServer(options) as server:
+        if "service" in targets:
+            for scenario in scenarios:
+                for level in levels:
+                    results.append(
+                        _report(
+                            await bench_service(
+                                server, scenario, args.requests, level, workdir, compression, args.browser
+                            )
+                        )
+                    )
+        if "history" in targets:
+            for scenario in HISTORY_SCENARIOS:
+                for level in levels:
+                    results.append(
+                        _report(await bench_history(scenario, args.requests, level, workdir, args.history_rows))
+                    )
+        if "api" in targets:
+            async with api_client() as client:
+                for scenario in scenarios:
+                    for level in levels:
+                        results.append(
+                            _report(
+                                await bench_api(client, server, scenario, args.requests, level, workdir / "api")
+                            )
+                        )
+    if "sanitize" in targets:
+        for scenario in scenarios:
+            for result in await bench_sanitize(options, scenario, args.requests, workdir / "sanitize"):
+                results.append(_report(result))
+    return results
+
+
+def _report(result):
+    rss = f"{result.peak_rss_bytes / 1024 / 1024:.0f} MB" if result.peak_rss_bytes else "n/a"
+    print(
+        f"{result.target:<8} {result.scenario:<8} c={result.concurrency:<4} "
+        f"p50={result.latency['p50'] * 1000:8.1f}ms p95={result.latency['p95'] * 1000:8.1f}ms "
+        f"p99={result.latency['p99'] * 1000:8.1f}ms {result.pages_per_second:8.1f}/s "
+        f"rss={rss:>7} disk={result.bytes_on_disk / 1024 / 1024:8.2f} MB failures={result.failures}",
+        flush=True,
+    )
+    return result
+
+
+def compare(current: list[dict], baseline_path: Path) -> None:
+    baseline = {
+        (item["target"], item["scenario"], item["concurrency"]): item
+        for item in json.loads(baseline_path.read_text(encoding="utf-8"))["results"]
+    }
+    print(f"\nCompared with {baseline_path}:")
+    for item in current:
+        before = baseline.get((item["target"], item["scenario"], item["concurrency"]))
+        if before is None:
+            continue
+        print(
+            f"{item['target']:<8} {item['scenario']:<8} c={item['concurrency']:<4} "
+            f"p50 {_delta(before['latency']['p50'], item['latency']['p50'])}  "
+            f"p95 {_delta(before['latency']['p95'], item['latency']['p95'])}  "
+            f"p99 {_delta(before['latency']['p99'], item['latency']['p99'])}  "
+            f"throughput {_delta(before['pages_per_second'], item['pages_per_second'])}"
+        )
+
+
+def _delta(before: float, after: float) -> str:
+    if not before:
+        return f"{after:g} (new)"
+    return f"{(after - before) / before * 100:+6.1f}%"
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        completed = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True, timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return completed.stdout.strip() or None
+
+
+def main() -> int:
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    workdir = args.workdir or Path(tempfile.mkdtemp(prefix="pagecopy-bench-"))
+    workdir.mkdir(parents=True, exist_ok=True)
+    configure_environment(workdir.resolve(), _split(args.compression), args.browser)
+    started_at = datetime.now(timezone.utc)
+    try:
+        results = [asdict(result) for result in asyncio.run(run(args, workdir.resolve()))]
+    finally:
+        if not args.keep and args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    output = args.output or Path("data") / "benchmarks" / f"bench-{started_at:%Y%m%dT%H%M%SZ}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    report = {
+        "created_at": started_at.isoformat(),
+        "git_commit": _git_commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "options": {key: str(value) if isinstance(value, Path) else value for key, value in vars(args).items()},
+        "results": results,
+    }
+    output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(f"[+] Results written to {output}")
+    if args.compare:
+        compare(results, args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
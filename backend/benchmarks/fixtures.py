@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import multiprocessing
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+SCENARIOS = ("static", "article", "scripts", "spa", "slow", "chunked", "assets")
+
+_WORDS = (
+    "snapshot archive capture render page browser network latency history asset stylesheet image font "
+    "request response header cookie session storage index batch queue worker concurrency throughput"
+).split()
+
+
+@dataclass(frozen=True, slots=True)
+class FixtureOptions:
+    article_bytes: int = 2 * 1024 * 1024
+    slow_delay: float = 0.5
+    chunk_count: int = 20
+    chunk_delay: float = 0.02
+    assets_per_page: int = 200
+
+
+class FixtureServer:
+    """Serves synthetic pages from a child process on 127.0.0.1.
+
+    Pages live at ``/<scenario>/<n>.html``; ``n`` only changes the title, so
+    every URL is a distinct snapshot of the same shape. Running in its own
+    process keeps the server out of the measured RSS and off the event loop.
+    """
+
+    def __init__(self, options: FixtureOptions = FixtureOptions()) -> None:
+        self.options = options
+        self.base_url = ""
+        self._process: Optional[multiprocessing.Process] = None
+
+    def __enter__(self) -> FixtureServer:
+        context = multiprocessing.get_context("spawn")
+        ready = context.Queue()
+        self._process = context.Process(target=_serve, args=(self.options, ready), daemon=True)
+        self._process.start()
+        port = ready.get(timeout=30)
+        self.base_url = f"http://127.0.0.1:{port}"
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        if self._process is not None:
+            self._process.terminate()
+            self._process.join(timeout=5)
+            self._process = None
+
+    def url(self, scenario: str, index: object) -> str:
+        return f"{self.base_url}/{scenario}/{index}.html"
+
+
+def _serve(options: FixtureOptions, ready: multiprocessing.Queue) -> None:
+    handler = type("FixtureHandler", (_FixtureHandler,), {"options": options, "pages": _Pages(options)})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    ready.put(server.server_address[1])
+    server.serve_forever()
+
+
+class _FixtureHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out as separate writes; without this Nagle adds ~40 ms per response.
+    disable_nagle_algorithm = True
+    options: FixtureOptions
+    pages: _Pages
+
+    def do_GET(self) -> None:  # noqa: N802 - http.server naming
+        parts = self.path.split("?", 1)[0].strip("/").split("/")
+        if len(parts) == 2 and parts[0] == "asset":
+            body, content_type = self.pages.asset(parts[1])
+            if body is None:
+                self._send(404, b"not found", "text/plain")
+            else:
+                self._send(200, body, content_type)
+            return
+        if len(parts) != 2 or parts[0] not in SCENARIOS or not parts[1].endswith(".html"):
+            self._send(404, b"not found", "text/plain")
+            return
+        scenario, index = parts[0], parts[1].removesuffix(".html")
+        if scenario == "slow":
+            time.sleep(self.options.slow_delay)
+        if scenario == "chunked":
+            self._send_chunked(self.pages.page("chunked", index))
+        else:
+            self._send(200, self.pages.page(scenario, index), "text/html; charset=utf-8")
+
+    def _send(self, status: int, body: bytes, content_type: str) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_chunked(self, body: bytes) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        size = max(1, -(-len(body) // max(1, self.options.chunk_count)))
+        for start in range(0, len(body), size):
+            chunk = body[start : start + size]
+            self.wfile.write(f"{len(chunk):x}\r\n".encode("ascii") + chunk + b"\r\n")
+            self.wfile.flush()
+            time.sleep(self.options.chunk_delay)
+        self.wfile.write(b"0\r\n\r\n")
+
+    def log_message(self, format: str, *args: object) -> None:
+        return None
+
+
+class _Pages:
+    def __init__(self, options: FixtureOptions) -> None:
+        self.options = options
+        # Bodies without their title; built once per scenario.
+        self._bodies: dict[str, str] = {}
+
+    def page(self, scenario: str, index: str) -> bytes:
+        body = self._bodies.get(scenario)
+        if body is None:
+            body = self._bodies[scenario] = getattr(self, f"_{scenario}")()
+        return (
+            f"<!DOCTYPE html><html><head><meta charset=\"utf-8\"><title>{scenario} {index}</title></head>"
+            f"<body>{body}</body></html>"
+        ).encode("utf-8")
+
+    def asset(self, name: str) -> tuple[Optional[bytes], str]:
+        stem, _, suffix = name.partition(".")
+        if not stem.isdigit() or suffix not in ("png", "css"):
+            return None, ""
+        index = int(stem)
+        if suffix == "css":
+            return f".a{index}{{background:url(/asset/{index}.png)}}\n".encode("ascii") * 40, "text/css"
+        # A mix of inlined (< 4 KB) and stored images, deterministic per index.
+        size = 1024 if index % 4 == 0 else 8 * 1024 + (index % 7) * 1024
+        seed = hashlib.sha256(str(index).encode("ascii")).digest()
+        return b"\x89PNG\r\n\x1a\n" + (seed * (size // len(seed) + 1))[:size], "image/png"
+
+    def _static(self) -> str:
+        return _paragraphs(3 * 1024)
+
+    def _slow(self) -> str:
+        return _paragraphs(3 * 1024)
+
+    def _chunked(self) -> str:
+        return _paragraphs(80 * 1024)
+
+    def _article(self) -> str:
+        return _paragraphs(self.options.article_bytes, headings=True)
+
+    def _scripts(self) -> str:
+        # Server-rendered pages (WeChat articles among them) ship most of their bytes as inline JSON state.
+        state = json.dumps(
+            [{"id": index, "title": " ".join(_WORDS[index % 20 : index % 20 + 6])} for index in range(200)]
+        )
+        scripts = self.options.article_bytes * 3 // 4
+        repeat = max(1, scripts // 8 // len(state))
+        parts = [f"<script>window.__state{index}=[{','.join([state] * repeat)}];</script>" for index in range(8)]
+        text = _paragraphs(self.options.article_bytes // 4 // 8)
+        return "".join(part + text for part in parts)
+
+    def _spa(self) -> str:
+        # A client-rendered shell: empty mount point, a bundle and no text.
+        bundle = "var state={};function render(n){return n*2}" * 1200
+        return f'<div id="root"></div><script>{bundle}</script><script src="/static/js/main.js"></script>'
+
+    def _assets(self) -> str:
+        count = self.options.assets_per_page
+        links = "".join(f'<link rel="stylesheet" href="/asset/{i}.css">' for i in range(max(1, count // 20)))
+        images = "".join(f'<img src="/asset/{i}.png" alt="image {i}">' for i in range(count))
+        return links + _paragraphs(2 * 1024) + images
+
+
+def fixture_page(options: FixtureOptions, scenario: str, index: object = 0) -> bytes:
+    """The page the fixture server serves at ``/<scenario>/<index>.html``, built in-process."""
+    return _Pages(options).page(scenario, str(index))
+
+
+def _paragraphs(target_bytes: int, headings: bool = False) -> str:
+    parts: list[str] = []
+    size = 0
+    index = 0
+    while size < target_bytes:
+        if headings and index % 12 == 0:
+            parts.append(f"<h2>Section {index // 12 + 1}</h2>")
+        words = " ".join(_WORDS[(index * 7 + offset) % len(_WORDS)] for offset in range(60))
+        parts.append(f"<p>{words}.</p>")
+        size += len(parts[-1])
+        index += 1
+    return "".join(parts)
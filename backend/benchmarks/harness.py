@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import asyncio
+import math
+import os
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Awaitable, Callable, Optional
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - Windows
+    resource = None
+
+_STATUS_FILE = Path("/proc/self/status")
+_CLEAR_REFS_FILE = Path("/proc/self/clear_refs")
+
+
+@dataclass(slots=True)
+class BenchmarkResult:
+    target: str
+    scenario: str
+    concurrency: int
+    requests: int
+    failures: int
+    wall_seconds: float
+    # Seconds: p50, p95, p99, mean, max.
+    latency: dict[str, float]
+    # Successful operations per second (pages for capture targets, records for history).
+    pages_per_second: float
+    peak_rss_bytes: Optional[int]
+    bytes_on_disk: int
+    errors: dict[str, int] = field(default_factory=dict)
+
+    @property
+    def key(self) -> tuple[str, str, int]:
+        return self.target, self.scenario, self.concurrency
+
+
+async def measure(
+    target: str,
+    scenario: str,
+    operation: Callable[[int], Awaitable[None]],
+    requests: int,
+    concurrency: int,
+    data_dir: Path,
+) -> BenchmarkResult:
+    """Run ``operation(0..requests-1)`` with ``concurrency`` workers and time each call."""
+    latencies: list[float] = []
+    errors: dict[str, int] = {}
+    next_index = 0
+
+    async def worker() -> None:
+        nonlocal next_index
+        while next_index < requests:
+            index = next_index
+            next_index += 1
+            started = time.perf_counter()
+            try:
+                await operation(index)
+            except Exception as exc:  # noqa: BLE001 - failures are part of the result
+                name = type(exc).__name__
+                errors[name] = errors.get(name, 0) + 1
+            else:
+                latencies.append(time.perf_counter() - started)
+
+    disk_before = disk_usage(data_dir)
+    reset_peak_rss()
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    wall = time.perf_counter() - started
+    return BenchmarkResult(
+        target=target,
+        scenario=scenario,
+        concurrency=concurrency,
+        requests=requests,
+        failures=sum(errors.values()),
+        wall_seconds=round(wall, 4),
+        latency=summarize(latencies),
+        pages_per_second=round(len(latencies) / wall, 2) if wall > 0 else 0.0,
+        peak_rss_bytes=peak_rss(),
+        bytes_on_disk=disk_usage(data_dir) - disk_before,
+        errors=errors,
+    )
+
+
+def summarize(latencies: list[float]) -> dict[str, float]:
+    if not latencies:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "mean": 0.0, "max": 0.0}
+    ordered = sorted(latencies)
+    return {
+        "p50": round(percentile(ordered, 50), 5),
+        "p95": round(percentile(ordered, 95), 5),
+        "p99": round(percentile(ordered, 99), 5),
+        "mean": round(sum(ordered) / len(ordered), 5),
+        "max": round(ordered[-1], 5),
+    }
+
+
+def percentile(ordered: list[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def reset_peak_rss() -> None:
+    """Start a new peak-RSS window where the kernel allows it (Linux); otherwise peaks are cumulative."""
+    try:
+        _CLEAR_REFS_FILE.write_text("5")
+    except OSError:
+        pass
+
+
+def peak_rss() -> Optional[int]:
+    try:
+        for line in _STATUS_FILE.read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def disk_usage(path: Path) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.stat(os.path.join(root, name)).st_size
+            except OSError:
+                continue
+    return total
@@ -0,0 +1,207 @@
+from __future__ import annotations
+
+import re
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import AsyncIterator, Sequence
+
+import httpx
+
+from backend.benchmarks.fixtures import FixtureOptions, FixtureServer, fixture_page
+from backend.benchmarks.harness import BenchmarkResult, measure
+from backend.services.asset_archiver import AssetArchiver
+from backend.services.blob_store import BlobStore
+from backend.services.browser_renderer import BrowserRenderer
+from backend.services.history_repository import HistoryEntry, HistoryRepository
+from backend.services.html_sanitizer import sanitize_chunks
+from backend.services.render_classifier import RenderClassifier
+from backend.services.snapshot_service import SnapshotService
+
+HISTORY_SCENARIOS = ("append", "list")
+
+_SNAPSHOT_BASE_URL = "http://bench.invalid/snapshots"
+_HISTORY_HOSTS = 50
+_PREFILL_BATCH = 5000
+# Decoded text handed to the sanitizer per feed() call.
+_SANITIZE_CHUNK_CHARS = 64 * 1024
+
+
+class CaptureFailed(Exception):
+    """The API answered, but the capture itself failed."""
+
+
+async def bench_service(
+    server: FixtureServer,
+    scenario: str,
+    requests: int,
+    concurrency: int,
+    workdir: Path,
+    compression: Sequence[str] = (),
+    browser: bool = False,
+) -> BenchmarkResult:
+    """``SnapshotService.create_snapshot`` on its own: no rate limits, no capture cache, a fresh store per run."""
+    run_dir = workdir / "service" / f"{scenario}-c{concurrency}"
+    snapshot_root = run_dir / "snapshots"
+    blob_store = BlobStore(snapshot_root, run_dir / "catalog.sqlite3", compression=compression)
+    renderer = BrowserRenderer(max_concurrency=concurrency, queue_size=requests) if browser else None
+    classifier = RenderClassifier(run_dir / "catalog.sqlite3") if browser else None
+    archiver = AssetArchiver(blob_store, _SNAPSHOT_BASE_URL) if scenario == "assets" else None
+    service = SnapshotService(
+        snapshot_root=snapshot_root,
+        snapshot_base_url=_SNAPSHOT_BASE_URL,
+        request_timeout=120.0,
+        browser_renderer=renderer,
+        blob_store=blob_store,
+        http_max_connections=max(100, concurrency),
+        http_max_keepalive_connections=max(20, concurrency),
+        asset_archiver=archiver,
+        render_classifier=classifier,
+    )
+
+    async def capture(index: int) -> None:
+        await service.create_snapshot(server.url(scenario, index))
+
+    await service.startup()
+    try:
+        return await measure("service", scenario, capture, requests, concurrency, run_dir)
+    finally:
+        await service.aclose()
+        if renderer is not None:
+            await renderer.close()
+        if classifier is not None:
+            classifier.close()
+        blob_store.close()
+
+
+async def bench_history(
+    scenario: str,
+    requests: int,
+    concurrency: int,
+    workdir: Path,
+    prefill_rows: int = 50_000,
+) -> BenchmarkResult:
+    """``append`` writes one record per call; ``list`` pages through a table of ``prefill_rows`` with filters."""
+    run_dir = workdir / "history" / f"{scenario}-c{concurrency}"
+    run_dir.mkdir(parents=True, exist_ok=True)
+    repository = HistoryRepository(run_dir / "history.sqlite3")
+    try:
+        if scenario == "append":
+
+            async def operation(index: int) -> None:
+                await repository.append([_history_entry(index)])
+
+        else:
+            for start in range(0, prefill_rows, _PREFILL_BATCH):
+                await repository.append(
+                    _history_entry(index) for index in range(start, min(prefill_rows, start + _PREFILL_BATCH))
+                )
+            queries = (
+                {},
+                {"status": "failed"},
+                {"host": "host-7.bench.invalid"},
+                {"url_prefix": "https://host-3.bench.invalid/articles/1"},
+                {"cursor": max(1, prefill_rows // 2)},
+            )
+
+            async def operation(index: int) -> None:
+                await repository.list_page(50, **queries[index % len(queries)])
+
+        return await measure("history", scenario, operation, requests, concurrency, run_dir)
+    finally:
+        repository.close()
+
+
+async def bench_sanitize(
+    options: FixtureOptions,
+    scenario: str,
+    requests: int,
+    workdir: Path,
+) -> list[BenchmarkResult]:
+    """The streaming sanitizer (``sanitize``) and the regex pipeline it replaced (``regex``) on one fixture page.
+
+    Both are pure CPU work on the event loop thread, so they only run at concurrency 1.
+    """
+    html = fixture_page(options, scenario).decode("utf-8")
+    url = f"https://bench.invalid/{scenario}/0.html"
+    chunks = [html[start : start + _SANITIZE_CHUNK_CHARS] for start in range(0, len(html), _SANITIZE_CHUNK_CHARS)]
+    workdir.mkdir(parents=True, exist_ok=True)
+
+    async def streaming(index: int) -> None:
+        for _ in sanitize_chunks(chunks, url):
+            pass
+
+    async def regex(index: int) -> None:
+        _regex_sanitize(html, url)
+
+    return [
+        await measure("sanitize", scenario, streaming, requests, 1, workdir),
+        await measure("regex", scenario, regex, requests, 1, workdir),
+    ]
+
+
+def _regex_sanitize(html: str, url: str) -> str:
+    # SnapshotService._sanitize_html before the streaming sanitizer, kept as the reference point.
+    base_tag = f'<base href="{url}" />'
+    pattern = re.compile(r"(<head[^>]*>)", re.IGNORECASE)
+    if pattern.search(html):
+        html = pattern.sub(rf"\1\n    {base_tag}", html, count=1)
+    else:
+        html = f"<head>{base_tag}</head>\n{html}"
+    return re.compile(r"<script\b[^>]*>.*?</script>", re.IGNORECASE | re.DOTALL).sub("", html)
+
+
+@asynccontextmanager
+async def api_client() -> AsyncIterator[httpx.AsyncClient]:
+    """The real application, configured from the environment, behind an in-process transport."""
+    from backend.dependencies import shutdown_dependencies, startup_dependencies
+    from backend.main import create_app
+
+    app = create_app()
+    await startup_dependencies()
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench.invalid", timeout=None) as client:
+            yield client
+    finally:
+        await shutdown_dependencies()
+
+
+async def bench_api(
+    client: httpx.AsyncClient,
+    server: FixtureServer,
+    scenario: str,
+    requests: int,
+    concurrency: int,
+    data_dir: Path,
+) -> BenchmarkResult:
+    """``POST /api/snapshots`` with one URL per request, including history writes and batch limits."""
+
+    async def post(index: int) -> None:
+        # All runs share one store; distinct URLs keep earlier runs' snapshots from being deduplicated.
+        url = server.url(scenario, f"c{concurrency}-{index}")
+        response = await client.post("/api/snapshots", json={"urls": [url]})
+        response.raise_for_status()
+        item = response.json()["results"][0]
+        if item["status"] != "success":
+            raise CaptureFailed(item.get("error") or "capture failed")
+
+    return await measure("api", scenario, post, requests, concurrency, data_dir)
+
+
+def _history_entry(index: int) -> HistoryEntry:
+    host = f"host-{index % _HISTORY_HOSTS}.bench.invalid"
+    captured_at = datetime(2024, 1, 1, tzinfo=timezone.utc) + timedelta(seconds=index)
+    failed = index % 10 == 0
+    return HistoryEntry(
+        id=uuid.uuid4().hex,
+        original_url=f"https://{host}/articles/{index}",
+        archived_url=None if failed else f"{_SNAPSHOT_BASE_URL}/objects/{index:064x}.html",
+        archived_relative_url=None if failed else f"/snapshots/objects/{index:064x}.html",
+        status="failed" if failed else "success",
+        error="HTTP fetch failed with status 500." if failed else None,
+        captured_at=captured_at.isoformat(),
+        content_hash=None if failed else f"{index:064x}",
+        timings=None if failed else {"http_fetch": 0.12, "sanitize": 0.01, "write": 0.005, "total": 0.14},
+    )
@@ -3,20 +3,137 @@ from __future__ import annotations
 from datetime import datetime, timezone
 from functools import lru_cache
 from pathlib import Path
-from typing import List
+from typing import Dict, List, Literal, Optional
 
-from pydantic import Field
+from pydantic import BaseModel, Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
+class BrowserHostProfile(BaseModel):
+    """Per-host overrides for what the browser renderer blocks."""
+
+    # Replaces browser_blocked_resource_types when set.
+    blocked_resource_types: Optional[List[str]] = None
+    # Added to browser_blocked_domains.
+    blocked_domains: List[str] = Field(default_factory=list)
+    # Overrides browser_block_images when set.
+    block_images: Optional[bool] = None
+    # Stop waiting as soon as this CSS selector matches.
+    ready_selector: Optional[str] = None
+    settle_budget: Optional[float] = None
+    settle_quiet_ms: Optional[int] = None
+    max_scrolls: Optional[int] = None
+
+
+class HostRateLimit(BaseModel):
+    """Per-host request rates (requests per second); 0 disables throttling."""
+
+    http: Optional[float] = None
+    browser: Optional[float] = None
+
+
 class Settings(BaseSettings):
     snapshot_root: Path = Path("./data/snapshots")
     snapshot_base_url: str = "http://localhost:8000/snapshots"
+    # Bookkeeping for snapshot_root (blob reference counts); keep it outside the served directory.
+    catalog_db: Path = Path("./data/catalog.sqlite3")
+    # Precompressed copies written next to each snapshot, e.g. ["br", "gzip"] ("br" needs `pip install brotli`).
+    snapshot_compression: List[str] = Field(default_factory=list)
+    # When false only the compressed copies are kept (gzip is always among them).
+    snapshot_keep_uncompressed: bool = True
+    # Where snapshot files are stored: "local" (snapshot_root) or "s3" (needs `pip install boto3`).
+    storage_backend: Literal["local", "s3"] = "local"
+    # Turn off when several deployments share a bucket but not a catalog_db.
+    storage_delete_unreferenced: bool = True
+    s3_bucket: str = ""
+    s3_prefix: str = ""
+    # Set for MinIO and other S3-compatible services, e.g. http://minio:9000.
+    s3_endpoint_url: Optional[str] = None
+    s3_region: Optional[str] = None
+    # Fall back to the standard AWS credential chain when unset.
+    s3_access_key_id: Optional[str] = None
+    s3_secret_access_key: Optional[str] = None
+    s3_max_pool_connections: int = 32
+    s3_multipart_threshold: int = 8 * 1024 * 1024
+    s3_multipart_chunksize: int = 8 * 1024 * 1024
+    s3_upload_concurrency: int = 4
+    # Lifetime of the signed URLs /snapshots redirects to.
+    s3_presign_expiry: int = 3600
+    history_db: Path = Path("./data/history.sqlite3")
+    # Legacy JSONL history, imported into history_db once on first start.
     history_file: Path = Path("./data/history.jsonl")
     request_timeout: float = 20.0
+    http_max_connections: int = 100
+    http_max_keepalive_connections: int = 20
+    http_keepalive_expiry: float = 30.0
+    http2: bool = False
+    # Largest (decompressed) page body fetched over plain HTTP; bigger responses are rejected.
+    http_max_body_bytes: int = 20 * 1024 * 1024
+    # Download images/CSS/fonts into snapshot_root/assets and point snapshots at them.
+    asset_archiving: bool = False
+    asset_max_concurrency: int = 16
+    asset_per_host_concurrency: int = 4
+    asset_inline_max_bytes: int = 4096
+    asset_max_bytes: int = 10 * 1024 * 1024
+    # Politeness: token bucket per host, separately for plain HTTP and browser renders.
+    host_rate_limit: float = 2.0
+    host_rate_burst: int = 4
+    browser_host_rate_limit: float = 0.5
+    browser_host_rate_burst: int = 2
+    # JSON object of host -> HostRateLimit, e.g. {"mp.weixin.qq.com": {"http": 0.5, "browser": 0.2}}.
+    host_rate_limits: Dict[str, HostRateLimit] = Field(default_factory=dict)
+    http_max_retries: int = 3
+    http_retry_backoff: float = 1.0
+    # Retry-After (or backoff) longer than this fails the capture instead of waiting.
+    http_retry_max_delay: float = 60.0
+    # Identical concurrent captures always share one fetch; this also reuses a finished
+    # capture for that many seconds (0 disables). Requests can opt out with bypass_cache.
+    capture_cache_ttl: float = 0.0
+    capture_cache_max_entries: int = 1024
+    # Emit an OpenTelemetry span per capture stage (needs opentelemetry-api and a configured SDK).
+    otel_tracing: bool = False
     browser_timeout: float = 45.0
     playwright_headless: bool = True
     playwright_session_dir: Path | None = Path("./data/sessions")
+    browser_instances: int = 1
+    browser_max_pages: int = 200
+    browser_max_contexts: int = 8
+    browser_max_concurrency: int = 2
+    browser_queue_size: int = 16
+    browser_queue_timeout: float = 30.0
+    browser_per_host_limit: int = 2
+    # Playwright resource types aborted during renders; page.content() never needs them.
+    browser_blocked_resource_types: List[str] = Field(
+        default_factory=lambda: ["media", "font", "websocket", "eventsource", "manifest", "texttrack"]
+    )
+    # Ad and analytics hosts (and their subdomains) aborted during renders.
+    browser_blocked_domains: List[str] = Field(
+        default_factory=lambda: [
+            "google-analytics.com",
+            "googletagmanager.com",
+            "doubleclick.net",
+            "googlesyndication.com",
+            "hm.baidu.com",
+            "cnzz.com",
+            "umeng.com",
+        ]
+    )
+    # Also block images while rendering; ignored when asset_archiving is on.
+    browser_block_images: bool = False
+    # Scroll-and-settle after DOMContentLoaded; see SettleStrategy in browser_renderer.
+    browser_settle_budget: float = 15.0
+    browser_settle_quiet_ms: int = 800
+    browser_scroll_step_ms: int = 120
+    browser_max_scrolls: int = 200
+    # JSON object of host -> BrowserHostProfile, e.g. {"mp.weixin.qq.com": {"block_images": true}}.
+    browser_host_profiles: Dict[str, BrowserHostProfile] = Field(default_factory=dict)
+    job_queue_file: Path = Path("./data/jobs.sqlite3")
+    job_workers: int = 2
+    job_poll_interval: float = 2.0
+    job_lease_seconds: float = 900.0
+    job_max_attempts: int = 3
+    batch_max_concurrency: int = 8
+    batch_per_host_concurrency: int = 2
     cors_origins: List[str] = Field(
         default_factory=lambda: [
             "http://localhost:5173",
@@ -25,6 +142,15 @@ class Settings(BaseSettings):
         ]
     )
     js_heavy_hosts: List[str] = Field(default_factory=lambda: ["mp.weixin.qq.com"])
+    # Classify HTTP captures and escalate client-rendered shells to the browser,
+    # learning per host (js_heavy_hosts become the starting guess).
+    render_classifier: bool = True
+    render_min_samples: int = 5
+    render_explore_every: int = 20
+    # Full-text index (SQLite FTS5, in catalog_db) over snapshot titles and text, for /api/search.
+    search_index: bool = True
+    # Characters of page text indexed per snapshot; the rest is not searchable.
+    search_max_text_chars: int = 200_000
 
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8", extra="ignore")
 
@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import gzip
+import os
+import re
+import stat
+from mimetypes import guess_type
+from typing import TYPE_CHECKING, Iterator, Optional
+
+import anyio
+from starlette.concurrency import iterate_in_threadpool
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.responses import FileResponse, RedirectResponse, Response, StreamingResponse
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+if TYPE_CHECKING:
+    from backend.services.storage import StorageBackend
+
+# Precompressed variants sit next to the file they encode, in order of preference.
+PRECOMPRESSED_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+# objects/<ab>/<sha256>.html and assets/<ab>/<sha256>.<ext> never change once written.
+_CONTENT_ADDRESSED_RE = re.compile(r"^(?:objects|assets)/[0-9a-f]{2}/(?P<digest>[0-9a-f]{64})\.[A-Za-z0-9]+$")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+_STREAM_CHUNK = 64 * 1024
+
+
+class SnapshotStaticFiles(StaticFiles):
+    """``StaticFiles`` for ``snapshot_root`` that understands the blob store's layout.
+
+    Content-addressed files get a digest-based ETag and an immutable
+    ``Cache-Control``. The ETag is weak because the digest leaves out the
+    capture comment at the top of a snapshot, so ``If-Range`` goes by
+    ``Last-Modified``. When a ``.br``/``.gz`` sibling exists and the client
+    accepts that encoding, the precompressed bytes are sent as they are. Range
+    requests apply to whichever representation is sent. If only a compressed
+    copy was kept, clients that accept none of the encodings get the gzip copy
+    decompressed on the fly.
+
+    Everything else (legacy snapshots, directories) is served as before.
+    """
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        match = _CONTENT_ADDRESSED_RE.match(path.replace(os.sep, "/"))
+        if match is None or scope["method"] not in ("GET", "HEAD"):
+            return await super().get_response(path, scope)
+        request_headers = Headers(scope=scope)
+        accepted = _accepted_encodings(request_headers.get("accept-encoding", ""))
+        candidates = [
+            (encoding, path + suffix) for encoding, suffix in PRECOMPRESSED_SUFFIXES.items() if encoding in accepted
+        ]
+        candidates.append((None, path))
+        for encoding, candidate in candidates:
+            full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, candidate)
+            if stat_result is None or not stat.S_ISREG(stat_result.st_mode):
+                continue
+            headers = {
+                "etag": _weak_etag(match["digest"], encoding),
+                "cache-control": IMMUTABLE_CACHE_CONTROL,
+                "vary": "Accept-Encoding",
+            }
+            if encoding:
+                headers["content-encoding"] = encoding
+            response = FileResponse(
+                full_path,
+                stat_result=stat_result,
+                headers=headers,
+                media_type=guess_type(path)[0],
+            )
+            if self.is_not_modified(response.headers, request_headers):
+                return NotModifiedResponse(response.headers)
+            return response
+        return await self._decompressed_response(path, match["digest"], scope)
+
+    async def _decompressed_response(self, path: str, digest: str, scope: Scope) -> Response:
+        full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, path + PRECOMPRESSED_SUFFIXES["gzip"])
+        if stat_result is None or not stat.S_ISREG(stat_result.st_mode):
+            return await super().get_response(path, scope)
+        request_headers = Headers(scope=scope)
+        headers = {"etag": _weak_etag(digest), "cache-control": IMMUTABLE_CACHE_CONTROL, "vary": "Accept-Encoding"}
+        if self.is_not_modified(Headers(headers), request_headers):
+            return NotModifiedResponse(Headers(headers))
+        return StreamingResponse(
+            iterate_in_threadpool(_gunzip(full_path)),
+            headers=headers,
+            media_type=guess_type(path)[0],
+        )
+
+    def is_not_modified(self, response_headers: Headers, request_headers: Headers) -> bool:
+        # Starlette compares If-None-Match against a strong ETag only; ours are weak.
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match and response_headers.get("etag", "").startswith("W/"):
+            if if_none_match.strip() == "*":
+                return True
+            tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+            return response_headers["etag"].removeprefix("W/") in tags
+        return super().is_not_modified(response_headers, request_headers)
+
+
+class StorageRedirectFiles(StaticFiles):
+    """Answers ``/snapshots/<key>`` for remote storage with a redirect to a signed object URL.
+
+    The best precompressed copy the client accepts is chosen the same way as
+    in :class:`SnapshotStaticFiles`. The bytes are then served by the bucket
+    (or the CDN in front of it), not by the API process.
+    """
+
+    def __init__(self, storage: StorageBackend) -> None:
+        super().__init__(directory=None, check_dir=False)
+        self.storage = storage
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        if scope["method"] not in ("GET", "HEAD"):
+            raise HTTPException(status_code=405, headers={"Allow": "GET, HEAD"})
+        path = path.replace(os.sep, "/")
+        if not path or path == "." or ".." in path.split("/"):
+            raise HTTPException(status_code=404)
+        accepted = _accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+        candidates = [path + suffix for encoding, suffix in PRECOMPRESSED_SUFFIXES.items() if encoding in accepted]
+        for key in (*candidates, path):
+            if await self.storage.exists(key):
+                url = await self.storage.url_for(key)
+                if url is None:
+                    break
+                # The signed URL expires, so the redirect itself must not be cached for long.
+                return RedirectResponse(
+                    url,
+                    status_code=307,
+                    headers={"cache-control": "private, max-age=300", "vary": "Accept-Encoding"},
+                )
+        raise HTTPException(status_code=404)
+
+
+def _accepted_encodings(header: str) -> set[str]:
+    accepted: dict[str, float] = {}
+    for item in header.split(","):
+        name, _, params = item.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[name] = quality
+    wildcard = accepted.get("*")
+    return {
+        encoding
+        for encoding in PRECOMPRESSED_SUFFIXES
+        if accepted.get(encoding, wildcard if wildcard is not None else 0.0) > 0
+    }
+
+
+def _weak_etag(digest: str, encoding: Optional[str] = None) -> str:
+    return f'W/"{digest}{"-" + encoding if encoding else ""}"'
+
+
+def _gunzip(path: str) -> Iterator[bytes]:
+    with gzip.open(path, "rb") as handle:
+        while chunk := handle.read(_STREAM_CHUNK):
+            yield chunk
@@ -1,18 +1,182 @@
 from __future__ import annotations
 
+from dataclasses import replace
 from functools import lru_cache
+from typing import Optional
 
-from backend.core.config import settings
-from backend.services.browser_renderer import BrowserRenderer
+from backend.core.config import BrowserHostProfile, settings
+from backend.services.asset_archiver import AssetArchiver
+from backend.services.batch_runner import BatchRunner
+from backend.services.blob_store import BlobStore
+from backend.services.browser_renderer import BrowserRenderer, RenderProfile, RoutePolicy, SettleStrategy
+from backend.services.capture_cache import CaptureCache
 from backend.services.history_repository import HistoryRepository
+from backend.services.job_queue import JobQueue, JobWorkerPool
+from backend.services.rate_limiter import HostRateLimiter
+from backend.services.render_classifier import RenderClassifier
+from backend.services.search_index import SearchIndex
 from backend.services.snapshot_service import SnapshotService
+from backend.services.storage import LocalStorage, S3Storage, StorageBackend
+from backend.services.validator_store import ValidatorStore
 
 
 @lru_cache
-def _browser_renderer() -> BrowserRenderer:
+def get_browser_renderer() -> BrowserRenderer:
     return BrowserRenderer(
         headless=settings.playwright_headless,
         timeout_seconds=settings.browser_timeout,
+        instances=settings.browser_instances,
+        max_pages_per_browser=settings.browser_max_pages,
+        max_contexts=settings.browser_max_contexts,
+        max_concurrency=settings.browser_max_concurrency,
+        queue_size=settings.browser_queue_size,
+        queue_timeout=settings.browser_queue_timeout,
+        per_host_limit=settings.browser_per_host_limit,
+        profile=_render_profile(None),
+        host_profiles={host: _render_profile(profile) for host, profile in settings.browser_host_profiles.items()},
+    )
+
+
+def _render_profile(profile: Optional[BrowserHostProfile]) -> RenderProfile:
+    return RenderProfile(route_policy=_route_policy(profile), settle=_settle_strategy(profile))
+
+
+def _settle_strategy(profile: Optional[BrowserHostProfile]) -> SettleStrategy:
+    strategy = SettleStrategy(
+        budget_seconds=settings.browser_settle_budget,
+        quiet_ms=settings.browser_settle_quiet_ms,
+        step_ms=settings.browser_scroll_step_ms,
+        max_scrolls=settings.browser_max_scrolls,
+    )
+    if profile is None:
+        return strategy
+    overrides = {
+        "budget_seconds": profile.settle_budget,
+        "quiet_ms": profile.settle_quiet_ms,
+        "max_scrolls": profile.max_scrolls,
+        "ready_selector": profile.ready_selector,
+    }
+    return replace(strategy, **{key: value for key, value in overrides.items() if value is not None})
+
+
+def _route_policy(profile: Optional[BrowserHostProfile]) -> RoutePolicy:
+    resource_types = set(settings.browser_blocked_resource_types)
+    domains = set(settings.browser_blocked_domains)
+    block_images = settings.browser_block_images
+    if profile is not None:
+        if profile.blocked_resource_types is not None:
+            resource_types = set(profile.blocked_resource_types)
+        domains.update(profile.blocked_domains)
+        if profile.block_images is not None:
+            block_images = profile.block_images
+    # Keep images when archiving: lazy loaders often only swap in the real URL
+    # once the placeholder has loaded, and the archiver needs that URL.
+    if block_images and not settings.asset_archiving:
+        resource_types.add("image")
+    return RoutePolicy(
+        blocked_resource_types=frozenset(item.lower() for item in resource_types),
+        blocked_domains=frozenset(item.lower().lstrip(".") for item in domains),
+    )
+
+
+@lru_cache
+def get_storage() -> StorageBackend:
+    if settings.storage_backend == "s3":
+        return S3Storage(
+            settings.s3_bucket,
+            prefix=settings.s3_prefix,
+            endpoint_url=settings.s3_endpoint_url,
+            region=settings.s3_region,
+            access_key_id=settings.s3_access_key_id,
+            secret_access_key=settings.s3_secret_access_key,
+            scratch_dir=settings.snapshot_root / ".tmp",
+            max_pool_connections=settings.s3_max_pool_connections,
+            multipart_threshold=settings.s3_multipart_threshold,
+            multipart_chunksize=settings.s3_multipart_chunksize,
+            upload_concurrency=settings.s3_upload_concurrency,
+            presign_expiry=settings.s3_presign_expiry,
+        )
+    return LocalStorage(settings.snapshot_root)
+
+
+@lru_cache
+def get_blob_store() -> BlobStore:
+    return BlobStore(
+        settings.snapshot_root,
+        settings.catalog_db,
+        compression=settings.snapshot_compression,
+        keep_uncompressed=settings.snapshot_keep_uncompressed,
+        storage=get_storage(),
+        delete_unreferenced=settings.storage_delete_unreferenced,
+    )
+
+
+@lru_cache
+def get_validator_store() -> ValidatorStore:
+    return ValidatorStore(settings.catalog_db)
+
+
+@lru_cache
+def get_asset_archiver() -> Optional[AssetArchiver]:
+    if not settings.asset_archiving:
+        return None
+    return AssetArchiver(
+        blob_store=get_blob_store(),
+        asset_base_url=settings.snapshot_base_url,
+        max_concurrency=settings.asset_max_concurrency,
+        per_host_concurrency=settings.asset_per_host_concurrency,
+        inline_max_bytes=settings.asset_inline_max_bytes,
+        max_asset_bytes=settings.asset_max_bytes,
+    )
+
+
+@lru_cache
+def get_render_classifier() -> Optional[RenderClassifier]:
+    if not settings.render_classifier:
+        return None
+    return RenderClassifier(
+        settings.catalog_db,
+        js_heavy_hosts=settings.js_heavy_hosts,
+        min_samples=settings.render_min_samples,
+        explore_every=settings.render_explore_every,
+    )
+
+
+@lru_cache
+def get_search_index() -> Optional[SearchIndex]:
+    if not settings.search_index:
+        return None
+    # Hits are joined against the blob catalog, so it has to exist first.
+    get_blob_store()
+    return SearchIndex(settings.catalog_db, max_text_chars=settings.search_max_text_chars)
+
+
+@lru_cache
+def get_http_rate_limiter() -> HostRateLimiter:
+    return HostRateLimiter(
+        settings.host_rate_limit,
+        burst=settings.host_rate_burst,
+        host_rates={host: limit.http for host, limit in settings.host_rate_limits.items() if limit.http is not None},
+    )
+
+
+@lru_cache
+def get_browser_rate_limiter() -> HostRateLimiter:
+    return HostRateLimiter(
+        settings.browser_host_rate_limit,
+        burst=settings.browser_host_rate_burst,
+        host_rates={
+            host: limit.browser for host, limit in settings.host_rate_limits.items() if limit.browser is not None
+        },
+    )
+
+
+@lru_cache
+def get_capture_cache() -> CaptureCache:
+    return CaptureCache(
+        get_blob_store(),
+        ttl_seconds=settings.capture_cache_ttl,
+        max_entries=settings.capture_cache_max_entries,
     )
 
 
@@ -22,12 +186,79 @@ def get_snapshot_service() -> SnapshotService:
         snapshot_root=settings.snapshot_root,
         snapshot_base_url=settings.snapshot_base_url,
         request_timeout=settings.request_timeout,
-        browser_renderer=_browser_renderer(),
+        browser_renderer=get_browser_renderer(),
         js_heavy_hosts=settings.js_heavy_hosts,
         session_store=settings.playwright_session_dir,
+        blob_store=get_blob_store(),
+        validator_store=get_validator_store(),
+        http_max_connections=settings.http_max_connections,
+        http_max_keepalive_connections=settings.http_max_keepalive_connections,
+        http_keepalive_expiry=settings.http_keepalive_expiry,
+        http2=settings.http2,
+        max_body_bytes=settings.http_max_body_bytes,
+        asset_archiver=get_asset_archiver(),
+        render_classifier=get_render_classifier(),
+        http_rate_limiter=get_http_rate_limiter(),
+        browser_rate_limiter=get_browser_rate_limiter(),
+        http_max_retries=settings.http_max_retries,
+        http_retry_backoff=settings.http_retry_backoff,
+        http_retry_max_delay=settings.http_retry_max_delay,
+        capture_cache=get_capture_cache(),
+        search_index=get_search_index(),
+    )
+
+
+@lru_cache
+def get_batch_runner() -> BatchRunner:
+    return BatchRunner(
+        get_snapshot_service(),
+        max_concurrency=settings.batch_max_concurrency,
+        per_host_concurrency=settings.batch_per_host_concurrency,
     )
 
 
 @lru_cache
 def get_history_repository() -> HistoryRepository:
-    return HistoryRepository(settings.history_file)
+    return HistoryRepository(settings.history_db, legacy_file=settings.history_file)
+
+
+@lru_cache
+def get_job_queue() -> JobQueue:
+    return JobQueue(
+        settings.job_queue_file,
+        lease_seconds=settings.job_lease_seconds,
+        max_attempts=settings.job_max_attempts,
+    )
+
+
+@lru_cache
+def get_job_worker_pool() -> JobWorkerPool:
+    return JobWorkerPool(
+        get_job_queue(),
+        get_batch_runner(),
+        get_history_repository(),
+        concurrency=settings.job_workers,
+        poll_interval=settings.job_poll_interval,
+    )
+
+
+async def startup_dependencies() -> None:
+    await get_snapshot_service().startup()
+    get_job_worker_pool().start()
+
+
+async def shutdown_dependencies() -> None:
+    await get_job_worker_pool().stop()
+    await get_snapshot_service().aclose()
+    await get_browser_renderer().close()
+    get_job_queue().close()
+    get_history_repository().close()
+    get_blob_store().close()
+    await get_storage().aclose()
+    get_validator_store().close()
+    classifier = get_render_classifier()
+    if classifier is not None:
+        classifier.close()
+    search_index = get_search_index()
+    if search_index is not None:
+        search_index.close()
@@ -3,18 +3,37 @@ from __future__ import annotations
 import asyncio
 import logging
 import sys
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 
 from backend.core.config import settings
-from backend.routers import snapshots
+from backend.core.static_files import SnapshotStaticFiles, StorageRedirectFiles
+from backend.dependencies import (
+    get_browser_renderer,
+    get_storage,
+    shutdown_dependencies,
+    startup_dependencies,
+)
+from backend.routers import jobs, metrics, snapshots
+from backend.services import metrics as capture_metrics
+from backend.services.storage import LocalStorage
 
 if sys.platform.startswith("win"):
     asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
 
 
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    await startup_dependencies()
+    try:
+        yield
+    finally:
+        await shutdown_dependencies()
+
+
 def create_app() -> FastAPI:
     logging.basicConfig(
         level=logging.INFO,
@@ -24,6 +43,7 @@ def create_app() -> FastAPI:
         title="PageCopy Snapshot Service",
         description="Backend API for capturing and serving static HTML snapshots.",
         version="0.1.0",
+        lifespan=lifespan,
     )
 
     if settings.cors_origins:
@@ -36,17 +56,30 @@ def create_app() -> FastAPI:
         )
 
     settings.snapshot_root.mkdir(parents=True, exist_ok=True)
+    if settings.otel_tracing and not capture_metrics.enable_tracing():
+        logging.getLogger(__name__).warning("OTEL_TRACING is set but 'opentelemetry-api' is not installed")
 
     app.include_router(snapshots.router, prefix="/api")
+    app.include_router(jobs.router, prefix="/api")
+    app.include_router(metrics.router, prefix="/api")
+    storage = get_storage()
     app.mount(
         "/snapshots",
-        StaticFiles(directory=settings.snapshot_root, html=True),
+        (
+            SnapshotStaticFiles(directory=settings.snapshot_root, html=True)
+            if isinstance(storage, LocalStorage)
+            else StorageRedirectFiles(storage)
+        ),
         name="snapshots",
     )
 
     @app.get("/api/health")
     async def health():
-        return {"status": "ok", "timestamp": settings.current_timestamp()}
+        return {
+            "status": "ok",
+            "timestamp": settings.current_timestamp(),
+            "browsers": await get_browser_renderer().health(),
+        }
 
     return app
 
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import List, Literal, Optional
+from typing import Dict, List, Literal, Optional
 
 from pydantic import BaseModel, HttpUrl
 
@@ -9,6 +9,8 @@ class SnapshotRequest(BaseModel):
     urls: List[HttpUrl]
     force_browser: bool = False
     cookie_header: Optional[str] = None
+    # Capture again even if the same page was captured within CAPTURE_CACHE_TTL.
+    bypass_cache: bool = False
 
 
 class SnapshotResponseItem(BaseModel):
@@ -17,12 +19,54 @@ class SnapshotResponseItem(BaseModel):
     archived_relative_url: Optional[str] = None
     status: Literal["success", "failed"]
     error: Optional[str] = None
+    unchanged: bool = False
+    reused: bool = False
+    # Seconds per capture stage (http_fetch, sanitize, write, browser_queue, navigate, ...) and "total".
+    timings: Optional[Dict[str, float]] = None
 
 
 class SnapshotResponse(BaseModel):
     results: List[SnapshotResponseItem]
 
 
+class SnapshotStreamItem(SnapshotResponseItem):
+    index: int
+
+
+class JobSummary(BaseModel):
+    id: str
+    original_url: HttpUrl
+    status: Literal["queued", "running", "success", "failed"]
+
+
+class JobSubmitResponse(BaseModel):
+    batch_id: str
+    jobs: List[JobSummary]
+
+
+class JobBatchProgress(BaseModel):
+    total: int
+    queued: int
+    running: int
+    success: int
+    failed: int
+
+
+class JobStatusResponse(BaseModel):
+    id: str
+    batch_id: str
+    original_url: HttpUrl
+    status: Literal["queued", "running", "success", "failed"]
+    attempts: int
+    archived_url: Optional[str] = None
+    archived_relative_url: Optional[str] = None
+    error: Optional[str] = None
+    created_at: str
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    batch: JobBatchProgress
+
+
 class HistoryRecord(BaseModel):
     id: str
     original_url: HttpUrl
@@ -31,10 +75,31 @@ class HistoryRecord(BaseModel):
     status: Literal["success", "failed"]
     error: Optional[str] = None
     captured_at: str
+    content_hash: Optional[str] = None
+    unchanged: bool = False
+    timings: Optional[Dict[str, float]] = None
 
 
 class HistoryResponse(BaseModel):
     items: List[HistoryRecord]
+    next_cursor: Optional[str] = None
+
+
+class SearchHitRecord(BaseModel):
+    original_url: str
+    archived_url: str
+    archived_relative_url: str
+    title: str
+    # HTML-escaped page text around the match, with <mark> around matching terms.
+    snippet: str
+    captured_at: str
+    content_hash: str
+    score: float
+
+
+class SearchResponse(BaseModel):
+    items: List[SearchHitRecord]
+    next_cursor: Optional[str] = None
 
 
 class HistoryDeleteRequest(BaseModel):
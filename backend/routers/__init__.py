@@ -1,3 +1,3 @@
-from backend.routers import snapshots
+from backend.routers import jobs, metrics, snapshots
 
-__all__ = ["snapshots"]
+__all__ = ["jobs", "metrics", "snapshots"]
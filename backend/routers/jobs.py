@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+from fastapi import APIRouter, Depends, HTTPException, status
+
+from backend.dependencies import get_job_queue
+from backend.models.schemas import JobBatchProgress, JobStatusResponse
+from backend.services.job_queue import JobQueue
+
+router = APIRouter(tags=["jobs"])
+
+
+@router.get("/jobs/{job_id}", response_model=JobStatusResponse)
+async def get_job(
+    job_id: str,
+    job_queue: JobQueue = Depends(get_job_queue),
+) -> JobStatusResponse:
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found.")
+    progress = await job_queue.batch_progress(job.batch_id)
+    return JobStatusResponse(
+        id=job.id,
+        batch_id=job.batch_id,
+        original_url=job.url,
+        status=job.status,
+        attempts=job.attempts,
+        archived_url=job.archived_url,
+        archived_relative_url=job.archived_relative_url,
+        error=job.error,
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+        batch=JobBatchProgress(
+            total=progress.total,
+            queued=progress.queued,
+            running=progress.running,
+            success=progress.success,
+            failed=progress.failed,
+        ),
+    )
@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from backend.dependencies import get_browser_renderer, get_capture_cache, get_job_queue
+from backend.services.metrics import REGISTRY
+
+router = APIRouter(tags=["metrics"])
+
+# Prometheus text exposition format.
+_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+async def _render_pool(field: str) -> float:
+    return get_browser_renderer().occupancy()[field]
+
+
+async def _queue_depth() -> float:
+    return await get_job_queue().depth()
+
+
+async def _captures_in_flight() -> float:
+    return get_capture_cache().in_flight
+
+
+REGISTRY.gauge("pagecopy_render_pool_active", "Pages being rendered right now.", lambda: _render_pool("active"))
+REGISTRY.gauge("pagecopy_render_pool_capacity", "Concurrent render slots.", lambda: _render_pool("capacity"))
+REGISTRY.gauge("pagecopy_render_pool_waiting", "Renders waiting for a free slot.", lambda: _render_pool("waiting"))
+REGISTRY.gauge("pagecopy_job_queue_depth", "Background jobs waiting to run.", _queue_depth)
+REGISTRY.gauge("pagecopy_captures_in_flight", "Distinct captures currently running.", _captures_in_flight)
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics() -> PlainTextResponse:
+    return PlainTextResponse(await REGISTRY.render(), media_type=_CONTENT_TYPE)
@@ -1,109 +1,139 @@
 from __future__ import annotations
 
-import logging
-import uuid
-from typing import List
+import base64
+import binascii
+from typing import AsyncIterator, List, Literal, Optional, Union
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
 
 from backend.core.config import settings
-from backend.dependencies import get_history_repository, get_snapshot_service
+from backend.dependencies import (
+    get_batch_runner,
+    get_history_repository,
+    get_job_queue,
+    get_search_index,
+    get_snapshot_service,
+)
 from backend.models.schemas import (
     HistoryDeleteRequest,
     HistoryDeleteResponse,
     HistoryRecord,
     HistoryResponse,
+    JobSubmitResponse,
+    JobSummary,
+    SearchHitRecord,
+    SearchResponse,
     SnapshotRequest,
     SnapshotResponse,
     SnapshotResponseItem,
+    SnapshotStreamItem,
 )
-from backend.services.history_repository import HistoryEntry, HistoryRepository
-from backend.services.snapshot_service import SnapshotError, SnapshotService
-
-logger = logging.getLogger(__name__)
+from backend.services.batch_runner import BatchRunner, CaptureOutcome
+from backend.services.history_repository import HistoryRepository
+from backend.services.job_queue import JobQueue
+from backend.services.search_index import SearchIndex
+from backend.services.snapshot_service import SnapshotService
 
 router = APIRouter(tags=["snapshots"])
 
 
-@router.post("/snapshots", response_model=SnapshotResponse)
+@router.post("/snapshots", response_model=Union[SnapshotResponse, JobSubmitResponse])
 async def create_snapshots(
     payload: SnapshotRequest,
-    service: SnapshotService = Depends(get_snapshot_service),
+    response: Response,
+    run_async: bool = Query(False, alias="async"),
+    runner: BatchRunner = Depends(get_batch_runner),
     history_repo: HistoryRepository = Depends(get_history_repository),
-) -> SnapshotResponse:
-    results: List[SnapshotResponseItem] = []
-    history_entries: List[HistoryEntry] = []
-
-    for url in payload.urls:
-        logger.info("Processing snapshot request", extra={"url": str(url)})
-        try:
-            metadata = await service.create_snapshot(
-                str(url),
-                force_browser=payload.force_browser,
-                cookie_header=payload.cookie_header,
-            )
-            logger.info(
-                "Snapshot created",
-                extra={"url": str(url), "file": str(metadata.archived_path)},
-            )
-            results.append(
-                SnapshotResponseItem(
-                    original_url=url,
-                    archived_url=metadata.archived_url,
-                    archived_relative_url=metadata.relative_url,
-                    status="success",
-                    error=None,
-                )
-            )
-            history_entries.append(
-                HistoryEntry(
-                    id=uuid.uuid4().hex,
-                    original_url=str(url),
-                    archived_url=metadata.archived_url,
-                    archived_relative_url=metadata.relative_url,
-                    status="success",
-                    error=None,
-                    captured_at=metadata.captured_at.isoformat(),
-                )
-            )
-        except SnapshotError as exc:
-            logger.warning(
-                "Snapshot failed",
-                extra={"url": str(url), "error": str(exc)},
-            )
-            results.append(
-                SnapshotResponseItem(
-                    original_url=url,
-                    archived_url=None,
-                    archived_relative_url=None,
-                    status="failed",
-                    error=str(exc),
-                )
-            )
-            history_entries.append(
-                HistoryEntry(
-                    id=uuid.uuid4().hex,
-                    original_url=str(url),
-                    archived_url=None,
-                    archived_relative_url=None,
-                    status="failed",
-                    error=str(exc),
-                    captured_at=settings.current_timestamp(),
-                )
-            )
-
-    if history_entries:
-        await history_repo.append(history_entries)
+    job_queue: JobQueue = Depends(get_job_queue),
+) -> Union[SnapshotResponse, JobSubmitResponse]:
+    if run_async:
+        jobs = await job_queue.enqueue(
+            [str(url) for url in payload.urls],
+            force_browser=payload.force_browser,
+            cookie_header=payload.cookie_header,
+            bypass_cache=payload.bypass_cache,
+        )
+        response.status_code = status.HTTP_202_ACCEPTED
+        return JobSubmitResponse(
+            batch_id=jobs[0].batch_id if jobs else "",
+            jobs=[JobSummary(id=job.id, original_url=job.url, status=job.status) for job in jobs],
+        )
+
+    outcomes = await runner.run(
+        [str(url) for url in payload.urls],
+        force_browser=payload.force_browser,
+        cookie_header=payload.cookie_header,
+        bypass_cache=payload.bypass_cache,
+    )
+    results: List[SnapshotResponseItem] = [
+        SnapshotResponseItem(**_item_fields(outcome)) for outcome in outcomes
+    ]
+
+    if outcomes:
+        await history_repo.append(outcome.to_history_entry() for outcome in outcomes)
     return SnapshotResponse(results=results)
 
 
+@router.post(
+    "/snapshots/stream",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"application/x-ndjson": {}, "text/event-stream": {}}}},
+)
+async def stream_snapshots(
+    payload: SnapshotRequest,
+    request: Request,
+    runner: BatchRunner = Depends(get_batch_runner),
+    history_repo: HistoryRepository = Depends(get_history_repository),
+) -> StreamingResponse:
+    """Emit one ``SnapshotStreamItem`` per URL as soon as it completes.
+
+    Responds with Server-Sent Events when the client accepts ``text/event-stream``
+    and with newline-delimited JSON otherwise.
+    """
+    use_sse = "text/event-stream" in request.headers.get("accept", "")
+
+    async def events() -> AsyncIterator[str]:
+        async for index, outcome in runner.iter_completed(
+            [str(url) for url in payload.urls],
+            force_browser=payload.force_browser,
+            cookie_header=payload.cookie_header,
+            bypass_cache=payload.bypass_cache,
+        ):
+            await history_repo.append([outcome.to_history_entry()])
+            body = SnapshotStreamItem(index=index, **_item_fields(outcome)).model_dump_json()
+            yield f"event: snapshot\ndata: {body}\n\n" if use_sse else f"{body}\n"
+        if use_sse:
+            yield "event: done\ndata: {}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream" if use_sse else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.get("/history", response_model=HistoryResponse)
 async def get_history(
     limit: int = 50,
+    cursor: Optional[str] = None,
+    status_filter: Optional[Literal["success", "failed"]] = Query(None, alias="status"),
+    host: Optional[str] = None,
+    url_prefix: Optional[str] = None,
+    captured_from: Optional[str] = None,
+    captured_to: Optional[str] = None,
     history_repo: HistoryRepository = Depends(get_history_repository),
 ) -> HistoryResponse:
     limit = max(1, min(limit, 200))
-    records = await history_repo.list_recent(limit)
+    records, next_seq = await history_repo.list_page(
+        limit,
+        cursor=_decode_cursor(cursor),
+        status=status_filter,
+        host=host,
+        url_prefix=url_prefix,
+        captured_from=captured_from,
+        captured_to=captured_to,
+    )
     items = [
         HistoryRecord(
             id=entry.id,
@@ -113,16 +143,82 @@ async def get_history(
             status=entry.status,
             error=entry.error,
             captured_at=entry.captured_at,
+            content_hash=entry.content_hash,
+            unchanged=entry.unchanged,
+            timings=entry.timings,
         )
         for entry in records
     ]
-    return HistoryResponse(items=items)
+    return HistoryResponse(items=items, next_cursor=_encode_cursor(next_seq))
+
+
+@router.get("/search", response_model=SearchResponse)
+async def search_snapshots(
+    q: str = Query(..., min_length=1, max_length=500),
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    host: Optional[str] = None,
+    search_index: Optional[SearchIndex] = Depends(get_search_index),
+) -> SearchResponse:
+    """Snapshots whose title, text or URL contain every term of ``q``, best matches first."""
+    if search_index is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Search is disabled.")
+    limit = max(1, min(limit, 100))
+    hits, next_offset = await search_index.search(q, limit, offset=_decode_cursor(cursor, "s") or 0, host=host)
+    items = [
+        SearchHitRecord(
+            original_url=hit.original_url,
+            archived_url=f"{settings.snapshot_base_url.rstrip('/')}/{hit.relative_path}",
+            archived_relative_url=f"/snapshots/{hit.relative_path}",
+            title=hit.title,
+            snippet=hit.snippet,
+            captured_at=hit.captured_at,
+            content_hash=hit.digest,
+            score=hit.score,
+        )
+        for hit in hits
+    ]
+    return SearchResponse(items=items, next_cursor=_encode_cursor(next_offset, "s"))
 
 
 @router.delete("/history", response_model=HistoryDeleteResponse)
 async def delete_history(
     payload: HistoryDeleteRequest,
     history_repo: HistoryRepository = Depends(get_history_repository),
+    service: SnapshotService = Depends(get_snapshot_service),
 ) -> HistoryDeleteResponse:
-    deleted = await history_repo.delete(payload.ids)
-    return HistoryDeleteResponse(deleted=deleted)
+    removed = await history_repo.remove(payload.ids)
+    await service.release_snapshots(entry.content_hash for entry in removed)
+    return HistoryDeleteResponse(deleted=len(removed))
+
+
+def _item_fields(outcome: CaptureOutcome) -> dict[str, object]:
+    return {
+        "original_url": outcome.original_url,
+        "archived_url": outcome.metadata.archived_url if outcome.metadata else None,
+        "archived_relative_url": outcome.metadata.relative_url if outcome.metadata else None,
+        "status": outcome.status,
+        "error": outcome.error,
+        "unchanged": outcome.metadata.unchanged if outcome.metadata else False,
+        "reused": outcome.metadata.reused if outcome.metadata else False,
+        "timings": outcome.metadata.timings or None if outcome.metadata else None,
+    }
+
+
+def _encode_cursor(seq: Optional[int], kind: str = "h") -> Optional[str]:
+    if seq is None:
+        return None
+    return base64.urlsafe_b64encode(f"{kind}:{seq}".encode("ascii")).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: Optional[str], kind: str = "h") -> Optional[int]:
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("ascii")
+        prefix, _, value = raw.partition(":")
+        if prefix != kind:
+            raise ValueError(raw)
+        return int(value)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor.") from exc
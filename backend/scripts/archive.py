@@ -0,0 +1,320 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import gzip
+import hashlib
+import io
+import logging
+import signal
+import sys
+import time
+from pathlib import Path
+from typing import Iterable, List, Optional, TextIO
+from urllib.parse import urlparse
+from xml.etree import ElementTree
+
+import httpx
+
+from backend.core.config import Settings, settings
+from backend.dependencies import get_history_repository, get_snapshot_service, shutdown_dependencies
+from backend.services.batch_runner import BatchRunner, CaptureOutcome
+
+# Sitemap indexes may nest; real sites rarely go deeper than two levels.
+_MAX_SITEMAP_DEPTH = 5
+_GZIP_MAGIC = b"\x1f\x8b"
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Archive a large list of URLs through the snapshot service. URLs come from text files "
+            "(one per line), stdin ('-') or sitemaps. Progress is checkpointed to a resume file, so "
+            "re-running the same command after an interruption skips everything already captured."
+        )
+    )
+    parser.add_argument("sources", nargs="+", help="URL list file, '-' for stdin, or a sitemap path/URL.")
+    parser.add_argument(
+        "--sitemap",
+        action="store_true",
+        help="Treat local files as sitemaps (implied for http(s) sources and *.xml / *.xml.gz files).",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=settings.batch_max_concurrency,
+        help="Captures running at once (default: BATCH_MAX_CONCURRENCY).",
+    )
+    parser.add_argument(
+        "--per-host",
+        type=int,
+        default=settings.batch_per_host_concurrency,
+        help="Captures running at once per hostname (default: BATCH_PER_HOST_CONCURRENCY).",
+    )
+    parser.add_argument("--force-browser", action="store_true", help="Render every page with the browser.")
+    parser.add_argument(
+        "--resume-file",
+        type=Path,
+        help="Checkpoint file (default: data/archive/<hash of the sources>.resume; required for stdin).",
+    )
+    parser.add_argument("--retry-failed", action="store_true", help="Capture URLs that failed in earlier runs again.")
+    parser.add_argument(
+        "--flush-every",
+        type=int,
+        default=500,
+        help="Write history and the checkpoint after this many captures (default: 500).",
+    )
+    parser.add_argument(
+        "--flush-interval",
+        type=float,
+        default=10.0,
+        help="...or after this many seconds, whichever comes first (default: 10).",
+    )
+    parser.add_argument("--quiet", action="store_true", help="No progress display.")
+    return parser.parse_args()
+
+
+async def read_sources(sources: List[str], force_sitemap: bool) -> List[str]:
+    """All http(s) URLs from ``sources`` in order, without duplicates."""
+    seen: set[str] = set()
+    urls: List[str] = []
+
+    def add(candidates: Iterable[str]) -> None:
+        for candidate in candidates:
+            url = candidate.strip()
+            if not url or url.startswith("#") or url in seen:
+                continue
+            if urlparse(url).scheme not in ("http", "https"):
+                print(f"[!] Skipping {url!r}: not an http(s) URL", file=sys.stderr)
+                continue
+            seen.add(url)
+            urls.append(url)
+
+    async with httpx.AsyncClient(
+        timeout=settings.request_timeout,
+        follow_redirects=True,
+        headers={"User-Agent": "PageCopyBot/1.0"},
+    ) as client:
+        for source in sources:
+            if source == "-":
+                add(sys.stdin)
+            elif _is_sitemap(source, force_sitemap):
+                add(await read_sitemap(source, client))
+            else:
+                with open(source, "r", encoding="utf-8") as handle:
+                    add(handle)
+    return urls
+
+
+def _is_sitemap(source: str, force_sitemap: bool) -> bool:
+    return force_sitemap or source.startswith(("http://", "https://")) or source.endswith((".xml", ".xml.gz"))
+
+
+async def read_sitemap(location: str, client: httpx.AsyncClient, depth: int = 0) -> List[str]:
+    """Page URLs listed by a sitemap, following sitemap indexes."""
+    if location.startswith(("http://", "https://")):
+        response = await client.get(location)
+        response.raise_for_status()
+        data = response.content
+    else:
+        data = await asyncio.to_thread(Path(location).read_bytes)
+    if data.startswith(_GZIP_MAGIC):
+        data = await asyncio.to_thread(gzip.decompress, data)
+    is_index, locations = _parse_sitemap(data)
+    if not is_index:
+        return locations
+    if depth >= _MAX_SITEMAP_DEPTH:
+        print(f"[!] Ignoring sitemaps nested deeper than {_MAX_SITEMAP_DEPTH} levels in {location}", file=sys.stderr)
+        return []
+    urls: List[str] = []
+    for child in locations:
+        urls.extend(await read_sitemap(child, client, depth + 1))
+    return urls
+
+
+def _parse_sitemap(data: bytes) -> tuple[bool, List[str]]:
+    is_index = False
+    locations: List[str] = []
+    for event, element in ElementTree.iterparse(io.BytesIO(data), events=("start", "end")):
+        tag = element.tag.rpartition("}")[2]
+        if event == "start":
+            is_index = is_index or tag == "sitemapindex"
+        elif tag == "loc":
+            if element.text and element.text.strip():
+                locations.append(element.text.strip())
+        elif tag in ("url", "sitemap"):
+            element.clear()
+    return is_index, locations
+
+
+class ResumeLog:
+    """Append-only checkpoint: one ``<status>\\t<url>`` line per finished capture."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.succeeded: set[str] = set()
+        self.failed: set[str] = set()
+        if path.exists():
+            with path.open("r", encoding="utf-8") as handle:
+                for line in handle:
+                    status, _, url = line.rstrip("\n").partition("\t")
+                    # A line cut short by a crash has no status/URL separator and is ignored.
+                    if not url:
+                        continue
+                    if status == "success":
+                        self.succeeded.add(url)
+                        self.failed.discard(url)
+                    else:
+                        self.failed.add(url)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._handle: TextIO = path.open("a", encoding="utf-8")
+
+    def record(self, outcomes: Iterable[CaptureOutcome]) -> None:
+        self._handle.writelines(f"{outcome.status}\t{outcome.original_url}\n" for outcome in outcomes)
+        self._handle.flush()
+
+    def close(self) -> None:
+        self._handle.close()
+
+
+class Progress:
+    def __init__(self, total: int, skipped: int, quiet: bool) -> None:
+        self.total = total
+        self.skipped = skipped
+        self.quiet = quiet
+        self.succeeded = 0
+        self.failed = 0
+        self._started = time.monotonic()
+        self._last_line = 0.0
+        self._tty = sys.stderr.isatty()
+
+    def update(self, outcome: CaptureOutcome) -> None:
+        if outcome.status == "success":
+            self.succeeded += 1
+        else:
+            self.failed += 1
+
+    def show(self, final: bool = False) -> None:
+        if self.quiet:
+            return
+        now = time.monotonic()
+        # Redraw in place on a terminal; elsewhere (log files, CI) print a line every 10 seconds.
+        if not final and now - self._last_line < (0.2 if self._tty else 10.0):
+            return
+        self._last_line = now
+        done = self.succeeded + self.failed
+        elapsed = max(now - self._started, 1e-6)
+        rate = done / elapsed
+        remaining = self.total - done
+        eta = f"{remaining / rate / 60:.1f} min" if rate > 0 and remaining else "-"
+        line = (
+            f"[{done}/{self.total}] {self.succeeded} ok, {self.failed} failed, "
+            f"{self.skipped} skipped | {rate:.1f} pages/s | ETA {eta}"
+        )
+        if self._tty:
+            print(f"\r{line}\033[K", end="\n" if final else "", file=sys.stderr, flush=True)
+        else:
+            print(line, file=sys.stderr, flush=True)
+
+
+def default_resume_file(sources: List[str]) -> Optional[Path]:
+    if "-" in sources:
+        return None
+    key = "\n".join(
+        source if source.startswith(("http://", "https://")) else str(Path(source).resolve()) for source in sources
+    )
+    return Path("data") / "archive" / f"{hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]}.resume"
+
+
+async def run(args: argparse.Namespace) -> int:
+    resume_path = args.resume_file or default_resume_file(args.sources)
+    if resume_path is None:
+        print("[!] Reading from stdin needs an explicit --resume-file.", file=sys.stderr)
+        return 2
+    urls = await read_sources(args.sources, args.sitemap)
+    resume = ResumeLog(resume_path)
+    finished = resume.succeeded if args.retry_failed else resume.succeeded | resume.failed
+    todo = [url for url in urls if url not in finished]
+    print(f"[+] {len(urls)} URLs, {len(urls) - len(todo)} already archived; checkpointing to {resume_path}")
+    if not todo:
+        resume.close()
+        return 0
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signum, stop.set)
+        except NotImplementedError:  # pragma: no cover - Windows event loops
+            pass
+
+    service = get_snapshot_service()
+    history = get_history_repository()
+    runner = BatchRunner(service, max_concurrency=args.concurrency, per_host_concurrency=args.per_host)
+    progress = Progress(len(todo), len(urls) - len(todo), args.quiet)
+    buffer: List[CaptureOutcome] = []
+    last_flush = time.monotonic()
+
+    async def flush() -> None:
+        nonlocal last_flush
+        last_flush = time.monotonic()
+        if not buffer:
+            return
+        # History first: after a crash in between, a batch is captured twice rather than lost.
+        await history.append(outcome.to_history_entry() for outcome in buffer)
+        resume.record(buffer)
+        buffer.clear()
+
+    # Tasks waiting on a per-host slot are cheap, so keep enough queued for other hosts to proceed.
+    window = max(args.concurrency * 8, 256)
+    pending: dict[asyncio.Task[CaptureOutcome], str] = {}
+    queue = iter(todo)
+    await service.startup()
+    try:
+        while True:
+            while len(pending) < window and not stop.is_set():
+                url = next(queue, None)
+                if url is None:
+                    break
+                pending[asyncio.create_task(runner.capture(url, force_browser=args.force_browser))] = url
+            if not pending or stop.is_set():
+                break
+            done, _ = await asyncio.wait(pending, timeout=1.0, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                url = pending.pop(task)
+                try:
+                    outcome = task.result()
+                except Exception as exc:  # noqa: BLE001 - one broken page must not end a long run
+                    outcome = CaptureOutcome(original_url=url, captured_at=Settings.current_timestamp(), error=str(exc))
+                buffer.append(outcome)
+                progress.update(outcome)
+            if len(buffer) >= args.flush_every or time.monotonic() - last_flush >= args.flush_interval:
+                await flush()
+            progress.show()
+    finally:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        await flush()
+        resume.close()
+        progress.show(final=True)
+        await shutdown_dependencies()
+    if stop.is_set():
+        print(f"[+] Interrupted; run the same command again to resume ({len(pending)} in-flight URLs will be retried).")
+        return 130
+    return 0 if progress.failed == 0 else 1
+
+
+def main() -> int:
+    logging.basicConfig(
+        level=logging.WARNING,
+        format="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
+    )
+    args = parse_args()
+    if sys.platform.startswith("win"):
+        asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
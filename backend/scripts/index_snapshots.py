@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncIterator, List, Optional, Set, Tuple
+
+from backend.dependencies import get_blob_store, get_search_index, shutdown_dependencies
+from backend.services.blob_store import BlobStore
+from backend.services.search_index import IndexedDocument, SearchIndex, extract_document
+
+# Documents handed to SQLite per transaction.
+_WRITE_BATCH = 200
+_SCAN_PAGE = 500
+# Files written before the blob store, directly under the snapshot root.
+_LEGACY_NAME_RE = re.compile(r"\d{14}_[0-9a-f]{10}\.html")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Add stored snapshots that are missing from the full-text search index, e.g. ones captured "
+            "before it existed, pre-blob-store <timestamp>_<hash>.html files or ones imported from WARC "
+            "files. Text is extracted in a process pool; "
+            "running it again only picks up what is still missing."
+        )
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Text extraction processes (default: one per CPU).",
+    )
+    parser.add_argument("--prune", action="store_true", help="Also drop index entries of deleted snapshots.")
+    parser.add_argument("--quiet", action="store_true", help="No progress output.")
+    return parser.parse_args()
+
+
+async def run(args: argparse.Namespace) -> int:
+    search_index = get_search_index()
+    if search_index is None:
+        print("[!] The search index is disabled (SEARCH_INDEX=false).", file=sys.stderr)
+        return 2
+    blob_store = get_blob_store()
+    loop = asyncio.get_running_loop()
+    workers = max(1, args.workers)
+    # Enough queued work to keep every process busy while the next files are read.
+    window = workers * 4
+    pending: Set[asyncio.Future[IndexedDocument]] = set()
+    extracted: List[IndexedDocument] = []
+    indexed = missing = unreadable = 0
+    started = last_report = time.monotonic()
+
+    async def collect(wait_for_all: bool) -> None:
+        nonlocal pending, indexed, unreadable, last_report
+        done: Set[asyncio.Future[IndexedDocument]] = set()
+        if pending:
+            done, pending = await asyncio.wait(
+                pending,
+                return_when=asyncio.ALL_COMPLETED if wait_for_all else asyncio.FIRST_COMPLETED,
+            )
+        for future in done:
+            document = future.result()
+            if document.original_url:
+                extracted.append(document)
+            else:
+                # No capture comment: not a file this service wrote.
+                unreadable += 1
+        if len(extracted) >= _WRITE_BATCH or (wait_for_all and extracted):
+            indexed += await search_index.add(extracted)
+            extracted.clear()
+        if not args.quiet and time.monotonic() - last_report >= 10.0:
+            last_report = time.monotonic()
+            rate = indexed / max(last_report - started, 1e-6)
+            print(f"[+] {indexed} snapshots indexed ({rate:.0f}/s)", file=sys.stderr, flush=True)
+
+    # Spawned workers share no threads or SQLite handles with this process.
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        try:
+            async for digest, document, legacy_path in _unindexed_documents(search_index, blob_store):
+                if document is None:
+                    missing += 1
+                    continue
+                pending.add(
+                    loop.run_in_executor(
+                        pool, extract_document, digest, document, search_index.max_text_chars, legacy_path
+                    )
+                )
+                if len(pending) >= window:
+                    await collect(wait_for_all=False)
+            await collect(wait_for_all=True)
+        finally:
+            for future in pending:
+                future.cancel()
+    print(f"[+] Indexed {indexed} snapshots in {time.monotonic() - started:.1f}s.")
+    if missing or unreadable:
+        print(f"[!] Skipped {missing} snapshots missing from storage and {unreadable} without a capture comment.")
+    if args.prune:
+        print(f"[+] Pruned {await search_index.prune()} entries of deleted snapshots.")
+    return 0
+
+
+async def _unindexed_documents(
+    search_index: SearchIndex, blob_store: BlobStore
+) -> AsyncIterator[Tuple[str, Optional[bytes], Optional[str]]]:
+    """(digest, content, legacy path) of every stored snapshot the index lacks; content is None if unreadable."""
+    after = ""
+    while rows := await search_index.unindexed(after, _SCAN_PAGE):
+        after = rows[-1][0]
+        for digest, relative_path in rows:
+            yield digest, await blob_store.read(relative_path), None
+    names = sorted(
+        path.name
+        for path in await asyncio.to_thread(lambda: list(blob_store.root.glob("*.html")))
+        if _LEGACY_NAME_RE.fullmatch(path.name)
+    )
+    for start in range(0, len(names), _SCAN_PAGE):
+        for name in await search_index.unindexed_paths(names[start : start + _SCAN_PAGE]):
+            try:
+                document = await asyncio.to_thread((blob_store.root / name).read_bytes)
+            except OSError:
+                yield "", None, name
+                continue
+            yield blob_store.digest_of(document), document, name
+
+
+async def _run(args: argparse.Namespace) -> int:
+    try:
+        return await run(args)
+    finally:
+        await shutdown_dependencies()
+
+
+def main() -> int:
+    logging.basicConfig(
+        level=logging.WARNING,
+        format="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
+    )
+    args = parse_args()
+    if sys.platform.startswith("win"):
+        asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
+    return asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import signal
+import sys
+
+from backend.core.config import settings
+from backend.dependencies import (
+    get_batch_runner,
+    get_history_repository,
+    get_job_queue,
+    get_snapshot_service,
+    shutdown_dependencies,
+)
+from backend.services.job_queue import JobWorkerPool
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Drain the persistent snapshot job queue outside the API process. "
+            "Set JOB_WORKERS=0 for the API server so renders only run here."
+        )
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=max(1, settings.job_workers),
+        help="Number of concurrent job workers (default: JOB_WORKERS or 1).",
+    )
+    return parser.parse_args()
+
+
+async def run(workers: int) -> None:
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signum, stop.set)
+        except NotImplementedError:  # pragma: no cover - Windows event loops
+            pass
+
+    await get_snapshot_service().startup()
+    pool = JobWorkerPool(
+        get_job_queue(),
+        get_batch_runner(),
+        get_history_repository(),
+        concurrency=workers,
+        poll_interval=settings.job_poll_interval,
+    )
+    pool.start()
+    print(f"[+] {workers} snapshot worker(s) polling {settings.job_queue_file}")
+    try:
+        await stop.wait()
+    finally:
+        print("[+] Stopping workers, in-flight jobs are handed back to the queue ...")
+        await pool.stop()
+        await shutdown_dependencies()
+
+
+def main() -> int:
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
+    )
+    args = parse_args()
+    if sys.platform.startswith("win"):
+        asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
+    try:
+        asyncio.run(run(args.workers))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import sys
+from pathlib import Path
+
+from backend.core.config import settings
+from backend.dependencies import get_blob_store, get_history_repository, shutdown_dependencies
+from backend.services.warc_archive import (
+    WarcFormatError,
+    export_warcs,
+    import_warcs,
+    index_warcs,
+    lookup_cdx,
+    read_record_at,
+)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Move the snapshot archive in and out of WARC files. Each record is its own gzip member, "
+            "so a CDX index can point at single records by offset."
+        )
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export", help="Write history and snapshot files to WARC files plus a CDX index.")
+    export.add_argument("--output-dir", type=Path, default=Path("data") / "warc", help="Default: data/warc.")
+    export.add_argument("--prefix", default="pagecopy", help="File name prefix (default: pagecopy).")
+    export.add_argument(
+        "--max-size",
+        type=int,
+        default=1024,
+        help="Start a new WARC file after this many MB (default: 1024).",
+    )
+    export.add_argument("--status", help="Only entries with this status (success or failed).")
+    export.add_argument("--host", help="Only entries for this hostname.")
+    export.add_argument("--url-prefix", help="Only entries whose URL starts with this.")
+    export.add_argument("--captured-from", help="Only entries captured at or after this ISO timestamp.")
+    export.add_argument("--captured-to", help="Only entries captured before this ISO timestamp.")
+
+    load = commands.add_parser("import", help="Rebuild snapshot files and history from exported WARC files.")
+    load.add_argument("files", nargs="+", type=Path, help="WARC files, in the order they were written.")
+
+    index = commands.add_parser("index", help="(Re)build a CDX index for WARC files.")
+    index.add_argument("files", nargs="+", type=Path)
+    index.add_argument("--output", type=Path, required=True, help="CDX file to write.")
+
+    get = commands.add_parser("get", help="Print one archived page straight from a WARC file via its CDX index.")
+    get.add_argument("index", type=Path, help="CDX file; WARC files are looked up next to it.")
+    get.add_argument("url")
+    get.add_argument("--timestamp", help="Capture closest to this time (default: the latest).")
+    get.add_argument("--output", type=Path, help="Write the page here instead of stdout.")
+    return parser.parse_args()
+
+
+async def run_export(args: argparse.Namespace) -> int:
+    summary = await export_warcs(
+        get_history_repository(),
+        get_blob_store(),
+        args.output_dir,
+        settings.snapshot_base_url,
+        prefix=args.prefix,
+        max_file_bytes=args.max_size * 1024 * 1024,
+        status=args.status,
+        host=args.host,
+        url_prefix=args.url_prefix,
+        captured_from=args.captured_from,
+        captured_to=args.captured_to,
+    )
+    if not summary.files:
+        print("[!] No history entries matched; nothing written.", file=sys.stderr)
+        return 1
+    print(
+        f"[+] Exported {summary.entries} entries and {summary.blobs} files to {len(summary.files)} WARC file(s) "
+        f"in {args.output_dir}; index: {summary.index}"
+    )
+    if summary.missing:
+        print(f"[!] {summary.missing} entries had no snapshot file left and were exported as history only.")
+    return 0
+
+
+async def run_import(args: argparse.Namespace) -> int:
+    summary = await import_warcs(args.files, get_history_repository(), get_blob_store(), settings.snapshot_base_url)
+    print(
+        f"[+] Imported {summary.entries} entries and {summary.blobs} files; "
+        f"{summary.skipped} entries were already present."
+    )
+    if summary.missing:
+        print(f"[!] {summary.missing} entries referred to files missing from the WARC files and were skipped.")
+        return 1
+    return 0
+
+
+def run_get(args: argparse.Namespace) -> int:
+    line = lookup_cdx(args.index, args.url, args.timestamp)
+    if line is None:
+        print(f"[!] {args.url} is not in {args.index}", file=sys.stderr)
+        return 1
+    record = read_record_at(args.index.parent / line.filename, line.offset, line.length)
+    if args.output:
+        args.output.write_bytes(record.payload)
+        print(f"[+] {line.original} ({line.timestamp}) written to {args.output}")
+    else:
+        sys.stdout.buffer.write(record.payload)
+    return 0
+
+
+async def run(args: argparse.Namespace) -> int:
+    try:
+        if args.command == "export":
+            return await run_export(args)
+        return await run_import(args)
+    finally:
+        await shutdown_dependencies()
+
+
+def main() -> int:
+    logging.basicConfig(
+        level=logging.WARNING,
+        format="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
+    )
+    args = parse_args()
+    try:
+        if args.command == "index":
+            count = index_warcs(args.files, args.output)
+            print(f"[+] Indexed {count} records into {args.output}")
+            return 0
+        if args.command == "get":
+            return run_get(args)
+        if sys.platform.startswith("win"):
+            asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
+        return asyncio.run(run(args))
+    except WarcFormatError as exc:
+        print(f"[!] {exc}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
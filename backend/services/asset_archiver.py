@@ -0,0 +1,382 @@
+from __future__ import annotations
+
+import asyncio
+import base64
+import html as html_lib
+import logging
+import mimetypes
+import re
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from pathlib import PurePosixPath
+from typing import AsyncIterator, Callable, Dict, List, Optional, Set
+from urllib.parse import urldefrag, urljoin, urlparse
+
+import httpx
+
+from backend.services.blob_store import BlobStore
+from backend.services.html_sanitizer import Tag, iter_tags, parse_attributes
+
+logger = logging.getLogger(__name__)
+
+# Attributes that load a sub-resource, per element. ``data-src`` is how WeChat
+# lazy-loads images; without scripts it is the only place the real URL lives.
+_ASSET_ATTRS: Dict[str, tuple[str, ...]] = {
+    "img": ("src", "srcset", "data-src"),
+    "source": ("src", "srcset"),
+    "link": ("href",),
+    "video": ("poster",),
+    "input": ("src",),
+    "image": ("href", "xlink:href"),
+}
+_LINK_RELS = frozenset({"stylesheet", "icon", "shortcut", "apple-touch-icon"})
+_CSS_URL_RE = re.compile(
+    r"""url\(\s*(?:"([^"]*)"|'([^']*)'|([^)'"\s]*))\s*\)|@import\s+(?:"([^"]*)"|'([^']*)')""",
+    re.IGNORECASE,
+)
+_ASSET_TYPES = (
+    "image/",
+    "font/",
+    "text/css",
+    "application/font-",
+    "application/x-font",
+    "application/vnd.ms-fontobject",
+)
+# Content types end up in data: URIs inside <style>; anything else is treated as unknown.
+_MIME_TYPE_RE = re.compile(r"[a-z]+/[a-z0-9.+-]+")
+# Characters that could end a url("...") string or the <style> element around it.
+_CSS_STRING_ESCAPE_RE = re.compile(r"""[\\"'<>\x00-\x1f\x7f]""")
+_FONT_EXTENSIONS = frozenset({".woff", ".woff2", ".ttf", ".otf", ".eot"})
+_SRCSET_CANDIDATE_RE = re.compile(r"[\s,]*(\S*[^\s,])(?:,+|([^,]*),?)")
+_EXTENSIONS = {
+    "text/css": ".css",
+    "image/jpeg": ".jpg",
+    "image/webp": ".webp",
+    "font/woff": ".woff",
+    "font/woff2": ".woff2",
+}
+# Stylesheets may @import each other; stop following after this many levels.
+_MAX_CSS_DEPTH = 3
+
+
+@dataclass(slots=True)
+class LocalizedPage:
+    html: str
+    # Asset digests the page links to. Each carries one reference held for the
+    # caller, to be dropped once the page itself is linked to them.
+    assets: List[str] = field(default_factory=list)
+
+
+@dataclass(slots=True)
+class _Resolved:
+    url: str
+    # Blobs whoever embeds ``url`` should link to (the stored asset, or the
+    # assets of an inlined stylesheet).
+    children: List[str]
+
+
+@dataclass(slots=True)
+class _PageState:
+    client: httpx.AsyncClient
+    # Keyed by (url, depth) so a stylesheet import cycle runs out of depth
+    # instead of awaiting its own task.
+    tasks: Dict[tuple[str, int], asyncio.Task] = field(default_factory=dict)
+    downloads: Dict[str, asyncio.Task] = field(default_factory=dict)
+    held: List[str] = field(default_factory=list)
+
+
+class AssetArchiver:
+    """Makes snapshots self-contained by storing the images, CSS and fonts they use.
+
+    Assets are fetched concurrently (bounded globally and per host) and stored in
+    the blob store by content, so a logo shared by many pages is kept once. Small
+    ones are inlined as ``data:`` URIs instead. References are rewritten to
+    absolute URLs under ``asset_base_url`` because the injected ``<base href>``
+    would otherwise resolve them against the original site.
+    """
+
+    def __init__(
+        self,
+        blob_store: BlobStore,
+        asset_base_url: str,
+        max_concurrency: int = 16,
+        per_host_concurrency: int = 4,
+        inline_max_bytes: int = 4096,
+        max_asset_bytes: int = 10 * 1024 * 1024,
+    ) -> None:
+        self.blob_store = blob_store
+        self.asset_base_url = asset_base_url.rstrip("/")
+        self.per_host_concurrency = max(1, per_host_concurrency)
+        self.inline_max_bytes = inline_max_bytes
+        self.max_asset_bytes = max_asset_bytes
+        self._slots = asyncio.Semaphore(max(1, max_concurrency))
+        self._host_slots: dict[str, asyncio.Semaphore] = {}
+        # Downloads holding or waiting for each host slot; the slot is dropped when this reaches 0.
+        self._host_users: dict[str, int] = {}
+
+    async def localize(self, html: str, page_url: str, client: httpx.AsyncClient) -> LocalizedPage:
+        """Fetch the assets ``html`` references and point it at the stored copies.
+
+        Assets that fail to download keep their original URL.
+        """
+        state = _PageState(client=client)
+        try:
+            urls: Set[str] = set()
+            self._rewrite_html(html, page_url, lambda url: urls.add(url))
+            resolved = await self._resolve_all(urls, state, depth=0)
+            children: List[str] = []
+
+            def replace(url: str) -> Optional[str]:
+                target = resolved.get(url)
+                if target is None:
+                    return None
+                children.extend(target.children)
+                return target.url
+
+            localized = self._rewrite_html(html, page_url, replace)
+        except BaseException:
+            pending = [task for task in (*state.tasks.values(), *state.downloads.values()) if not task.done()]
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            await self.blob_store.release(state.held)
+            raise
+        # Keep only the holds the page will take over; drop the rest now.
+        assets = sorted(set(children))
+        surplus = list(state.held)
+        for digest in assets:
+            surplus.remove(digest)
+        await self.blob_store.release(surplus)
+        return LocalizedPage(html=localized, assets=assets)
+
+    async def _resolve_all(self, urls: Set[str], state: _PageState, depth: int) -> Dict[str, _Resolved]:
+        for url in urls:
+            if (url, depth) not in state.tasks:
+                state.tasks[(url, depth)] = asyncio.create_task(self._resolve(url, state, depth))
+        results = await asyncio.gather(*(state.tasks[(url, depth)] for url in urls))
+        return {url: result for url, result in zip(urls, results) if result is not None}
+
+    async def _resolve(self, url: str, state: _PageState, depth: int) -> Optional[_Resolved]:
+        download = state.downloads.get(url)
+        if download is None:
+            download = state.downloads[url] = asyncio.create_task(self._download(url, state.client))
+        downloaded = await download
+        if downloaded is None:
+            return None
+        content, content_type, final_url = downloaded
+        children: List[str] = []
+        if content_type == "text/css":
+            if depth >= _MAX_CSS_DEPTH:
+                return None
+            content, children = await self._localize_css_bytes(content, final_url, state, depth + 1)
+        # SVG is always inlined: served from our own origin it could run script.
+        if len(content) <= self.inline_max_bytes or content_type == "image/svg+xml":
+            encoded = base64.b64encode(content).decode("ascii")
+            return _Resolved(url=f"data:{content_type};base64,{encoded}", children=children)
+        blob = await self.blob_store.put_asset(content, self._extension_for(content_type, final_url))
+        state.held.append(blob.digest)
+        if children:
+            await self.blob_store.link(blob.digest, children)
+        return _Resolved(url=f"{self.asset_base_url}/{blob.relative_path}", children=[blob.digest])
+
+    async def _download(self, url: str, client: httpx.AsyncClient) -> Optional[tuple[bytes, str, str]]:
+        async with self._host_slot(url), self._slots:
+            try:
+                async with client.stream("GET", url) as response:
+                    response.raise_for_status()
+                    content_type = response.headers.get("content-type", "").split(";")[0].strip().lower()
+                    if content_type and not _MIME_TYPE_RE.fullmatch(content_type):
+                        content_type = "application/octet-stream"
+                    if not self._is_asset(content_type, str(response.url)):
+                        logger.info("Skipping non-asset response", extra={"url": url, "content_type": content_type})
+                        return None
+                    chunks: List[bytes] = []
+                    size = 0
+                    async for chunk in response.aiter_bytes():
+                        size += len(chunk)
+                        if size > self.max_asset_bytes:
+                            logger.info("Skipping oversized asset", extra={"url": url})
+                            return None
+                        chunks.append(chunk)
+                    if content_type == "application/octet-stream":
+                        content_type = mimetypes.guess_type(urlparse(str(response.url)).path)[0] or content_type
+                    return b"".join(chunks), content_type, str(response.url)
+            except httpx.HTTPError as exc:
+                logger.warning("Asset fetch failed", extra={"url": url, "error": str(exc)})
+                return None
+
+    async def _localize_css_bytes(
+        self,
+        content: bytes,
+        css_url: str,
+        state: _PageState,
+        depth: int,
+    ) -> tuple[bytes, List[str]]:
+        css = content.decode("utf-8", errors="replace")
+        urls: Set[str] = set()
+        self._rewrite_css(css, css_url, lambda url: urls.add(url))
+        resolved = await self._resolve_all(urls, state, depth)
+        children: List[str] = []
+
+        def replace(url: str) -> Optional[str]:
+            target = resolved.get(url)
+            if target is None:
+                return None
+            children.extend(target.children)
+            return target.url
+
+        return self._rewrite_css(css, css_url, replace).encode("utf-8"), children
+
+    def _rewrite_html(self, html: str, base_url: str, visit: Callable[[str], Optional[str]]) -> str:
+        """Walk tags and ``<style>`` blocks, passing each absolute asset URL to ``visit``.
+
+        Whatever ``visit`` returns replaces the URL; ``None`` leaves it untouched.
+        """
+        out: List[str] = []
+        copied = 0
+        for tag in iter_tags(html):
+            if tag.is_end:
+                continue
+            name = tag.name.lower()
+            rewritten_tag = self._rewrite_tag(name, tag, base_url, visit)
+            if rewritten_tag is not None:
+                out.append(html[copied : tag.start])
+                out.append(rewritten_tag)
+                copied = tag.end
+            if name == "style" and tag.content_end is not None:
+                css = html[tag.end : tag.content_end]
+                rewritten = self._rewrite_css(css, base_url, visit)
+                if rewritten != css:
+                    out.append(html[copied : tag.end])
+                    out.append(rewritten)
+                    copied = tag.content_end
+        out.append(html[copied:])
+        return "".join(out)
+
+    def _rewrite_tag(
+        self,
+        name: str,
+        tag: Tag,
+        base_url: str,
+        visit: Callable[[str], Optional[str]],
+    ) -> Optional[str]:
+        attrs = tag.attrs
+        targets = _ASSET_ATTRS.get(name, ())
+        if not attrs or (not targets and "style" not in attrs.lower()):
+            return None
+        parsed = parse_attributes(attrs)
+        if name == "link":
+            rel = next((attr.value for attr in parsed if attr.name.lower() == "rel" and attr.raw_value), "")
+            if not _LINK_RELS.intersection(rel.lower().split()):
+                targets = ()
+
+        parts: List[str] = []
+        changed = False
+        has_src = False
+        lazy_src: Optional[str] = None
+        for attr in parsed:
+            attr_name = attr.name.lower()
+            has_src = has_src or attr_name == "src"
+            replacement: Optional[str] = None
+            if attr.raw_value and attr_name in targets:
+                value = attr.value
+                if attr_name == "srcset":
+                    replacement = self._rewrite_srcset(value, base_url, visit)
+                else:
+                    url = self._absolute(value, base_url)
+                    replacement = visit(url) if url else None
+                    if attr_name == "data-src":
+                        lazy_src = replacement
+            elif attr.raw_value and attr_name == "style":
+                value = attr.value
+                rewritten = self._rewrite_css(value, base_url, visit)
+                replacement = rewritten if rewritten != value else None
+            if replacement is None:
+                parts.append(attr.text)
+            else:
+                parts.append(f'{attr.name}="{html_lib.escape(replacement, quote=True)}"')
+                changed = True
+        if name == "img" and lazy_src and not has_src:
+            # Scripts are stripped, so nothing will copy data-src into src any more.
+            parts.append(f'src="{html_lib.escape(lazy_src, quote=True)}"')
+        if not changed:
+            return None
+        closing = " /" if attrs.rstrip().endswith("/") else ""
+        return f"<{tag.name} {' '.join(parts)}{closing}>"
+
+    def _rewrite_srcset(self, value: str, base_url: str, visit: Callable[[str], Optional[str]]) -> Optional[str]:
+        candidates: List[str] = []
+        changed = False
+        pos = 0
+        while pos < len(value):
+            match = _SRCSET_CANDIDATE_RE.match(value, pos)
+            if match is None or match.end() == pos:
+                break
+            pos = match.end()
+            url = self._absolute(match.group(1), base_url)
+            replacement = visit(url) if url else None
+            changed = changed or replacement is not None
+            descriptor = (match.group(2) or "").strip()
+            candidates.append(" ".join(item for item in (replacement or match.group(1), descriptor) if item))
+        return ", ".join(candidates) if changed else None
+
+    def _rewrite_css(self, css: str, base_url: str, visit: Callable[[str], Optional[str]]) -> str:
+        def replace(match: re.Match[str]) -> str:
+            raw = next(group for group in match.groups() if group is not None)
+            url = self._absolute(raw, base_url)
+            replacement = visit(url) if url else None
+            if replacement is None:
+                return match.group(0)
+            if match.group(0).startswith("@"):
+                return f'@import "{_css_string(replacement)}"'
+            return f'url("{_css_string(replacement)}")'
+
+        return _CSS_URL_RE.sub(replace, css)
+
+    @asynccontextmanager
+    async def _host_slot(self, url: str) -> AsyncIterator[None]:
+        host = (urlparse(url).hostname or "").lower()
+        slot = self._host_slots.get(host)
+        if slot is None:
+            slot = self._host_slots[host] = asyncio.Semaphore(self.per_host_concurrency)
+        self._host_users[host] = self._host_users.get(host, 0) + 1
+        try:
+            async with slot:
+                yield
+        finally:
+            users = self._host_users[host] - 1
+            if users:
+                self._host_users[host] = users
+            else:
+                del self._host_users[host]
+                del self._host_slots[host]
+
+    @staticmethod
+    def _absolute(value: str, base_url: str) -> Optional[str]:
+        value = value.strip()
+        if not value or value.startswith("#"):
+            return None
+        url, _ = urldefrag(urljoin(base_url, value))
+        return url if urlparse(url).scheme in ("http", "https") else None
+
+    @staticmethod
+    def _is_asset(content_type: str, url: str) -> bool:
+        if content_type.startswith(_ASSET_TYPES):
+            return True
+        suffix = PurePosixPath(urlparse(url).path).suffix.lower()
+        return content_type in ("", "application/octet-stream") and (
+            suffix in _FONT_EXTENSIONS or (mimetypes.guess_type(f"x{suffix}")[0] or "").startswith("image/")
+        )
+
+    @staticmethod
+    def _extension_for(content_type: str, url: str) -> str:
+        extension = _EXTENSIONS.get(content_type) or mimetypes.guess_extension(content_type)
+        if not extension:
+            suffix = PurePosixPath(urlparse(url).path).suffix.lower()
+            extension = suffix if re.fullmatch(r"\.[a-z0-9]{1,6}", suffix) else ".bin"
+        return extension
+
+
+def _css_string(value: str) -> str:
+    """``value`` escaped for use between double quotes in CSS."""
+    return _CSS_STRING_ESCAPE_RE.sub(lambda match: f"\\{ord(match.group()):x} ", value)
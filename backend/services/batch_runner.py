@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import uuid
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Iterable, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from backend.core.config import Settings
+from backend.services.history_repository import HistoryEntry
+from backend.services.snapshot_service import SnapshotError, SnapshotMetadata, SnapshotService
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class CaptureOutcome:
+    original_url: str
+    captured_at: str
+    metadata: Optional[SnapshotMetadata] = None
+    error: Optional[str] = None
+
+    @property
+    def status(self) -> str:
+        return "success" if self.metadata is not None else "failed"
+
+    def to_history_entry(self) -> HistoryEntry:
+        return HistoryEntry(
+            id=uuid.uuid4().hex,
+            original_url=self.original_url,
+            archived_url=self.metadata.archived_url if self.metadata else None,
+            archived_relative_url=self.metadata.relative_url if self.metadata else None,
+            status=self.status,
+            error=self.error,
+            captured_at=self.captured_at,
+            content_hash=self.metadata.content_hash if self.metadata else None,
+            unchanged=self.metadata.unchanged if self.metadata else False,
+            timings=self.metadata.timings or None if self.metadata else None,
+        )
+
+
+class BatchRunner:
+    """Fans snapshot requests out with a global cap and a per-host cap."""
+
+    def __init__(
+        self,
+        service: SnapshotService,
+        max_concurrency: int = 8,
+        per_host_concurrency: int = 2,
+    ) -> None:
+        self.service = service
+        self.per_host_concurrency = max(1, per_host_concurrency)
+        self._slots = asyncio.Semaphore(max(1, max_concurrency))
+        self._host_slots: dict[str, asyncio.Semaphore] = {}
+        # Captures holding or waiting for each host slot; the slot is dropped when this reaches 0.
+        self._host_users: dict[str, int] = {}
+
+    async def run(
+        self,
+        urls: Iterable[str],
+        force_browser: bool = False,
+        cookie_header: Optional[str] = None,
+        bypass_cache: bool = False,
+    ) -> List[CaptureOutcome]:
+        """Capture every URL concurrently; outcomes keep the input order."""
+        return list(
+            await asyncio.gather(
+                *(
+                    self.capture(
+                        url,
+                        force_browser=force_browser,
+                        cookie_header=cookie_header,
+                        bypass_cache=bypass_cache,
+                    )
+                    for url in urls
+                )
+            )
+        )
+
+    async def iter_completed(
+        self,
+        urls: Iterable[str],
+        force_browser: bool = False,
+        cookie_header: Optional[str] = None,
+        bypass_cache: bool = False,
+    ) -> AsyncIterator[Tuple[int, CaptureOutcome]]:
+        """Yield ``(input_index, outcome)`` pairs as soon as each capture finishes."""
+
+        async def indexed(index: int, url: str) -> Tuple[int, CaptureOutcome]:
+            return index, await self.capture(
+                url,
+                force_browser=force_browser,
+                cookie_header=cookie_header,
+                bypass_cache=bypass_cache,
+            )
+
+        tasks = [asyncio.create_task(indexed(index, url)) for index, url in enumerate(urls)]
+        yielded: set[int] = set()
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                index, outcome = await next_done
+                yielded.add(index)
+                yield index, outcome
+        finally:
+            # The consumer may stop early (e.g. the client disconnected); don't leave captures running.
+            for task in tasks:
+                task.cancel()
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+            # Captures that finished but were never handed out get no history entry to hold their snapshot.
+            orphaned = [
+                result[1].metadata.content_hash
+                for result in results
+                if isinstance(result, tuple) and result[0] not in yielded and result[1].metadata is not None
+            ]
+            if orphaned:
+                await self.service.release_snapshots(orphaned)
+
+    async def capture(
+        self,
+        url: str,
+        force_browser: bool = False,
+        cookie_header: Optional[str] = None,
+        bypass_cache: bool = False,
+    ) -> CaptureOutcome:
+        async with self._host_slot(url), self._slots:
+            logger.info("Processing snapshot request", extra={"url": url})
+            try:
+                metadata = await self.service.create_snapshot(
+                    url,
+                    force_browser=force_browser,
+                    cookie_header=cookie_header,
+                    bypass_cache=bypass_cache,
+                )
+            except SnapshotError as exc:
+                logger.warning("Snapshot failed", extra={"url": url, "error": str(exc)})
+                return CaptureOutcome(
+                    original_url=url,
+                    captured_at=Settings.current_timestamp(),
+                    error=str(exc),
+                )
+        logger.info("Snapshot created", extra={"url": url, "file": str(metadata.archived_path or metadata.relative_url)})
+        return CaptureOutcome(
+            original_url=url,
+            captured_at=metadata.captured_at.isoformat(),
+            metadata=metadata,
+        )
+
+    @asynccontextmanager
+    async def _host_slot(self, url: str) -> AsyncIterator[None]:
+        host = (urlparse(url).hostname or "").lower()
+        slot = self._host_slots.get(host)
+        if slot is None:
+            slot = self._host_slots[host] = asyncio.Semaphore(self.per_host_concurrency)
+        self._host_users[host] = self._host_users.get(host, 0) + 1
+        try:
+            async with slot:
+                yield
+        finally:
+            users = self._host_users[host] - 1
+            if users:
+                self._host_users[host] = users
+            else:
+                del self._host_users[host]
+                del self._host_slots[host]
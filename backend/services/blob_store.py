@@ -0,0 +1,471 @@
+from __future__ import annotations
+
+import asyncio
+import gzip
+import hashlib
+import logging
+import mimetypes
+import shutil
+import threading
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, List, Optional, Union
+
+import aiofiles  # type: ignore[import-not-found]
+
+from backend.core.config import Settings
+from backend.core.sqlite import connect
+from backend.core.static_files import IMMUTABLE_CACHE_CONTROL, PRECOMPRESSED_SUFFIXES
+from backend.services import metrics
+from backend.services.storage import LocalStorage, StorageBackend
+
+try:
+    import brotli  # type: ignore[import-not-found]
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    digest TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    refcount INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS blob_links (
+    parent TEXT NOT NULL,
+    child TEXT NOT NULL,
+    PRIMARY KEY (parent, child)
+);
+"""
+# Output is batched into writes of at least this many bytes.
+_WRITE_BUFFER_BYTES = 64 * 1024
+# Only text formats are worth precompressing; images and fonts already are compressed.
+_COMPRESSIBLE_SUFFIXES = frozenset({".html", ".css", ".svg", ".js", ".json", ".xml", ".txt"})
+_GZIP_LEVEL = 9
+_BROTLI_QUALITY = 9
+# How often a write waits for a concurrent delete of the same blob to finish.
+_DELETE_POLL_SECONDS = 0.05
+
+
+@dataclass(slots=True)
+class BlobRef:
+    digest: str
+    relative_path: str
+    # Only set when the store is a local directory.
+    path: Optional[Path]
+    created: bool
+
+
+@dataclass(slots=True)
+class BlobInfo:
+    digest: str
+    relative_path: str
+    size: int
+    # Digests this blob holds a reference on (see :meth:`BlobStore.link`).
+    children: List[str]
+
+
+class BlobWriter:
+    """Streams one document into a temporary file, hashing it as it goes.
+
+    ``header`` is written first but left out of the digest, so the same content
+    captured at different times still lands on the same blob. Use as an async
+    context manager; the temporary file is removed unless :meth:`commit` ran.
+    """
+
+    def __init__(self, store: BlobStore, header: bytes = b"") -> None:
+        self.store = store
+        self.header = header
+        self.tmp_path = store.tmp_dir / f"{uuid.uuid4().hex}.part"
+        self.size = 0
+        self._hash = hashlib.sha256()
+        self._pending: List[bytes] = []
+        self._pending_size = 0
+        self._file = None
+        self._committed = False
+
+    async def __aenter__(self) -> BlobWriter:
+        self._file = await aiofiles.open(self.tmp_path, "wb")
+        if self.header:
+            await self._file.write(self.header)
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        if self._file is not None:
+            await self._file.close()
+            self._file = None
+        if not self._committed:
+            self.tmp_path.unlink(missing_ok=True)
+
+    async def write(self, data: bytes) -> None:
+        if not data:
+            return
+        self._hash.update(data)
+        self.size += len(data)
+        self._pending.append(data)
+        self._pending_size += len(data)
+        if self._pending_size >= _WRITE_BUFFER_BYTES:
+            await self._flush()
+
+    async def commit(self) -> BlobRef:
+        """Finish the file and move it into the store under its digest."""
+        await self._flush()
+        await self._file.close()
+        self._file = None
+        ref = await self.store._adopt(self._hash.hexdigest(), self.tmp_path, len(self.header) + self.size)
+        self._committed = True
+        return ref
+
+    async def _flush(self) -> None:
+        if self._pending:
+            await self._file.write(b"".join(self._pending))
+            self._pending = []
+            self._pending_size = 0
+
+
+class BlobStore:
+    """Content-addressed snapshot files with reference counts.
+
+    Each distinct sanitized document is written once to
+    ``objects/<digest[:2]>/<digest>.html`` in the storage backend (by default a
+    :class:`LocalStorage` at ``root``); every capture that points at it holds
+    one reference, and the file is removed when the last one is released.
+    Reference counts live in the SQLite ``index_db``.
+
+    Archived page assets live under ``assets/``. A document (or stylesheet)
+    holds one reference on each asset it is linked to, released with it.
+
+    With ``compression`` (``"br"``, ``"gzip"``), text files also get ``.br``/``.gz``
+    siblings for :class:`~backend.core.static_files.SnapshotStaticFiles` to
+    serve as they are. Unless ``keep_uncompressed`` is set, the plain copy is
+    dropped and a gzip copy is always kept.
+
+    With ``delete_unreferenced`` off, released files stay in storage (for
+    replicas that share a bucket but not a catalog; clean up with lifecycle rules).
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        index_db: Path,
+        compression: Iterable[str] = (),
+        keep_uncompressed: bool = True,
+        storage: Optional[StorageBackend] = None,
+        delete_unreferenced: bool = True,
+    ) -> None:
+        encodings: List[str] = []
+        for encoding in compression:
+            encoding = encoding.lower()
+            if encoding not in PRECOMPRESSED_SUFFIXES:
+                raise ValueError(f"Unsupported snapshot compression: {encoding!r}")
+            if encoding == "br" and brotli is None:
+                logger.warning("Brotli compression requested but the 'brotli' package is missing; skipping it")
+                continue
+            if encoding not in encodings:
+                encodings.append(encoding)
+        if not keep_uncompressed and "gzip" not in encodings:
+            # Clients that accept no encoding at all are served the gzip copy, decompressed.
+            encodings.append("gzip")
+        self.compression = tuple(encodings)
+        self.keep_uncompressed = keep_uncompressed
+        self.root = root
+        self.storage = storage or LocalStorage(root)
+        self.delete_unreferenced = delete_unreferenced
+        self.tmp_dir = self.storage.scratch_dir
+        self._connection = connect(index_db)
+        self._connection.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        # Digests whose rows are gone but whose files are still being deleted.
+        self._deleting: set[str] = set()
+
+    @staticmethod
+    def digest_of(content: bytes) -> str:
+        return hashlib.sha256(content).hexdigest()
+
+    def relative_path(self, digest: str) -> str:
+        return f"objects/{digest[:2]}/{digest}.html"
+
+    def asset_relative_path(self, digest: str, extension: str) -> str:
+        return f"assets/{digest[:2]}/{digest}{extension}"
+
+    async def put(self, digest: str, document: bytes, relative_path: Optional[str] = None) -> BlobRef:
+        """Store ``document`` under ``digest`` unless it is already there, and take a reference."""
+        tmp_path = await asyncio.to_thread(self._write_tmp, document)
+        return await self._adopt(digest, tmp_path, len(document), relative_path)
+
+    async def put_asset(self, content: bytes, extension: str) -> BlobRef:
+        """Store a page asset by content and take a reference, like :meth:`put`."""
+        digest = self.digest_of(content)
+        tmp_path = await asyncio.to_thread(self._write_tmp, content)
+        return await self._adopt(digest, tmp_path, len(content), self.asset_relative_path(digest, extension))
+
+    async def link(self, parent: str, children: Iterable[str]) -> None:
+        """Make ``parent`` hold a reference on each child until it is itself removed."""
+        items = sorted({child for child in children if child and child != parent})
+        if items:
+            await asyncio.to_thread(self._link, parent, items)
+
+    def writer(self, header: bytes = b"") -> BlobWriter:
+        """Stream a document to disk; see :class:`BlobWriter`."""
+        return BlobWriter(self, header)
+
+    async def acquire(self, digest: str) -> Optional[BlobRef]:
+        """Take another reference on an existing blob; ``None`` if it is gone."""
+        relative_path = await asyncio.to_thread(self._path_of, digest)
+        if relative_path is None or not await self._stored(relative_path):
+            return None
+        if not await asyncio.to_thread(self._acquire, digest):
+            return None
+        return self._ref(digest, relative_path, created=False)
+
+    async def lookup(self, digest: str) -> Optional[BlobInfo]:
+        """Catalog entry for ``digest`` without taking a reference."""
+        return await asyncio.to_thread(self._lookup, digest)
+
+    async def read(self, relative_path: str) -> Optional[bytes]:
+        """Contents of a stored file, decompressing the gzip copy when there is no plain one."""
+        data = await self.storage.get(relative_path)
+        if data is None:
+            compressed = await self.storage.get(relative_path + PRECOMPRESSED_SUFFIXES["gzip"])
+            if compressed is not None:
+                data = await asyncio.to_thread(gzip.decompress, compressed)
+        return data
+
+    async def release(self, digests: Iterable[str]) -> int:
+        """Drop one reference per digest; returns how many blobs were deleted."""
+        items = [digest for digest in digests if digest]
+        if not items:
+            return 0
+        orphans = await asyncio.to_thread(self._release, items)
+        try:
+            if self.delete_unreferenced and orphans:
+                await self.storage.delete(key for _, path in orphans for key in self._variant_keys(path))
+        finally:
+            with self._lock:
+                self._deleting.difference_update(digest for digest, _ in orphans)
+        return len(orphans)
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    async def _adopt(self, digest: str, tmp_path: Path, size: int, relative_path: Optional[str] = None) -> BlobRef:
+        """Upload a finished temp file (unless the blob exists) and take a reference."""
+        relative_path = relative_path or self.relative_path(digest)
+        try:
+            while True:
+                claimed = await asyncio.to_thread(self._claim, digest)
+                if claimed is not False:
+                    break
+                # The last reference was just dropped; let its files go before writing them again.
+                await asyncio.sleep(_DELETE_POLL_SECONDS)
+            try:
+                if claimed is not None and await self._stored(claimed):
+                    return self._ref(digest, claimed, created=False)
+                # New content, or the row outlived its files (removed by hand): write them.
+                await self._upload(tmp_path, claimed or relative_path, size)
+            except BaseException:
+                if claimed is not None:
+                    await asyncio.shield(self.release([digest]))
+                raise
+            if claimed is None:
+                await asyncio.to_thread(self._insert, digest, relative_path, size)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+        return self._ref(digest, claimed or relative_path, created=True)
+
+    async def _upload(self, tmp_path: Path, relative_path: str, size: int) -> None:
+        variants: dict[str, Path] = {}
+        if self.compression and Path(relative_path).suffix in _COMPRESSIBLE_SUFFIXES:
+            variants = await asyncio.to_thread(self._compress, tmp_path, size)
+        content_type = mimetypes.guess_type(relative_path)[0]
+        kind = "asset" if relative_path.startswith("assets/") else "document"
+        try:
+            for encoding, suffix in PRECOMPRESSED_SUFFIXES.items():
+                if suffix in variants:
+                    written = variants[suffix].stat().st_size
+                    await self.storage.put_file(
+                        relative_path + suffix,
+                        variants[suffix],
+                        content_type=content_type,
+                        content_encoding=encoding,
+                        cache_control=IMMUTABLE_CACHE_CONTROL,
+                    )
+                    metrics.BYTES_WRITTEN.inc(written, kind=kind)
+            if self.keep_uncompressed or not variants:
+                await self.storage.put_file(
+                    relative_path,
+                    tmp_path,
+                    content_type=content_type,
+                    cache_control=IMMUTABLE_CACHE_CONTROL,
+                )
+                metrics.BYTES_WRITTEN.inc(size, kind=kind)
+        finally:
+            for variant in variants.values():
+                variant.unlink(missing_ok=True)
+
+    async def _stored(self, relative_path: str) -> bool:
+        for key in self._variant_keys(relative_path):
+            if await self.storage.exists(key):
+                return True
+        return False
+
+    def _ref(self, digest: str, relative_path: str, created: bool) -> BlobRef:
+        return BlobRef(
+            digest=digest,
+            relative_path=relative_path,
+            path=self.storage.local_path(relative_path),
+            created=created,
+        )
+
+    def _write_tmp(self, content: bytes) -> Path:
+        tmp_path = self.tmp_dir / f"{uuid.uuid4().hex}.part"
+        tmp_path.write_bytes(content)
+        return tmp_path
+
+    def _claim(self, digest: str) -> Union[str, None, bool]:
+        """Take a reference on an existing row: its path, ``None`` if there is none, ``False`` while deleting."""
+        with self._lock:
+            if digest in self._deleting:
+                return False
+            row = self._connection.execute("SELECT path FROM blobs WHERE digest = ?", (digest,)).fetchone()
+            if row is None:
+                return None
+            self._connection.execute("UPDATE blobs SET refcount = refcount + 1 WHERE digest = ?", (digest,))
+            return row["path"]
+
+    def _insert(self, digest: str, relative_path: str, size: int) -> None:
+        with self._lock:
+            self._connection.execute(
+                "INSERT INTO blobs (digest, path, size, refcount, created_at) VALUES (?, ?, ?, 1, ?) "
+                "ON CONFLICT(digest) DO UPDATE SET refcount = refcount + 1",
+                (digest, relative_path, size, Settings.current_timestamp()),
+            )
+
+    def _path_of(self, digest: str) -> Optional[str]:
+        with self._lock:
+            row = self._connection.execute("SELECT path FROM blobs WHERE digest = ?", (digest,)).fetchone()
+        return row["path"] if row else None
+
+    def _lookup(self, digest: str) -> Optional[BlobInfo]:
+        with self._lock:
+            row = self._connection.execute("SELECT path, size FROM blobs WHERE digest = ?", (digest,)).fetchone()
+            if row is None:
+                return None
+            children = [
+                link["child"]
+                for link in self._connection.execute(
+                    "SELECT child FROM blob_links WHERE parent = ? ORDER BY child",
+                    (digest,),
+                )
+            ]
+        return BlobInfo(digest=digest, relative_path=row["path"], size=row["size"], children=children)
+
+    def _acquire(self, digest: str) -> bool:
+        with self._lock:
+            cursor = self._connection.execute(
+                "UPDATE blobs SET refcount = refcount + 1 WHERE digest = ? AND refcount > 0",
+                (digest,),
+            )
+            return cursor.rowcount > 0
+
+    def _link(self, parent: str, children: list[str]) -> None:
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                for child in children:
+                    cursor = self._connection.execute(
+                        "INSERT OR IGNORE INTO blob_links (parent, child) VALUES (?, ?)",
+                        (parent, child),
+                    )
+                    if cursor.rowcount:
+                        self._connection.execute(
+                            "UPDATE blobs SET refcount = refcount + 1 WHERE digest = ?",
+                            (child,),
+                        )
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+            self._connection.execute("COMMIT")
+
+    def _release(self, digests: list[str]) -> list[tuple[str, str]]:
+        """Drop references in one transaction; returns the ``(digest, path)`` of removed blobs."""
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                orphans = []
+                pending = digests
+                # Removing a blob releases everything it links to, which may cascade.
+                while pending:
+                    for digest in pending:
+                        self._connection.execute(
+                            "UPDATE blobs SET refcount = refcount - 1 WHERE digest = ?",
+                            (digest,),
+                        )
+                    unique = sorted(set(pending))
+                    placeholders = ", ".join("?" * len(unique))
+                    found = self._connection.execute(
+                        f"SELECT digest, path FROM blobs WHERE refcount <= 0 AND digest IN ({placeholders})",
+                        unique,
+                    ).fetchall()
+                    self._connection.executemany(
+                        "DELETE FROM blobs WHERE digest = ?",
+                        [(row["digest"],) for row in found],
+                    )
+                    orphans.extend(found)
+                    if not found:
+                        break
+                    parents = [row["digest"] for row in found]
+                    placeholders = ", ".join("?" * len(parents))
+                    pending = [
+                        row["child"]
+                        for row in self._connection.execute(
+                            f"SELECT child FROM blob_links WHERE parent IN ({placeholders})",
+                            parents,
+                        )
+                    ]
+                    self._connection.execute(f"DELETE FROM blob_links WHERE parent IN ({placeholders})", parents)
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+            self._connection.execute("COMMIT")
+            # Until the files are gone, a put() of the same content waits instead of
+            # finding no row, writing the files and then losing them.
+            self._deleting.update(row["digest"] for row in orphans)
+        return [(row["digest"], row["path"]) for row in orphans]
+
+    def _compress(self, tmp_path: Path, size: int) -> dict[str, Path]:
+        """Write one compressed copy of ``tmp_path`` per configured encoding; returns suffix -> temp file."""
+        variants: dict[str, Path] = {}
+        try:
+            for encoding in self.compression:
+                suffix = PRECOMPRESSED_SUFFIXES[encoding]
+                target = variants[suffix] = tmp_path.with_name(tmp_path.name + suffix)
+                with open(tmp_path, "rb") as source:
+                    if encoding == "gzip":
+                        # mtime=0 keeps the output a pure function of the content.
+                        with gzip.GzipFile(target, "wb", compresslevel=_GZIP_LEVEL, mtime=0) as sink:
+                            shutil.copyfileobj(source, sink, _WRITE_BUFFER_BYTES)
+                    else:
+                        compressor = brotli.Compressor(quality=_BROTLI_QUALITY)
+                        with open(target, "wb") as sink:
+                            while chunk := source.read(_WRITE_BUFFER_BYTES):
+                                sink.write(compressor.process(chunk))
+                            sink.write(compressor.finish())
+                if self.keep_uncompressed and target.stat().st_size >= size:
+                    # Nothing gained; the plain copy serves this encoding just as well.
+                    target.unlink()
+                    del variants[suffix]
+        except BaseException:
+            for variant in variants.values():
+                variant.unlink(missing_ok=True)
+            raise
+        return variants
+
+    @staticmethod
+    def _variant_keys(relative_path: str) -> list[str]:
+        return [relative_path, *(relative_path + suffix for suffix in PRECOMPRESSED_SUFFIXES.values())]
@@ -1,14 +1,23 @@
 from __future__ import annotations
 
 import asyncio
+import logging
 import os
+from collections import OrderedDict
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Any, Hashable, Optional
+from urllib.parse import urlparse
+
+from backend.services import metrics
 
 try:  # pragma: no cover - import-time optional dependency
-    from playwright.sync_api import Error as PlaywrightError, sync_playwright  # type: ignore
+    from playwright.async_api import Error as PlaywrightError, async_playwright  # type: ignore
 except Exception:  # pragma: no cover
     PlaywrightError = Exception  # type: ignore
-    sync_playwright = None
+    async_playwright = None
+
+logger = logging.getLogger(__name__)
 
 MOBILE_UA = (
     "Mozilla/5.0 (iPhone; CPU iPhone OS 15_0 like Mac OS X) "
@@ -21,11 +30,178 @@ class BrowserRenderingError(Exception):
     """Raised when Playwright fails to render a page."""
 
 
+class BrowserBusyError(BrowserRenderingError):
+    """Raised when the render queue is full or waiting for a slot timed out."""
+
+
+@dataclass(frozen=True, slots=True)
+class RoutePolicy:
+    """Which sub-requests a page render aborts instead of loading."""
+
+    blocked_resource_types: frozenset[str] = frozenset()
+    # Matched against the request host and all of its parent domains.
+    blocked_domains: frozenset[str] = frozenset()
+
+    @property
+    def active(self) -> bool:
+        return bool(self.blocked_resource_types or self.blocked_domains)
+
+    def blocks(self, resource_type: str, url: str) -> bool:
+        if resource_type in self.blocked_resource_types:
+            return True
+        host = (urlparse(url).hostname or "").lower()
+        while host:
+            if host in self.blocked_domains:
+                return True
+            _, _, host = host.partition(".")
+        return False
+
+
+@dataclass(frozen=True, slots=True)
+class SettleStrategy:
+    """When a rendered page counts as finished.
+
+    After DOMContentLoaded the page is scrolled a viewport at a time. Once at the
+    bottom it is done when the document height and the number of pending images
+    have stayed the same for ``stable_rounds`` checks, when the DOM has had no
+    mutations for ``quiet_ms``, or as soon as ``ready_selector`` matches. The
+    whole wait never exceeds ``budget_seconds``.
+    """
+
+    budget_seconds: float = 15.0
+    quiet_ms: int = 800
+    step_ms: int = 120
+    stable_rounds: int = 2
+    max_scrolls: int = 200
+    ready_selector: Optional[str] = None
+
+
+@dataclass(frozen=True, slots=True)
+class RenderProfile:
+    route_policy: RoutePolicy = RoutePolicy()
+    settle: SettleStrategy = SettleStrategy()
+
+
+# Runs inside the page; resolves with why settling stopped.
+_SETTLE_SCRIPT = """
+async ({budgetMs, quietMs, stepMs, stableRounds, maxScrolls, readySelector}) => {
+  const start = performance.now();
+  let lastMutation = start;
+  const observer = new MutationObserver(() => { lastMutation = performance.now(); });
+  observer.observe(document, {subtree: true, childList: true, attributes: true});
+  const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+  const pendingImages = () => {
+    let pending = 0;
+    for (const img of document.images) {
+      const src = img.getAttribute('src') || '';
+      if (!img.complete || (img.hasAttribute('data-src') && (!src || src.startsWith('data:')))) pending += 1;
+    }
+    return pending;
+  };
+  const height = () => Math.max(document.documentElement.scrollHeight, document.body ? document.body.scrollHeight : 0);
+  let scrolls = 0;
+  let stable = 0;
+  let previous = '';
+  let reason = 'budget';
+  try {
+    while (performance.now() - start < budgetMs) {
+      if (readySelector && document.querySelector(readySelector)) { reason = 'selector'; break; }
+      const atBottom = window.scrollY + window.innerHeight >= height() - 2;
+      if (!atBottom) {
+        if (scrolls >= maxScrolls) { reason = 'max_scrolls'; break; }
+        window.scrollBy(0, window.innerHeight);
+        scrolls += 1;
+        await sleep(stepMs);
+        continue;
+      }
+      const signature = `${height()}:${pendingImages()}`;
+      stable = signature === previous ? stable + 1 : 0;
+      previous = signature;
+      if (stable >= stableRounds) { reason = 'stable'; break; }
+      if (performance.now() - lastMutation >= quietMs) { reason = 'quiet'; break; }
+      await sleep(stepMs);
+    }
+  } finally {
+    observer.disconnect();
+  }
+  return {reason, scrolls, height: height(), elapsedMs: Math.round(performance.now() - start)};
+}
+"""
+
+
+class _BrowserSlot:
+    """One long-lived Chromium process and the contexts cached inside it."""
+
+    def __init__(self, index: int) -> None:
+        self.index = index
+        self.browser: Any = None
+        self.contexts: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self.context_users: dict[Hashable, int] = {}
+        self.active_pages = 0
+        self.pages_served = 0
+        self.restarts = 0
+        self.blocked_requests = 0
+        self.draining = False
+        self.context_lock = asyncio.Lock()
+
+    @property
+    def alive(self) -> bool:
+        if self.browser is None:
+            return False
+        try:
+            return bool(self.browser.is_connected())
+        except PlaywrightError:  # pragma: no cover
+            return False
+
+    def health(self) -> dict[str, Any]:
+        return {
+            "worker": self.index,
+            "running": self.browser is not None,
+            "connected": self.alive,
+            "contexts": len(self.contexts),
+            "active_pages": self.active_pages,
+            "pages_served": self.pages_served,
+            "restarts": self.restarts,
+            "blocked_requests": self.blocked_requests,
+            "draining": self.draining,
+        }
+
+
 class BrowserRenderer:
-    def __init__(self, headless: bool | None = True, timeout_seconds: float = 45.0) -> None:
+    def __init__(
+        self,
+        headless: bool | None = True,
+        timeout_seconds: float = 45.0,
+        instances: int = 1,
+        max_pages_per_browser: int = 200,
+        max_contexts: int = 8,
+        max_concurrency: int = 2,
+        queue_size: int = 16,
+        queue_timeout: float = 30.0,
+        per_host_limit: int = 2,
+        profile: Optional[RenderProfile] = None,
+        host_profiles: Optional[dict[str, RenderProfile]] = None,
+    ) -> None:
         self.headless = headless
         # Playwright expects milliseconds for most timeouts.
         self.timeout_ms = int(timeout_seconds * 1000)
+        self.max_pages_per_browser = max(1, max_pages_per_browser)
+        self.max_contexts = max(1, max_contexts)
+        self.max_concurrency = max(1, max_concurrency)
+        self.queue_size = max(0, queue_size)
+        self.queue_timeout = queue_timeout
+        self.per_host_limit = max(1, per_host_limit)
+        self.profile = profile or RenderProfile()
+        self.host_profiles = {host.lower(): item for host, item in (host_profiles or {}).items()}
+        self._slots = [_BrowserSlot(index) for index in range(max(1, instances))]
+        self._playwright: Any = None
+        self._launch_lock = asyncio.Lock()
+        self._render_slots = asyncio.Semaphore(self.max_concurrency)
+        self._host_slots: dict[str, asyncio.Semaphore] = {}
+        # Renders holding or waiting for each host slot; the slot is dropped when this reaches 0.
+        self._host_users: dict[str, int] = {}
+        self._waiting = 0
+        self._closed = False
 
     async def render(
         self,
@@ -33,24 +209,218 @@ class BrowserRenderer:
         storage_state: Path | None = None,
         cookies: list[dict[str, str]] | None = None,
     ) -> str:
-        if sync_playwright is None:
+        if async_playwright is None:
             raise BrowserRenderingError(
                 "Playwright is not installed. Run: pip install playwright && playwright install chromium"
             )
+        if self._closed:
+            raise BrowserRenderingError("Browser renderer has been shut down.")
+        if self._waiting >= self.queue_size and self._render_slots.locked():
+            raise BrowserBusyError("Browser render queue is full, try again later.")
 
-        loop = asyncio.get_running_loop()
-        return await loop.run_in_executor(None, self._render_sync, url, storage_state, cookies)
+        host = (urlparse(url).hostname or "").lower()
+        host_slot = self._host_slot(host)
+        try:
+            self._waiting += 1
+            try:
+                with metrics.stage("browser_queue"):
+                    await asyncio.wait_for(self._wait_for_slots(host_slot), timeout=self.queue_timeout)
+            except asyncio.TimeoutError as exc:
+                raise BrowserBusyError("Timed out waiting for a free browser slot.") from exc
+            finally:
+                self._waiting -= 1
+            try:
+                return await self._render_with_retry(url, storage_state, cookies)
+            finally:
+                self._render_slots.release()
+                host_slot.release()
+        finally:
+            self._leave_host_slot(host)
+
+    async def health(self) -> list[dict[str, Any]]:
+        return [slot.health() for slot in self._slots]
+
+    def occupancy(self) -> dict[str, int]:
+        active = sum(slot.active_pages for slot in self._slots)
+        return {"active": active, "capacity": self.max_concurrency, "waiting": self._waiting}
+
+    async def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        async with self._launch_lock:
+            for slot in self._slots:
+                await self._shutdown_slot(slot)
+            if self._playwright is not None:
+                try:
+                    await self._playwright.stop()
+                except Exception:  # pragma: no cover - driver already gone
+                    pass
+                self._playwright = None
 
-    def _render_sync(
+    async def _wait_for_slots(self, host_slot: asyncio.Semaphore) -> None:
+        # Take the per-host slot first so a busy host never pins a global render slot.
+        await host_slot.acquire()
+        try:
+            await self._render_slots.acquire()
+        except BaseException:
+            host_slot.release()
+            raise
+
+    async def _render_with_retry(
         self,
         url: str,
-        storage_state: Path | None = None,
-        cookies: list[dict[str, str]] | None = None,
+        storage_state: Path | None,
+        cookies: list[dict[str, str]] | None,
     ) -> str:
+        slot = await self._acquire_slot()
+        try:
+            return await self._render_in_slot(slot, url, storage_state, cookies)
+        except PlaywrightError as exc:
+            if slot.alive:
+                raise BrowserRenderingError(str(exc)) from exc
+        finally:
+            await self._release_slot(slot)
+
+        # The browser process went away underneath us; relaunch and retry once.
+        logger.warning("Browser %s crashed, restarting", slot.index, extra={"url": url})
+        slot = await self._acquire_slot()
+        try:
+            return await self._render_in_slot(slot, url, storage_state, cookies)
+        except PlaywrightError as exc:  # pragma: no cover - requires browser runtime
+            raise BrowserRenderingError(str(exc)) from exc
+        finally:
+            await self._release_slot(slot)
+
+    async def _render_in_slot(
+        self,
+        slot: _BrowserSlot,
+        url: str,
+        storage_state: Path | None,
+        cookies: list[dict[str, str]] | None,
+    ) -> str:
+        key = self._context_key(storage_state, cookies)
+        context = await self._acquire_context(slot, key, storage_state, cookies)
+        try:
+            page = await context.new_page()
+            try:
+                profile = self.profile_for(url)
+                await self._install_routes(slot, page, profile.route_policy)
+                return await self._render_page(page, url, profile.settle)
+            finally:
+                slot.pages_served += 1
+                try:
+                    await page.close()
+                except PlaywrightError:  # pragma: no cover - page already gone with the browser
+                    pass
+        finally:
+            await self._release_context(slot, key)
+
+    async def _install_routes(self, slot: _BrowserSlot, page: Any, policy: RoutePolicy) -> None:
+        if not policy.active:
+            return
+
+        async def handle(route: Any) -> None:
+            request = route.request
+            # Never abort the page we were asked to render.
+            if request.is_navigation_request() and request.frame == page.main_frame:
+                await route.continue_()
+            elif policy.blocks(request.resource_type, request.url):
+                slot.blocked_requests += 1
+                await route.abort("blockedbyclient")
+            else:
+                await route.continue_()
+
+        # Routes live on the page, not the shared context, because the policy
+        # depends on which site is being rendered.
+        await page.route("**/*", handle)
+
+    def profile_for(self, url: str) -> RenderProfile:
+        """The most specific host profile matching ``url``, else the default."""
+        host = (urlparse(url).hostname or "").lower()
+        while host:
+            profile = self.host_profiles.get(host)
+            if profile is not None:
+                return profile
+            _, _, host = host.partition(".")
+        return self.profile
+
+    async def _render_page(self, page: Any, url: str, settle: SettleStrategy) -> str:
+        page.set_default_navigation_timeout(self.timeout_ms)
+        with metrics.stage("navigate", url=url):
+            await page.goto(url, wait_until="domcontentloaded", timeout=self.timeout_ms)
+        options = {
+            "budgetMs": int(settle.budget_seconds * 1000),
+            "quietMs": settle.quiet_ms,
+            "stepMs": settle.step_ms,
+            "stableRounds": settle.stable_rounds,
+            "maxScrolls": settle.max_scrolls,
+            "readySelector": settle.ready_selector,
+        }
         try:
-            with sync_playwright() as playwright:
-                browser = playwright.chromium.launch(headless=self._resolve_headless())
-                context = browser.new_context(
+            # The script enforces the budget itself; the outer timeout only guards a hung page.
+            with metrics.stage("settle"):
+                result = await asyncio.wait_for(
+                    page.evaluate(_SETTLE_SCRIPT, options),
+                    timeout=settle.budget_seconds + 5,
+                )
+            logger.info("Page settled", extra={"url": url, **result})
+        except asyncio.TimeoutError:
+            logger.warning("Page did not settle within budget", extra={"url": url})
+        except PlaywrightError as exc:
+            # Typically a client-side redirect replaced the document mid-scroll;
+            # capture whatever is there now. A dead browser fails in content().
+            logger.warning("Settling interrupted", extra={"url": url, "error": str(exc)})
+        return await page.content()
+
+    async def _acquire_slot(self) -> _BrowserSlot:
+        async with self._launch_lock:
+            if self._closed:
+                raise BrowserRenderingError("Browser renderer has been shut down.")
+            for slot in self._slots:
+                if slot.draining and slot.active_pages == 0:
+                    logger.info("Recycling browser %s after %s pages", slot.index, slot.pages_served)
+                    await self._shutdown_slot(slot)
+            candidates = [slot for slot in self._slots if not slot.draining] or self._slots
+            slot = min(candidates, key=lambda item: item.active_pages)
+            if not slot.alive:
+                try:
+                    with metrics.stage("browser_launch"):
+                        await self._launch(slot)
+                except PlaywrightError as exc:
+                    raise BrowserRenderingError(f"Failed to launch browser: {exc}") from exc
+            slot.active_pages += 1
+            return slot
+
+    async def _release_slot(self, slot: _BrowserSlot) -> None:
+        slot.active_pages -= 1
+        if slot.pages_served >= self.max_pages_per_browser:
+            slot.draining = True
+        if slot.draining and slot.active_pages == 0:
+            async with self._launch_lock:
+                if slot.draining and slot.active_pages == 0:
+                    logger.info("Recycling browser %s after %s pages", slot.index, slot.pages_served)
+                    await self._shutdown_slot(slot)
+
+    async def _launch(self, slot: _BrowserSlot) -> None:
+        if slot.browser is not None:
+            await self._shutdown_slot(slot)
+        if self._playwright is None:
+            self._playwright = await async_playwright().start()
+        slot.browser = await self._playwright.chromium.launch(headless=self._resolve_headless())
+        slot.restarts += 1
+
+    async def _acquire_context(
+        self,
+        slot: _BrowserSlot,
+        key: Hashable,
+        storage_state: Path | None,
+        cookies: list[dict[str, str]] | None,
+    ) -> Any:
+        async with slot.context_lock:
+            context = slot.contexts.get(key)
+            if context is None:
+                context = await slot.browser.new_context(
                     user_agent=MOBILE_UA,
                     viewport={"width": 414, "height": 896},
                     extra_http_headers={
@@ -60,20 +430,79 @@ class BrowserRenderer:
                     storage_state=str(storage_state) if storage_state else None,
                 )
                 if cookies:
-                    context.add_cookies(cookies)
-                page = context.new_page()
-                page.set_default_navigation_timeout(self.timeout_ms)
-                page.goto(url, wait_until="networkidle", timeout=self.timeout_ms)
-                for _ in range(6):
-                    page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
-                    page.wait_for_timeout(200)
-                page.wait_for_load_state("networkidle", timeout=self.timeout_ms)
-                html = page.content()
-                context.close()
-                browser.close()
-                return html
-        except PlaywrightError as exc:  # pragma: no cover - requires browser runtime
-            raise BrowserRenderingError(str(exc)) from exc
+                    await context.add_cookies(cookies)
+                slot.contexts[key] = context
+            slot.contexts.move_to_end(key)
+            slot.context_users[key] = slot.context_users.get(key, 0) + 1
+        await self._evict_contexts(slot)
+        return context
+
+    async def _release_context(self, slot: _BrowserSlot, key: Hashable) -> None:
+        remaining = slot.context_users.get(key, 1) - 1
+        if remaining > 0:
+            slot.context_users[key] = remaining
+            return
+        slot.context_users.pop(key, None)
+        await self._evict_contexts(slot)
+
+    async def _evict_contexts(self, slot: _BrowserSlot) -> None:
+        # Contexts with open pages are skipped and closed once their last page is released.
+        idle = [key for key in slot.contexts if key not in slot.context_users]
+        while len(slot.contexts) > self.max_contexts and idle:
+            stale = slot.contexts.pop(idle.pop(0))
+            try:
+                await stale.close()
+            except PlaywrightError:  # pragma: no cover
+                pass
+
+    async def _shutdown_slot(self, slot: _BrowserSlot) -> None:
+        for context in slot.contexts.values():
+            try:
+                await context.close()
+            except PlaywrightError:
+                pass
+        slot.contexts.clear()
+        slot.context_users.clear()
+        if slot.browser is not None:
+            try:
+                await slot.browser.close()
+            except PlaywrightError:
+                pass
+        slot.browser = None
+        slot.pages_served = 0
+        slot.draining = False
+
+    def _host_slot(self, host: str) -> asyncio.Semaphore:
+        slot = self._host_slots.get(host)
+        if slot is None:
+            slot = self._host_slots[host] = asyncio.Semaphore(self.per_host_limit)
+        self._host_users[host] = self._host_users.get(host, 0) + 1
+        return slot
+
+    def _leave_host_slot(self, host: str) -> None:
+        users = self._host_users[host] - 1
+        if users:
+            self._host_users[host] = users
+        else:
+            # Nobody holds or waits for it, so the semaphore is back at per_host_limit.
+            del self._host_users[host]
+            del self._host_slots[host]
+
+    @staticmethod
+    def _context_key(
+        storage_state: Path | None,
+        cookies: list[dict[str, str]] | None,
+    ) -> Hashable:
+        state_key: tuple[str, float] | None = None
+        if storage_state:
+            try:
+                mtime = storage_state.stat().st_mtime
+            except OSError:
+                mtime = 0.0
+            # Re-capturing a session rewrites the file, which must not reuse the stale context.
+            state_key = (str(storage_state), mtime)
+        cookie_key = tuple(sorted(tuple(sorted(cookie.items())) for cookie in cookies or []))
+        return (state_key, cookie_key)
 
     def _resolve_headless(self) -> bool:
         if self.headless is not None:
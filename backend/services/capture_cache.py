@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
+from typing import TYPE_CHECKING, Awaitable, Callable, Optional
+from urllib.parse import urlsplit, urlunsplit
+
+from backend.services import metrics
+from backend.services.blob_store import BlobStore
+
+if TYPE_CHECKING:
+    from backend.services.snapshot_service import SnapshotMetadata
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+
+CaptureKey = tuple[str, str, bool]
+
+
+@dataclass(slots=True)
+class _Flight:
+    task: asyncio.Task[SnapshotMetadata] = field(init=False)
+    # Callers awaiting the task; each one is handed its own blob reference.
+    waiters: int = 0
+    handed_out: bool = False
+
+
+class CaptureCache:
+    """Shares captures of the same page between callers.
+
+    Concurrent requests for the same URL (and the same cookies) join a single
+    in-flight capture instead of fetching and rendering it again. With a
+    positive ``ttl_seconds``, a successful capture is also handed to later
+    requests for that long unless they ask to bypass the cache.
+
+    Every caller owns a blob reference, exactly as if it had captured the page
+    itself, so deleting one history entry never removes another's snapshot.
+    """
+
+    def __init__(self, blob_store: BlobStore, ttl_seconds: float = 0.0, max_entries: int = 1024) -> None:
+        self.blob_store = blob_store
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max(1, max_entries)
+        self._flights: dict[CaptureKey, _Flight] = {}
+        self._recent: OrderedDict[CaptureKey, tuple[float, SnapshotMetadata]] = OrderedDict()
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+    @staticmethod
+    def key(url: str, cookie_header: Optional[str], force_browser: bool) -> CaptureKey:
+        auth = hashlib.sha256(cookie_header.encode("utf-8")).hexdigest()[:32] if cookie_header else ""
+        return normalize_url(url), auth, force_browser
+
+    async def get_or_capture(
+        self,
+        key: CaptureKey,
+        capture: Callable[[], Awaitable[SnapshotMetadata]],
+        bypass_cache: bool = False,
+    ) -> SnapshotMetadata:
+        if not bypass_cache:
+            cached = await self._cached(key)
+            if cached is not None:
+                return cached
+
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight()
+            flight.task = asyncio.create_task(self._fly(key, flight, capture))
+            self._flights[key] = flight
+            shared = False
+        else:
+            logger.info("Joining in-flight capture", extra={"url": key[0]})
+            shared = True
+
+        flight.waiters += 1
+        try:
+            # Shielded: one caller going away must not cancel the capture for the others.
+            metadata = await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            flight.waiters -= 1
+            if flight.handed_out and not flight.task.cancelled() and flight.task.exception() is None:
+                # Our reference was already taken; give it back.
+                await asyncio.shield(self.blob_store.release([flight.task.result().content_hash]))
+            raise
+        if not shared:
+            return metadata
+        metrics.REUSED.inc(source="in_flight")
+        return replace(metadata, reused=True)
+
+    async def _fly(
+        self,
+        key: CaptureKey,
+        flight: _Flight,
+        capture: Callable[[], Awaitable[SnapshotMetadata]],
+    ) -> SnapshotMetadata:
+        try:
+            metadata = await capture()
+        finally:
+            # From here on nobody can join, so the number of waiters only goes down.
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        # The capture took one reference; every other waiter needs one of its own,
+        # and with nobody left waiting the capture's reference is dropped. Waiters
+        # that give up meanwhile are settled here too, before anyone gets the result.
+        held = 1
+        while held != flight.waiters:
+            delta = flight.waiters - held
+            await self._adjust_references(metadata.content_hash, delta)
+            held += delta
+        flight.handed_out = True
+        if self.ttl_seconds > 0:
+            self._recent[key] = (time.monotonic() + self.ttl_seconds, metadata)
+            self._recent.move_to_end(key)
+            while len(self._recent) > self.max_entries:
+                self._recent.popitem(last=False)
+        return metadata
+
+    async def _adjust_references(self, digest: str, delta: int) -> None:
+        if delta < 0:
+            await self.blob_store.release([digest] * -delta)
+            return
+        for _ in range(delta):
+            await self.blob_store.acquire(digest)
+
+    async def _cached(self, key: CaptureKey) -> Optional[SnapshotMetadata]:
+        entry = self._recent.get(key)
+        if entry is None:
+            return None
+        expires_at, metadata = entry
+        if expires_at <= time.monotonic():
+            del self._recent[key]
+            return None
+        if await self.blob_store.acquire(metadata.content_hash) is None:
+            # Deleted since; capture again.
+            self._recent.pop(key, None)
+            return None
+        metrics.REUSED.inc(source="recent")
+        return replace(metadata, reused=True)
+
+
+def normalize_url(url: str) -> str:
+    """Canonical form used to recognise the same page: case-folded scheme/host, no default port or fragment."""
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if ":" in host:
+        host = f"[{host}]"
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    netloc = host if port is None or port == _DEFAULT_PORTS.get(scheme) else f"{host}:{port}"
+    if parts.username or parts.password:
+        netloc = f"{parts.netloc.rpartition('@')[0]}@{netloc}"
+    return urlunsplit((scheme, netloc, parts.path or "/", parts.query, ""))
@@ -2,10 +2,70 @@ from __future__ import annotations
 
 import asyncio
 import json
+import logging
+import threading
 import uuid
 from dataclasses import asdict, dataclass
 from pathlib import Path
-from typing import Iterable, List
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from backend.core.sqlite import connect
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    original_url TEXT NOT NULL,
+    host TEXT NOT NULL DEFAULT '',
+    archived_url TEXT,
+    archived_relative_url TEXT,
+    status TEXT NOT NULL,
+    error TEXT,
+    captured_at TEXT NOT NULL DEFAULT '',
+    content_hash TEXT,
+    unchanged INTEGER NOT NULL DEFAULT 0,
+    timings TEXT
+);
+CREATE INDEX IF NOT EXISTS history_status_seq ON history (status, seq);
+CREATE INDEX IF NOT EXISTS history_host_seq ON history (host, seq);
+CREATE INDEX IF NOT EXISTS history_captured_at_seq ON history (captured_at, seq);
+CREATE INDEX IF NOT EXISTS history_original_url_seq ON history (original_url, seq);
+CREATE TABLE IF NOT EXISTS history_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+_COLUMNS = (
+    "id",
+    "original_url",
+    "archived_url",
+    "archived_relative_url",
+    "status",
+    "error",
+    "captured_at",
+    "content_hash",
+    "unchanged",
+    "timings",
+)
+# Columns added after the table was first released, with their SQL type.
+_MIGRATIONS = {"content_hash": "TEXT", "unchanged": "INTEGER NOT NULL DEFAULT 0", "timings": "TEXT"}
+# Indexes superseded by the (column, seq) ones in _SCHEMA.
+_DROPPED_INDEXES = ("history_captured_at", "history_original_url")
+_IMPORT_BATCH = 5000
+
+
+@dataclass(slots=True)
+class HistoryQuery:
+    cursor: Optional[int] = None
+    status: Optional[str] = None
+    host: Optional[str] = None
+    url_prefix: Optional[str] = None
+    captured_from: Optional[str] = None
+    captured_to: Optional[str] = None
 
 
 @dataclass(slots=True)
@@ -17,71 +77,244 @@ class HistoryEntry:
     status: str
     error: str | None
     captured_at: str
+    content_hash: str | None = None
+    unchanged: bool = False
+    # Per-stage capture seconds (see SnapshotMetadata.timings); stored as JSON.
+    timings: Dict[str, float] | None = None
 
 
 class HistoryRepository:
-    def __init__(self, file_path: Path) -> None:
-        self.file_path = file_path
-        self.file_path.parent.mkdir(parents=True, exist_ok=True)
-        self._lock = asyncio.Lock()
+    """History of snapshot runs stored in SQLite (WAL) with per-column indexes.
+
+    ``legacy_file`` points at the old ``history.jsonl``; it is imported once on
+    first start and left on disk untouched as a backup.
+    """
+
+    def __init__(self, db_path: Path, legacy_file: Optional[Path] = None) -> None:
+        self.db_path = db_path
+        self._connection = connect(db_path)
+        self._connection.executescript(_SCHEMA)
+        self._migrate()
+        self._lock = threading.Lock()
+        if legacy_file is not None and legacy_file.exists():
+            self.import_jsonl(legacy_file)
 
     async def append(self, entries: Iterable[HistoryEntry]) -> None:
-        payload = "".join(json.dumps(asdict(entry), ensure_ascii=False) + "\n" for entry in entries)
-        if not payload:
+        rows = [self._entry_to_row(entry) for entry in entries]
+        if not rows:
             return
-        async with self._lock:
-            await asyncio.to_thread(self._write, payload)
+        await asyncio.to_thread(self._insert, rows)
 
-    async def list_recent(self, limit: int = 100) -> List[HistoryEntry]:
-        if not self.file_path.exists():
-            return []
-        async with self._lock:
-            return await asyncio.to_thread(self._read_last, limit)
+    async def list_recent(
+        self,
+        limit: int = 100,
+        status: Optional[str] = None,
+        host: Optional[str] = None,
+    ) -> List[HistoryEntry]:
+        entries, _ = await self.list_page(limit, status=status, host=host)
+        return entries
+
+    async def list_page(
+        self,
+        limit: int = 50,
+        cursor: Optional[int] = None,
+        status: Optional[str] = None,
+        host: Optional[str] = None,
+        url_prefix: Optional[str] = None,
+        captured_from: Optional[str] = None,
+        captured_to: Optional[str] = None,
+    ) -> Tuple[List[HistoryEntry], Optional[int]]:
+        """Return up to ``limit`` entries older than ``cursor``, newest first.
+
+        The second element is the cursor for the next page, or ``None`` when
+        there is nothing older left to read.
+        """
+        query = HistoryQuery(
+            cursor=cursor,
+            status=status,
+            host=host.lower() if host else None,
+            url_prefix=url_prefix,
+            captured_from=captured_from,
+            captured_to=captured_to,
+        )
+        return await asyncio.to_thread(self._select_page, limit, query)
+
+    async def existing_ids(self, ids: Iterable[str]) -> set[str]:
+        """The subset of ``ids`` that already has an entry."""
+        ids_list = sorted({item for item in ids if item})
+        if not ids_list:
+            return set()
+        return await asyncio.to_thread(self._select_ids, ids_list)
 
     async def delete(self, ids: Iterable[str]) -> int:
-        ids_set = {item for item in ids if item}
-        if not ids_set or not self.file_path.exists():
-            return 0
-        async with self._lock:
-            return await asyncio.to_thread(self._delete_sync, ids_set)
-
-    def _write(self, chunk: str) -> None:
-        with self.file_path.open("a", encoding="utf-8") as handler:
-            handler.write(chunk)
-
-    def _read_last(self, limit: int) -> List[HistoryEntry]:
-        with self.file_path.open("r", encoding="utf-8") as handler:
-            lines = handler.readlines()
-        records = [json.loads(line) for line in lines[-limit:] if line.strip()]
-        entries = [
-            HistoryEntry(
-                id=item.get("id") or str(uuid.uuid4()),
-                original_url=item["original_url"],
-                archived_url=item.get("archived_url"),
-                archived_relative_url=item.get("archived_relative_url"),
-                status=item.get("status", "failed"),
-                error=item.get("error"),
-                captured_at=item.get("captured_at", ""),
+        return len(await self.remove(ids))
+
+    async def remove(self, ids: Iterable[str]) -> List[HistoryEntry]:
+        """Delete entries by id and return the removed rows."""
+        ids_list = sorted({item for item in ids if item})
+        if not ids_list:
+            return []
+        return await asyncio.to_thread(self._delete_sync, ids_list)
+
+    def import_jsonl(self, file_path: Path) -> int:
+        """Import a legacy ``history.jsonl`` once; later calls are no-ops."""
+        marker = f"imported:{file_path.resolve()}"
+        with self._lock:
+            if self._connection.execute("SELECT 1 FROM history_meta WHERE key = ?", (marker,)).fetchone():
+                return 0
+        imported = 0
+        batch: list[tuple] = []
+        with file_path.open("r", encoding="utf-8") as handler:
+            for line in handler:
+                if not line.strip():
+                    continue
+                try:
+                    item = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning("Skipping malformed history line", extra={"file": str(file_path)})
+                    continue
+                if not isinstance(item, dict) or not isinstance(item.get("original_url"), str):
+                    logger.warning("Skipping history line without an original_url", extra={"file": str(file_path)})
+                    continue
+                batch.append(
+                    self._entry_to_row(
+                        HistoryEntry(
+                            id=item.get("id") or uuid.uuid4().hex,
+                            original_url=item["original_url"],
+                            archived_url=item.get("archived_url"),
+                            archived_relative_url=item.get("archived_relative_url"),
+                            status=item.get("status", "failed"),
+                            error=item.get("error"),
+                            captured_at=item.get("captured_at", ""),
+                        )
+                    )
+                )
+                if len(batch) >= _IMPORT_BATCH:
+                    imported += self._insert(batch)
+                    batch = []
+        if batch:
+            imported += self._insert(batch)
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO history_meta (key, value) VALUES (?, ?)",
+                (marker, str(imported)),
             )
-            for item in records
-        ]
-        entries.reverse()
-        return entries
+        logger.info("Imported %s history entries from %s", imported, file_path)
+        return imported
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def _insert(self, rows: List[tuple]) -> int:
+        with self._lock:
+            before = self._connection.total_changes
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                self._connection.executemany(
+                    f"INSERT OR IGNORE INTO history ({', '.join(_COLUMNS)}, host) "
+                    f"VALUES ({', '.join('?' * (len(_COLUMNS) + 1))})",
+                    rows,
+                )
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+            self._connection.execute("COMMIT")
+            return self._connection.total_changes - before
 
-    def _delete_sync(self, ids: set[str]) -> int:
-        with self.file_path.open("r", encoding="utf-8") as handler:
-            lines = handler.readlines()
-        kept_lines = []
-        removed = 0
-        for line in lines:
-            if not line.strip():
-                continue
-            obj = json.loads(line)
-            entry_id = obj.get("id")
-            if entry_id in ids:
-                removed += 1
-                continue
-            kept_lines.append(line)
-        with self.file_path.open("w", encoding="utf-8") as handler:
-            handler.writelines(kept_lines)
+    def _select_page(self, limit: int, query: HistoryQuery) -> Tuple[List[HistoryEntry], Optional[int]]:
+        sql, params = self._page_query(limit, query)
+        with self._lock:
+            rows = self._connection.execute(sql, params).fetchall()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        entries = [self._row_to_entry(row) for row in rows]
+        next_cursor = rows[-1]["seq"] if has_more and rows else None
+        return entries, next_cursor
+
+    @staticmethod
+    def _page_query(limit: int, query: HistoryQuery) -> Tuple[str, list[object]]:
+        clauses: list[str] = []
+        params: list[object] = []
+        if query.cursor is not None:
+            # With no status or host to seek on, a URL prefix or capture window is read from its (column, seq)
+            # index, where the cursor is checked without touching the table, and only the matches are sorted.
+            # The unary plus stops the planner from trading that for a seq scan from the cursor, which has to
+            # walk every newer non-matching row to fill a page.
+            ranged = query.url_prefix or (query.captured_from and query.captured_to)
+            clauses.append("+seq < ?" if ranged and not (query.status or query.host) else "seq < ?")
+            params.append(query.cursor)
+        if query.status:
+            clauses.append("status = ?")
+            params.append(query.status)
+        if query.host:
+            clauses.append("host = ?")
+            params.append(query.host)
+        if query.url_prefix:
+            # A half-open range keeps the prefix match on the original_url index.
+            clauses.append("original_url >= ? AND original_url < ?")
+            params.extend((query.url_prefix, query.url_prefix + "\U0010ffff"))
+        if query.captured_from:
+            clauses.append("captured_at >= ?")
+            params.append(query.captured_from)
+        if query.captured_to:
+            clauses.append("captured_at < ?")
+            params.append(query.captured_to)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        sql = f"SELECT seq, {', '.join(_COLUMNS)} FROM history {where} ORDER BY seq DESC LIMIT ?"
+        return sql, [*params, limit + 1]
+
+    def _select_ids(self, ids: List[str]) -> set[str]:
+        found: set[str] = set()
+        with self._lock:
+            for start in range(0, len(ids), 500):
+                chunk = ids[start : start + 500]
+                placeholders = ", ".join("?" * len(chunk))
+                found.update(
+                    row["id"]
+                    for row in self._connection.execute(f"SELECT id FROM history WHERE id IN ({placeholders})", chunk)
+                )
+        return found
+
+    def _delete_sync(self, ids: List[str]) -> List[HistoryEntry]:
+        removed: List[HistoryEntry] = []
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                # Chunk to stay under SQLite's bound-parameter limit.
+                for start in range(0, len(ids), 500):
+                    chunk = ids[start : start + 500]
+                    placeholders = ", ".join("?" * len(chunk))
+                    rows = self._connection.execute(
+                        f"SELECT {', '.join(_COLUMNS)} FROM history WHERE id IN ({placeholders})",
+                        chunk,
+                    ).fetchall()
+                    self._connection.execute(f"DELETE FROM history WHERE id IN ({placeholders})", chunk)
+                    removed.extend(self._row_to_entry(row) for row in rows)
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+            self._connection.execute("COMMIT")
         return removed
+
+    def _migrate(self) -> None:
+        existing = {row["name"] for row in self._connection.execute("PRAGMA table_info(history)")}
+        for column, sql_type in _MIGRATIONS.items():
+            if column not in existing:
+                self._connection.execute(f"ALTER TABLE history ADD COLUMN {column} {sql_type}")
+        for index in _DROPPED_INDEXES:
+            self._connection.execute(f"DROP INDEX IF EXISTS {index}")
+
+    @staticmethod
+    def _row_to_entry(row) -> HistoryEntry:
+        values = {column: row[column] for column in _COLUMNS}
+        values["unchanged"] = bool(values["unchanged"])
+        values["timings"] = json.loads(values["timings"]) if values["timings"] else None
+        return HistoryEntry(**values)
+
+    @staticmethod
+    def _entry_to_row(entry: HistoryEntry) -> tuple:
+        values = asdict(entry)
+        values["timings"] = json.dumps(entry.timings, separators=(",", ":")) if entry.timings else None
+        host = (urlparse(entry.original_url).hostname or "").lower()
+        return (*(values[column] for column in _COLUMNS), host)
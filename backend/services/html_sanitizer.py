@@ -0,0 +1,394 @@
+from __future__ import annotations
+
+import html as html_lib
+import re
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List, Optional
+
+_WS = "\t\n\f\r "
+# The patterns below follow the HTML tokenizer closely enough that a tag ends, and
+# its attributes split, exactly where a browser's would: quotes only open a value
+# right after "=". No two parts can consume the same characters, so a failed match
+# backtracks in linear time instead of trying every way to split a run.
+#
+# Tag names stop at the first character not allowed here, and attributes have to
+# start with whitespace or "/". A browser would read a longer name (``<div"x``);
+# such start tags are escaped as text.
+_TAG_NAME = r"[A-Za-z][A-Za-z0-9:_.-]*(?![A-Za-z0-9:_.-])"
+_ATTR_NAME = rf"[^{_WS}/>][^{_WS}/>=]*(?![^{_WS}/>=])"
+_UNQUOTED = rf"[^{_WS}>\"'][^{_WS}>]*(?![^{_WS}>])"
+_ATTRS = (
+    rf"""(?:[{_WS}/]*{_ATTR_NAME}(?:[{_WS}]*=[{_WS}]*(?:"[^"]*"|'[^']*'|{_UNQUOTED}|(?=>))|(?![{_WS}]*=)))*"""
+    rf"[{_WS}/]*"
+)
+_TAG_RE = re.compile(rf"<(/?)({_TAG_NAME})(?=[{_WS}/>])({_ATTRS})>")
+_TAG_NAME_RE = re.compile(_TAG_NAME)
+_ATTR_RE = re.compile(rf"""({_ATTR_NAME})(?:[{_WS}]*=[{_WS}]*("[^"]*"|'[^']*'|{_UNQUOTED})?)?""")
+_COMMENT_END_RE = re.compile(r"--!?>")
+
+# Attributes worth a closer look: on* handlers, srcdoc, SVG animation value lists,
+# and values that may start with a script: scheme once entities are decoded and
+# the tabs and newlines a URL parser drops are removed. Values without ":" or "&"
+# (most of them) are accepted without that check.
+_RISKY_NAME = rf"[oO][nN]|(?:[sS][rR][cC][dD][oO][cC]|[vV][aA][lL][uU][eE][sS])(?![^{_WS}/>=])"
+_RISKY_SCHEME = (
+    r"[\x00-\x20]*[A-Za-z0-9+.\-\t\n\r]*"
+    r"(?:&|[sS][\t\n\r]*[cC][\t\n\r]*[rR][\t\n\r]*[iI][\t\n\r]*[pP][\t\n\r]*[tT][\t\n\r]*:)"
+)
+_SAFE_NAME = rf"[^{_WS}/><][^{_WS}/>=<]*(?![^{_WS}/>=])"
+_SAFE_VALUE = (
+    rf"""[{_WS}]*=[{_WS}]*(?:"(?:[^":&<]*"|(?=[^"<]*[:&])(?!{_RISKY_SCHEME})[^"<]*")"""
+    rf"""|'(?:[^':&<]*'|(?=[^'<]*[:&])(?!{_RISKY_SCHEME})[^'<]*')"""
+    rf"""|[^{_WS}>"':&<][^{_WS}>:&<]*(?![^{_WS}>])"""
+    rf"""|(?=[^{_WS}><]*[:&])(?!{_RISKY_SCHEME})[^{_WS}>"'<][^{_WS}><]*(?![^{_WS}>])|(?=>))"""
+)
+_SAFE_ATTRS = rf"(?:[{_WS}/]*(?!{_RISKY_NAME}){_SAFE_NAME}(?:{_SAFE_VALUE}|(?![{_WS}]*=)))*[{_WS}/]*"
+_SPECIAL_ELEMENTS = ("script", "noscript", "head", "style", "textarea", "title", "xmp", "iframe", "noembed", "noframes")
+_SPECIAL_INITIALS = "".join(sorted({name[0] for name in _SPECIAL_ELEMENTS}))
+
+
+def _any_case(name: str) -> str:
+    # Cheaper than (?i:...), which the fast path below would pay at every tag.
+    return "".join(f"[{char}{char.upper()}]" for char in name)
+
+
+# Fast path: the next "<" that needs the tokenizer below. Everything before it is
+# text and tags that are copied through untouched, found by one C-level search
+# instead of one Python iteration per tag. It stops at elements with special
+# handling, tags with a risky attribute, tags it cannot read, comments and other
+# "<!"/"<?"/"</ " markup, and anything cut off by the end of the buffer. Tags with
+# a "<" inside go to the tokenizer too: a tag copied here has no "<" that a later
+# search could mistake for the start of markup.
+_MARKUP_RE = re.compile(
+    rf"<(?:(?=[{_SPECIAL_INITIALS}{_SPECIAL_INITIALS.upper()}])"
+    rf"(?:{'|'.join(_any_case(name) for name in _SPECIAL_ELEMENTS)})(?![^{_WS}/>])"
+    rf"|{_TAG_NAME}(?!>|[{_WS}/]{_SAFE_ATTRS}>)"
+    rf"|/(?:{_any_case('noscript')}(?![^{_WS}/>])|(?!{_TAG_NAME}(?:>|[{_WS}/]{_SAFE_ATTRS}>)))"
+    rf"|[!?]|\Z)"
+)
+
+_URL_ATTRS = frozenset(
+    {"href", "src", "action", "formaction", "xlink:href", "data", "poster", "background", "to", "from"}
+)
+_DANGEROUS_SCHEMES = ("javascript:", "vbscript:")
+# URL parsers strip leading C0 controls and spaces, and drop tabs and newlines anywhere.
+_URL_LEADING_NOISE = "".join(chr(code) for code in range(0x21))
+_URL_NOISE_RE = re.compile(r"[\t\n\r]")
+# Elements whose content is not markup; scripts are dropped, the rest copied verbatim.
+_RAW_TEXT_ELEMENTS = frozenset({"script", "style", "textarea", "title", "xmp", "iframe", "noembed", "noframes"})
+# Inside <svg> or <math> those elements hold markup after all, so anything in their
+# content that could open a tag is escaped.
+_RAW_TEXT_MARKUP_RE = re.compile(r"<(?=[A-Za-z/!?])")
+_DEFAULT_MAX_PENDING = 1 << 20
+
+# _markup_end() results other than an end offset.
+_PLAIN_LT = -1  # the "<" is text
+_BROKEN_TAG = -2  # a browser would read a tag here that this tokenizer cannot; escape the "<"
+
+
+def _markup_end(buffer: str, pos: int, endpos: int) -> Optional[int]:
+    """End offset of the markup starting at ``pos``, or ``None`` if it does not end before ``endpos``."""
+    if buffer.startswith("<!--", pos, endpos):
+        # "<!-->" and "<!--->" are whole (empty) comments, and "--!>" closes one too.
+        if buffer.startswith(">", pos + 4, endpos):
+            return pos + 5
+        if buffer.startswith("->", pos + 4, endpos):
+            return pos + 6
+        match = _COMMENT_END_RE.search(buffer, pos + 4, endpos)
+        return None if match is None else match.end()
+    if endpos - pos < 2:
+        return None
+    nxt = buffer[pos + 1]
+    is_end = nxt == "/"
+    if is_end and endpos - pos < 3:
+        return None
+    name = None if nxt in "!?" else _TAG_NAME_RE.match(buffer, pos + 1 + is_end, endpos)
+    if name is None:
+        if not is_end and nxt not in "!?":
+            return _PLAIN_LT
+        # "<!x>", "<?x>" and "</ x>" are bogus comments, up to the next ">".
+        end = buffer.find(">", pos + 2, endpos)
+        return None if end == -1 else end + 1
+    if name.end() == endpos:
+        return None
+    if buffer[name.end()] not in "\t\n\f\r />":
+        return _BROKEN_TAG
+    # After a well-formed name the attribute grammar accepts anything up to ">",
+    # so a failed match can only mean the tag continues past the buffer.
+    match = _TAG_RE.match(buffer, pos, endpos)
+    return None if match is None else match.end()
+
+
+def _is_dangerous_url(value: str) -> bool:
+    """Whether ``value`` (entities already decoded) is a URL a browser would run as script."""
+    value = _URL_NOISE_RE.sub("", value.lstrip(_URL_LEADING_NOISE)).lower()
+    return value.startswith(_DANGEROUS_SCHEMES)
+
+
+@dataclass(slots=True)
+class Tag:
+    """A start or end tag found by :func:`iter_tags`; offsets index the scanned text."""
+
+    name: str  # as written
+    attrs: str  # as written, see :func:`parse_attributes`
+    start: int
+    end: int
+    is_end: bool = False
+    # Where the content of a raw-text element such as <style> ends.
+    content_end: Optional[int] = None
+
+
+@dataclass(slots=True)
+class Attribute:
+    name: str  # as written
+    raw_value: Optional[str]  # as written, quotes included; ``None`` without "="
+    text: str  # the whole attribute as written
+
+    @property
+    def value(self) -> str:
+        """The value with quotes removed and character references decoded."""
+        if not self.raw_value:
+            return ""
+        raw_value = self.raw_value[1:-1] if self.raw_value[:1] in "\"'" else self.raw_value
+        return html_lib.unescape(raw_value)
+
+
+def iter_tags(html: str) -> Iterator[Tag]:
+    """Tags of a complete document in order, split the way the sanitizer splits them.
+
+    Comments and other ``<!``/``<?`` markup are skipped, and so is the content of
+    raw-text elements. Scanning stops at markup that never ends.
+    """
+    pos = 0
+    length = len(html)
+    while True:
+        lt = html.find("<", pos)
+        if lt == -1:
+            return
+        end = _markup_end(html, lt, length)
+        if end is None:
+            return
+        if end < 0:
+            pos = lt + 1
+            continue
+        pos = end
+        match = _TAG_RE.match(html, lt, end)
+        if match is None:
+            continue
+        tag = Tag(name=match.group(2), attrs=match.group(3), start=lt, end=end, is_end=bool(match.group(1)))
+        name = tag.name.lower()
+        if not tag.is_end and name in _RAW_TEXT_ELEMENTS:
+            close = _raw_text_end_re(name).search(html, end)
+            tag.content_end = pos = length if close is None else close.start()
+        yield tag
+
+
+def parse_attributes(attrs: str) -> List[Attribute]:
+    """Split a :attr:`Tag.attrs` string into attributes, in order."""
+    return [
+        Attribute(name=match.group(1), raw_value=match.group(2), text=match.group(0))
+        for match in _ATTR_RE.finditer(attrs)
+    ]
+
+
+def _raw_text_end_re(name: str) -> re.Pattern[str]:
+    return re.compile(rf"</{name}[\t\n\f\r />]", re.IGNORECASE)
+
+
+class StreamingSanitizer:
+    """Single-pass, incremental HTML sanitizer for snapshots.
+
+    Feed decoded text chunks as they arrive and write whatever ``feed`` returns;
+    only an unfinished tag (bounded by ``max_pending`` characters) is ever held
+    back. The output does not depend on how the input was split. The sanitizer
+
+    * drops ``<script>`` elements and their content,
+    * unwraps ``<noscript>`` so its fallback markup shows once scripts are gone,
+    * removes ``on*`` event handlers, ``srcdoc`` documents and ``javascript:``/``vbscript:`` URLs,
+    * injects ``<base href>`` so relative assets resolve against the original page.
+    """
+
+    def __init__(self, base_url: Optional[str] = None, max_pending: int = _DEFAULT_MAX_PENDING) -> None:
+        self.base_url = base_url
+        self.max_pending = max_pending
+        self._buffer = ""
+        self._raw_text_end: Optional[re.Pattern[str]] = None
+        self._raw_text_emit = True
+        self._base_pending = base_url is not None
+        self._closed = False
+        # Characters of <script> content dropped so far, for content heuristics.
+        self.dropped_script_chars = 0
+
+    def feed(self, chunk: str) -> str:
+        if self._closed:
+            raise ValueError("feed() called after close()")
+        self._buffer += chunk
+        return "".join(self._drain(final=False))
+
+    def close(self) -> str:
+        out = "".join(self._drain(final=True))
+        self._closed = True
+        if self._base_pending:
+            # Tag-less input: nowhere better to put it.
+            self._base_pending = False
+            out = f"<head>{self._base_tag()}</head>\n{out}"
+        return out
+
+    def _drain(self, final: bool) -> Iterator[str]:
+        buffer = self._buffer
+        pos = 0
+        length = len(buffer)
+        while pos < length:
+            if self._raw_text_end is not None:
+                match = self._raw_text_end.search(buffer, pos)
+                if match is None:
+                    # Keep enough of the tail to recognise an end tag split across chunks.
+                    end = length if final else max(pos, length - 16)
+                    if self._raw_text_emit:
+                        if not final and buffer.endswith("<", pos, end):
+                            # Whether it gets escaped depends on the next character.
+                            end -= 1
+                        yield _RAW_TEXT_MARKUP_RE.sub("&lt;", buffer[pos:end])
+                    else:
+                        self.dropped_script_chars += end - pos
+                    pos = end
+                    break
+                if self._raw_text_emit:
+                    yield _RAW_TEXT_MARKUP_RE.sub("&lt;", buffer[pos : match.start()])
+                else:
+                    self.dropped_script_chars += match.start() - pos
+                close = buffer.find(">", match.end() - 1)
+                if close == -1:
+                    if not final:
+                        pos = match.start()
+                        break
+                    close = length - 1
+                if self._raw_text_emit:
+                    yield buffer[match.start() : close + 1]
+                self._raw_text_end = None
+                pos = close + 1
+                continue
+
+            if self._base_pending:
+                lt = buffer.find("<", pos)
+                if lt == -1:
+                    if not final and length - pos < self.max_pending and buffer[pos:].isspace():
+                        # Whether the base goes before this depends on what follows.
+                        break
+                    yield from self._text(buffer[pos:])
+                    pos = length
+                    break
+                if lt > pos:
+                    yield from self._text(buffer[pos:lt])
+                    pos = lt
+            else:
+                markup = _MARKUP_RE.search(buffer, pos)
+                lt = length if markup is None else markup.start()
+                if lt > pos:
+                    yield buffer[pos:lt]
+                    pos = lt
+                if markup is None:
+                    break
+
+            endpos = min(length, pos + self.max_pending)
+            end = _markup_end(buffer, pos, endpos)
+            if end is None:
+                if not final and endpos == length:
+                    break
+                # Unterminated or oversized markup. A browser would swallow all of it into
+                # one tag; keep it as text instead, without rescanning it from every "<".
+                yield from self._text(buffer[pos:endpos].replace("<", "&lt;"))
+                pos = endpos
+                continue
+            if end < 0:
+                yield from self._text("<" if end == _PLAIN_LT else "&lt;")
+                pos += 1
+                continue
+            yield from self._handle_markup(buffer, pos, end)
+            pos = end
+        self._buffer = buffer[pos:]
+
+    def _text(self, text: str) -> Iterator[str]:
+        if self._base_pending and text.strip():
+            # Text before any tag implicitly opens <body>; the base has to come first.
+            self._base_pending = False
+            yield f"<head>{self._base_tag()}</head>\n"
+        yield text
+
+    def _handle_markup(self, buffer: str, start: int, end: int) -> Iterator[str]:
+        match = _TAG_RE.match(buffer, start, end)
+        if match is None:
+            # Comments and other markup that is not a tag.
+            yield buffer[start:end]
+            return
+        is_end, name, attrs = match.group(1), match.group(2).lower(), match.group(3)
+        if is_end:
+            if name != "noscript":
+                yield match.group(0)
+            return
+
+        if name == "noscript":
+            return
+        if self._base_pending and name != "html":
+            self._base_pending = False
+            if name == "head":
+                yield self._rewrite_tag(name, attrs, match.group(0))
+                yield f"\n    {self._base_tag()}"
+                return
+            yield f"<head>{self._base_tag()}</head>\n"
+        if name == "script":
+            self._enter_raw_text(name, emit=False)
+            return
+        yield self._rewrite_tag(name, attrs, match.group(0))
+        if name in _RAW_TEXT_ELEMENTS:
+            # Browsers ignore a trailing "/" here too, so "<style/>" still starts raw text.
+            self._enter_raw_text(name, emit=True)
+
+    def _enter_raw_text(self, name: str, emit: bool) -> None:
+        self._raw_text_end = _raw_text_end_re(name)
+        self._raw_text_emit = emit
+
+    def _rewrite_tag(self, name: str, attrs: str, raw: str) -> str:
+        if not attrs:
+            return raw
+        kept: List[str] = []
+        changed = False
+        for attr in parse_attributes(attrs):
+            if self._is_dangerous_attr(attr):
+                changed = True
+                continue
+            kept.append(attr.text)
+        if not changed:
+            return raw
+        closing = " /" if attrs.rstrip().endswith("/") else ""
+        return f"<{raw[1:1 + len(name)]}{''.join(' ' + item for item in kept)}{closing}>"
+
+    @staticmethod
+    def _is_dangerous_attr(attr: Attribute) -> bool:
+        name = attr.name.lower()
+        if name.startswith("on") or name == "srcdoc":
+            return True
+        if not attr.raw_value or (name not in _URL_ATTRS and name != "values"):
+            return False
+        value = attr.value
+        # SVG animations take a ";"-separated list of values to assign to e.g. href.
+        return any(_is_dangerous_url(item) for item in (value.split(";") if name == "values" else (value,)))
+
+    def _base_tag(self) -> str:
+        return f'<base href="{html_lib.escape(self.base_url or "", quote=True)}" />'
+
+
+def sanitize_html(html: str, url: str) -> str:
+    sanitizer = StreamingSanitizer(url)
+    return sanitizer.feed(html) + sanitizer.close()
+
+
+def sanitize_chunks(chunks: Iterable[str], url: str) -> Iterator[str]:
+    sanitizer = StreamingSanitizer(url)
+    for chunk in chunks:
+        out = sanitizer.feed(chunk)
+        if out:
+            yield out
+    tail = sanitizer.close()
+    if tail:
+        yield tail
@@ -0,0 +1,398 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+from backend.core.config import Settings
+from backend.core.sqlite import connect
+from backend.services.batch_runner import BatchRunner
+from backend.services.history_repository import HistoryRepository
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    batch_id TEXT NOT NULL,
+    url TEXT NOT NULL,
+    force_browser INTEGER NOT NULL DEFAULT 0,
+    cookie_header TEXT,
+    bypass_cache INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_until REAL,
+    archived_url TEXT,
+    archived_relative_url TEXT,
+    error TEXT,
+    created_at TEXT NOT NULL,
+    started_at TEXT,
+    finished_at TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status_seq ON jobs (status, seq);
+CREATE INDEX IF NOT EXISTS jobs_batch ON jobs (batch_id);
+"""
+_MIGRATIONS = {"bypass_cache": "INTEGER NOT NULL DEFAULT 0"}
+
+
+@dataclass(slots=True)
+class SnapshotJob:
+    id: str
+    batch_id: str
+    url: str
+    force_browser: bool
+    cookie_header: str | None
+    status: str
+    attempts: int
+    archived_url: str | None
+    archived_relative_url: str | None
+    error: str | None
+    created_at: str
+    started_at: str | None
+    finished_at: str | None
+    bypass_cache: bool = False
+
+
+@dataclass(slots=True)
+class BatchProgress:
+    total: int
+    queued: int
+    running: int
+    success: int
+    failed: int
+
+
+class JobQueue:
+    """Persistent FIFO of snapshot jobs backed by SQLite.
+
+    Claimed jobs hold a lease that the worker renews while the job runs; if
+    the worker dies mid-job the lease expires and another worker (or the next
+    process start) picks the job up again.
+    """
+
+    def __init__(self, db_path: Path, lease_seconds: float = 900.0, max_attempts: int = 3) -> None:
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max(1, max_attempts)
+        self._connection = connect(db_path)
+        self._connection.executescript(_SCHEMA)
+        self._migrate()
+        self._lock = threading.Lock()
+        self._wakeup = asyncio.Event()
+
+    async def enqueue(
+        self,
+        urls: Iterable[str],
+        force_browser: bool = False,
+        cookie_header: Optional[str] = None,
+        bypass_cache: bool = False,
+    ) -> List[SnapshotJob]:
+        batch_id = uuid.uuid4().hex
+        created_at = Settings.current_timestamp()
+        jobs = [
+            SnapshotJob(
+                id=uuid.uuid4().hex,
+                batch_id=batch_id,
+                url=url,
+                force_browser=force_browser,
+                cookie_header=cookie_header,
+                status="queued",
+                attempts=0,
+                archived_url=None,
+                archived_relative_url=None,
+                error=None,
+                created_at=created_at,
+                started_at=None,
+                finished_at=None,
+                bypass_cache=bypass_cache,
+            )
+            for url in urls
+        ]
+        if jobs:
+            await asyncio.to_thread(self._insert, jobs)
+            self._wakeup.set()
+        return jobs
+
+    async def claim(self, worker: str) -> Optional[SnapshotJob]:
+        return await asyncio.to_thread(self._claim, worker)
+
+    async def complete(
+        self,
+        job_id: str,
+        archived_url: Optional[str],
+        archived_relative_url: Optional[str],
+        error: Optional[str],
+    ) -> None:
+        await asyncio.to_thread(self._complete, job_id, archived_url, archived_relative_url, error)
+
+    async def renew(self, job_id: str, worker: str) -> bool:
+        """Extend ``worker``'s lease on a running job; ``False`` if the job is no longer its."""
+        return await asyncio.to_thread(self._renew, job_id, worker)
+
+    async def release(self, job_id: str) -> None:
+        await asyncio.to_thread(self._release, job_id)
+
+    async def get(self, job_id: str) -> Optional[SnapshotJob]:
+        return await asyncio.to_thread(self._get, job_id)
+
+    async def batch_progress(self, batch_id: str) -> BatchProgress:
+        return await asyncio.to_thread(self._batch_progress, batch_id)
+
+    async def depth(self) -> int:
+        return await asyncio.to_thread(self._depth)
+
+    async def wait_for_work(self, timeout: float) -> None:
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def _insert(self, jobs: List[SnapshotJob]) -> None:
+        rows = [
+            (
+                job.id,
+                job.batch_id,
+                job.url,
+                int(job.force_browser),
+                job.cookie_header,
+                int(job.bypass_cache),
+                job.status,
+                job.created_at,
+            )
+            for job in jobs
+        ]
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                self._connection.executemany(
+                    "INSERT INTO jobs (id, batch_id, url, force_browser, cookie_header, bypass_cache, status, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+            self._connection.execute("COMMIT")
+
+    def _claim(self, worker: str) -> Optional[SnapshotJob]:
+        now = time.time()
+        started_at = Settings.current_timestamp()
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                while True:
+                    row = self._connection.execute(
+                        "SELECT * FROM jobs WHERE status = 'queued' "
+                        "OR (status = 'running' AND lease_until < ?) ORDER BY seq LIMIT 1",
+                        (now,),
+                    ).fetchone()
+                    if row is None or row["attempts"] < self.max_attempts:
+                        break
+                    # A job that keeps killing its worker is given up instead of retried forever.
+                    self._connection.execute(
+                        "UPDATE jobs SET status = 'failed', error = ?, cookie_header = NULL, "
+                        "finished_at = ?, lease_until = NULL WHERE id = ?",
+                        ("Job abandoned after repeated worker failures.", started_at, row["id"]),
+                    )
+                if row is not None:
+                    self._connection.execute(
+                        "UPDATE jobs SET status = 'running', attempts = attempts + 1, worker = ?, "
+                        "lease_until = ?, started_at = ? WHERE id = ?",
+                        (worker, now + self.lease_seconds, started_at, row["id"]),
+                    )
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+            self._connection.execute("COMMIT")
+        if row is None:
+            return None
+        job = self._row_to_job(row)
+        job.status = "running"
+        job.attempts += 1
+        job.started_at = started_at
+        return job
+
+    def _complete(
+        self,
+        job_id: str,
+        archived_url: Optional[str],
+        archived_relative_url: Optional[str],
+        error: Optional[str],
+    ) -> None:
+        status = "failed" if error else "success"
+        with self._lock:
+            # The pasted Cookie header is only kept on disk until the job has run.
+            self._connection.execute(
+                "UPDATE jobs SET status = ?, archived_url = ?, archived_relative_url = ?, error = ?, "
+                "cookie_header = NULL, lease_until = NULL, finished_at = ? WHERE id = ?",
+                (status, archived_url, archived_relative_url, error, Settings.current_timestamp(), job_id),
+            )
+
+    def _renew(self, job_id: str, worker: str) -> bool:
+        with self._lock:
+            cursor = self._connection.execute(
+                "UPDATE jobs SET lease_until = ? WHERE id = ? AND worker = ? AND status = 'running'",
+                (time.time() + self.lease_seconds, job_id, worker),
+            )
+        return cursor.rowcount > 0
+
+    def _release(self, job_id: str) -> None:
+        with self._lock:
+            self._connection.execute(
+                "UPDATE jobs SET status = 'queued', worker = NULL, lease_until = NULL, "
+                "attempts = MAX(attempts - 1, 0) WHERE id = ? AND status = 'running'",
+                (job_id,),
+            )
+
+    def _get(self, job_id: str) -> Optional[SnapshotJob]:
+        with self._lock:
+            row = self._connection.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def _batch_progress(self, batch_id: str) -> BatchProgress:
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT status, COUNT(*) AS total FROM jobs WHERE batch_id = ? GROUP BY status",
+                (batch_id,),
+            ).fetchall()
+        counts = {row["status"]: row["total"] for row in rows}
+        return BatchProgress(
+            total=sum(counts.values()),
+            queued=counts.get("queued", 0),
+            running=counts.get("running", 0),
+            success=counts.get("success", 0),
+            failed=counts.get("failed", 0),
+        )
+
+    def _depth(self) -> int:
+        with self._lock:
+            row = self._connection.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()
+        return int(row[0])
+
+    def _migrate(self) -> None:
+        existing = {row["name"] for row in self._connection.execute("PRAGMA table_info(jobs)")}
+        for column, sql_type in _MIGRATIONS.items():
+            if column not in existing:
+                self._connection.execute(f"ALTER TABLE jobs ADD COLUMN {column} {sql_type}")
+
+    @staticmethod
+    def _row_to_job(row) -> SnapshotJob:
+        return SnapshotJob(
+            id=row["id"],
+            batch_id=row["batch_id"],
+            url=row["url"],
+            force_browser=bool(row["force_browser"]),
+            cookie_header=row["cookie_header"],
+            status=row["status"],
+            attempts=row["attempts"],
+            archived_url=row["archived_url"],
+            archived_relative_url=row["archived_relative_url"],
+            error=row["error"],
+            created_at=row["created_at"],
+            started_at=row["started_at"],
+            finished_at=row["finished_at"],
+            bypass_cache=bool(row["bypass_cache"]),
+        )
+
+
+class JobWorkerPool:
+    """asyncio workers that drain the job queue through the shared BatchRunner."""
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        runner: BatchRunner,
+        history_repo: HistoryRepository,
+        concurrency: int = 2,
+        poll_interval: float = 2.0,
+    ) -> None:
+        self.queue = queue
+        self.runner = runner
+        self.history_repo = history_repo
+        self.concurrency = max(0, concurrency)
+        self.poll_interval = poll_interval
+        self._tasks: list[asyncio.Task[None]] = []
+        self._identity = f"{socket.gethostname()}:{os.getpid()}"
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._tasks = [
+            asyncio.create_task(self._work(f"{self._identity}:{index}"), name=f"pagecopy-job-worker-{index}")
+            for index in range(self.concurrency)
+        ]
+
+    async def stop(self) -> None:
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _work(self, worker: str) -> None:
+        while True:
+            try:
+                job = await self.queue.claim(worker)
+            except Exception:  # pragma: no cover - transient SQLite failures
+                logger.exception("Failed to claim snapshot job")
+                job = None
+            if job is None:
+                await self.queue.wait_for_work(self.poll_interval)
+                continue
+            heartbeat = asyncio.create_task(self._keep_leased(job, worker))
+            try:
+                await self._run(job)
+            except asyncio.CancelledError:
+                # Shutting down mid-job: hand it back so the next worker retries it promptly.
+                await self.queue.release(job.id)
+                raise
+            except Exception as exc:  # pragma: no cover - defensive, capture() reports SnapshotError
+                logger.exception("Snapshot job crashed", extra={"job": job.id})
+                await self.queue.complete(job.id, None, None, f"Job crashed: {exc}")
+            finally:
+                heartbeat.cancel()
+
+    async def _keep_leased(self, job: SnapshotJob, worker: str) -> None:
+        # Waiting for a browser slot can take longer than the lease; keep renewing it so the job
+        # isn't handed to a second worker while this one is still on it.
+        interval = self.queue.lease_seconds / 3
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if not await self.queue.renew(job.id, worker):
+                    logger.warning("Lost the lease on a snapshot job", extra={"job": job.id})
+                    return
+            except Exception:  # pragma: no cover - transient SQLite failures
+                logger.exception("Failed to renew snapshot job lease", extra={"job": job.id})
+
+    async def _run(self, job: SnapshotJob) -> None:
+        outcome = await self.runner.capture(
+            job.url,
+            force_browser=job.force_browser,
+            cookie_header=job.cookie_header,
+            bypass_cache=job.bypass_cache,
+        )
+        await self.history_repo.append([outcome.to_history_entry()])
+        await self.queue.complete(
+            job.id,
+            outcome.metadata.archived_url if outcome.metadata else None,
+            outcome.metadata.relative_url if outcome.metadata else None,
+            outcome.error,
+        )
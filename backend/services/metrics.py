@@ -0,0 +1,276 @@
+from __future__ import annotations
+
+import bisect
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from typing import Awaitable, Callable, Iterator, Optional, Sequence
+
+try:
+    from opentelemetry import trace as otel_trace  # type: ignore[import-not-found]
+except ImportError:  # pragma: no cover - optional dependency
+    otel_trace = None
+
+# Latency buckets in seconds, from a cached HTTP page up to a slow browser render.
+_LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+LabelValues = tuple[str, ...]
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _format_labels(self, values: LabelValues, extra: Optional[tuple[str, str]] = None) -> str:
+        pairs = list(zip(self.labelnames, values))
+        if extra is not None:
+            pairs.append(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    @abstractmethod
+    def samples(self) -> list[str]:
+        """Sample lines for every label set, without the HELP/TYPE header."""
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{self._format_labels(key)} {_number(value)}" for key, value in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = _LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: bucket counts (non-cumulative, last one is +Inf), sum, count.
+        self._values: dict[LabelValues, tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[index] += 1
+            total[0] += value
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            items = sorted((key, list(counts), total[0]) for key, (counts, total) in self._values.items())
+        lines = []
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), counts):
+                cumulative += count
+                le = "+Inf" if bound == math.inf else _number(bound)
+                lines.append(f"{self.name}_bucket{self._format_labels(key, ('le', le))} {cumulative}")
+            lines.append(f"{self.name}_sum{self._format_labels(key)} {_number(total)}")
+            lines.append(f"{self.name}_count{self._format_labels(key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Process-wide metrics rendered in the Prometheus text exposition format.
+
+    Counters and histograms are updated as captures run. Gauges are read from
+    ``gauge`` callbacks at scrape time, since they describe current state
+    (render pool, job queue) rather than events.
+    """
+
+    def __init__(self) -> None:
+        self._metrics: list[_Metric] = []
+        self._gauges: dict[str, tuple[str, Callable[[], Awaitable[float]]]] = {}
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), **kwargs) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, documentation: str, read: Callable[[], Awaitable[float]]) -> None:
+        """Register (or replace) a gauge whose value is fetched on every scrape."""
+        self._gauges[name] = (documentation, read)
+
+    async def render(self) -> str:
+        lines: list[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.header())
+            lines.extend(metric.samples())
+        for name, (documentation, read) in sorted(self._gauges.items()):
+            lines.extend([f"# HELP {name} {documentation}", f"# TYPE {name} gauge", f"{name} {_number(await read())}"])
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "pagecopy_capture_stage_seconds",
+    "Time captures spent in each stage (exclusive of nested stages).",
+    ["stage"],
+)
+CAPTURE_SECONDS = REGISTRY.histogram(
+    "pagecopy_capture_seconds",
+    "End-to-end capture latency by how the page was finally captured.",
+    ["method"],
+)
+CAPTURES = REGISTRY.counter("pagecopy_captures_total", "Finished captures.", ["method", "outcome"])
+FAILURES = REGISTRY.counter("pagecopy_capture_failures_total", "Failed captures by reason.", ["reason"])
+ESCALATIONS = REGISTRY.counter(
+    "pagecopy_escalations_total",
+    "HTTP captures re-rendered in the browser, by which capture was kept.",
+    ["result"],
+)
+REUSED = REGISTRY.counter(
+    "pagecopy_capture_reused_total",
+    "Requests answered by another request's capture.",
+    ["source"],
+)
+BYTES_WRITTEN = REGISTRY.counter(
+    "pagecopy_bytes_written_total",
+    "Bytes of new (deduplicated) files written to snapshot storage.",
+    ["kind"],
+)
+
+
+class CaptureTimings:
+    """Per-stage wall time of one capture, in seconds.
+
+    Stages nest (``http_fetch`` contains the ``sanitize`` and ``write`` work done
+    while streaming the body), and each stage is charged only its exclusive time,
+    so the values add up to roughly the capture's total.
+    """
+
+    def __init__(self) -> None:
+        self.stages: dict[str, float] = {}
+        self.method = "http"
+        self._started = time.perf_counter()
+        # Time already charged to nested stages, one entry per open stage.
+        self._nested: list[float] = []
+
+    def add(self, stage: str, seconds: float) -> None:
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+        if self._nested:
+            self._nested[-1] += seconds
+
+    def finish(self) -> dict[str, float]:
+        """Record the capture in the histograms and return rounded timings, with ``total``."""
+        total = time.perf_counter() - self._started
+        for stage, seconds in self.stages.items():
+            STAGE_SECONDS.observe(seconds, stage=stage)
+        CAPTURE_SECONDS.observe(total, method=self.method)
+        return {**{stage: round(seconds, 4) for stage, seconds in self.stages.items()}, "total": round(total, 4)}
+
+
+_current: ContextVar[Optional[CaptureTimings]] = ContextVar("pagecopy_capture_timings", default=None)
+
+
+def start_capture() -> tuple[CaptureTimings, Token]:
+    timings = CaptureTimings()
+    return timings, _current.set(timings)
+
+
+def end_capture(token: Token) -> None:
+    _current.reset(token)
+
+
+def current_timings() -> Optional[CaptureTimings]:
+    return _current.get()
+
+
+@contextmanager
+def stage(name: str, **attributes: object) -> Iterator[None]:
+    """Time a capture stage (and trace it as a span when OpenTelemetry is available)."""
+    timings = _current.get()
+    if timings is not None:
+        timings._nested.append(0.0)
+    started = time.perf_counter()
+    with span(name, **attributes):
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            if timings is not None:
+                nested = timings._nested.pop()
+                timings.add(name, max(0.0, elapsed - nested))
+                if timings._nested:
+                    # The parent already got the exclusive part via add(); give it the nested part too.
+                    timings._nested[-1] += nested
+
+
+def add_time(name: str, seconds: float) -> None:
+    """Charge ``seconds`` to a stage that is too fine-grained for a span (e.g. per chunk)."""
+    timings = _current.get()
+    if timings is not None:
+        timings.add(name, seconds)
+
+
+_tracing_enabled = False
+
+
+def enable_tracing(enabled: bool = True) -> bool:
+    """Emit OpenTelemetry spans for capture stages; returns whether tracing is active."""
+    global _tracing_enabled
+    _tracing_enabled = enabled and otel_trace is not None
+    return _tracing_enabled
+
+
+@contextmanager
+def span(name: str, **attributes: object) -> Iterator[None]:
+    """An OpenTelemetry span when tracing is enabled, otherwise nothing."""
+    if not _tracing_enabled:
+        yield
+        return
+    tracer = otel_trace.get_tracer("pagecopy")
+    with tracer.start_as_current_span(f"pagecopy.{name}", attributes={k: str(v) for k, v in attributes.items()}):
+        yield
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import asyncio
+import random
+import time
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import Optional
+from urllib.parse import urlparse
+
+# Idle, full buckets are dropped once this many hosts are tracked.
+_MAX_BUCKETS = 4096
+
+
+class TokenBucket:
+    """``rate`` requests per second with bursts of up to ``burst``; waiters are served in order."""
+
+    def __init__(self, rate: float, burst: int) -> None:
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        # Set from Retry-After: nobody gets a token before this moment.
+        self.blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> float:
+        """Take one token, sleeping as long as needed; returns the seconds waited."""
+        if self.rate <= 0 and self.blocked_until <= time.monotonic():
+            return 0.0
+        waited = 0.0
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                delay = self.blocked_until - now
+                if delay <= 0:
+                    if self.rate <= 0:
+                        # Unthrottled: only a block (e.g. after a 429) holds requests back.
+                        return waited
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return waited
+                    delay = (1 - self.tokens) / self.rate
+                await asyncio.sleep(delay)
+                waited += delay
+
+    def block_for(self, seconds: float) -> None:
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    @property
+    def idle(self) -> bool:
+        now = time.monotonic()
+        self._refill(now)
+        return not self._lock.locked() and self.tokens >= self.burst and self.blocked_until <= now
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(float(self.burst), self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+class HostRateLimiter:
+    """One token bucket per hostname, so each origin is throttled independently.
+
+    ``host_rates`` overrides the default rate for a host and its subdomains; a
+    rate of 0 disables throttling for that host, except for :meth:`block`.
+    """
+
+    def __init__(self, rate: float, burst: int = 1, host_rates: Optional[dict[str, float]] = None) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.host_rates = {host.lower(): value for host, value in (host_rates or {}).items()}
+        self._buckets: dict[str, TokenBucket] = {}
+
+    async def acquire(self, url: str) -> float:
+        return await self._bucket(self._host(url)).acquire()
+
+    def block(self, url: str, seconds: float) -> None:
+        """Hold back every request to ``url``'s host for ``seconds`` (e.g. after a 429)."""
+        self._bucket(self._host(url)).block_for(seconds)
+
+    def rate_for(self, host: str) -> float:
+        candidate = host
+        while candidate:
+            rate = self.host_rates.get(candidate)
+            if rate is not None:
+                return rate
+            _, _, candidate = candidate.partition(".")
+        return self.rate
+
+    def _bucket(self, host: str) -> TokenBucket:
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            if len(self._buckets) >= _MAX_BUCKETS:
+                self._buckets = {key: value for key, value in self._buckets.items() if not value.idle}
+            bucket = self._buckets[host] = TokenBucket(self.rate_for(host), self.burst)
+        return bucket
+
+    @staticmethod
+    def _host(url: str) -> str:
+        return (urlparse(url).hostname or "").lower()
+
+
+def retry_delay(attempt: int, base: float, cap: float) -> float:
+    """Exponential backoff with jitter for the given 0-based retry ``attempt``."""
+    ceiling = min(cap, base * (2**attempt))
+    return random.uniform(ceiling / 2, ceiling)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds from a ``Retry-After`` header (delta-seconds or HTTP-date)."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        moment = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return max(0.0, (moment - datetime.now(timezone.utc)).total_seconds())
@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+import asyncio
+import re
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from backend.core.config import Settings
+from backend.core.sqlite import connect
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS render_stats (
+    host TEXT PRIMARY KEY,
+    http_attempts INTEGER NOT NULL DEFAULT 0,
+    http_shells INTEGER NOT NULL DEFAULT 0,
+    escalations INTEGER NOT NULL DEFAULT 0,
+    escalation_wins INTEGER NOT NULL DEFAULT 0,
+    decisions INTEGER NOT NULL DEFAULT 0,
+    updated_at TEXT NOT NULL
+);
+"""
+
+# Tags and <style> blocks; whatever is left over is visible text.
+_MARKUP_RE = re.compile(r"<style\b[^>]*>[^<]*</style\s*>|<[^>]*>", re.IGNORECASE)
+# Empty framework mount points and "enable JavaScript" fallbacks.
+_SPA_MARKER_RE = re.compile(
+    r"""<(div|main|section|app-root)\b[^>]*\bid\s*=\s*["']?(?:root|app|__next|__nuxt|q-app|svelte)\b[^>]*>\s*</\1\s*>"""
+    r"""|<app-root\b[^>]*>\s*</app-root\s*>"""
+    r"""|\b(?:enable|turn on) JavaScript\b""",
+    re.IGNORECASE,
+)
+# Past this much visible text a page is plainly server-rendered; stop measuring.
+_ENOUGH_TEXT = 20_000
+_RICH_TEXT = 600
+_MIN_TEXT = 100
+# When the counters pass this many HTTP samples they are halved, so recent behaviour dominates.
+_STATS_WINDOW = 200
+
+
+@dataclass(slots=True)
+class Verdict:
+    needs_browser: bool
+    reason: str
+
+
+class PageStats:
+    """Cheap content statistics gathered from sanitized output as it is written."""
+
+    def __init__(self) -> None:
+        self.html_chars = 0
+        self.text_chars = 0
+        self.script_chars = 0
+        self.spa_marker = False
+
+    def feed(self, html: str) -> None:
+        self.html_chars += len(html)
+        if self.text_chars >= _ENOUGH_TEXT or not html:
+            return
+        visible = _MARKUP_RE.sub(" ", html)
+        self.text_chars += len(visible) - sum(map(visible.count, " \t\r\n"))
+        if not self.spa_marker and _SPA_MARKER_RE.search(html):
+            self.spa_marker = True
+
+    def verdict(self) -> Verdict:
+        if self.text_chars >= _RICH_TEXT:
+            return Verdict(False, "text")
+        if self.spa_marker:
+            return Verdict(True, "spa_marker")
+        if self.script_chars > 4 * max(self.text_chars, 50):
+            return Verdict(True, "script_heavy")
+        if self.text_chars < _MIN_TEXT:
+            return Verdict(True, "no_text")
+        return Verdict(False, "text")
+
+    def improved_on(self, other: PageStats) -> bool:
+        """Whether this (browser) capture carries meaningfully more content than ``other``."""
+        return self.text_chars >= 2 * other.text_chars + _MIN_TEXT or (
+            other.spa_marker and not self.spa_marker and self.text_chars > other.text_chars
+        )
+
+
+@dataclass(slots=True)
+class HostRenderStats:
+    host: str
+    http_attempts: int = 0
+    http_shells: int = 0
+    escalations: int = 0
+    escalation_wins: int = 0
+    decisions: int = 0
+
+    @property
+    def shell_rate(self) -> float:
+        return self.http_shells / self.http_attempts if self.http_attempts else 0.0
+
+    @property
+    def win_rate(self) -> float:
+        return self.escalation_wins / self.escalations if self.escalations else 0.0
+
+
+class RenderClassifier:
+    """Decides per capture whether plain HTTP is enough or the browser is needed.
+
+    Every HTTP capture is classified from its sanitized content; a shell
+    (SPA mount point, script-only, no text) is re-rendered in the browser. The
+    outcomes are counted per host in the catalog database. Once a host has
+    ``min_samples`` captures:
+
+    * hosts that nearly always return shells, where the browser does help, go
+      straight to the browser (re-checking HTTP every ``explore_every`` captures);
+    * hosts where escalating rarely produced more content stop escalating.
+
+    ``js_heavy_hosts`` remain a prior for hosts with no history yet.
+    """
+
+    def __init__(
+        self,
+        db_path: Path,
+        js_heavy_hosts: Optional[list[str]] = None,
+        min_samples: int = 5,
+        explore_every: int = 20,
+        shell_threshold: float = 0.8,
+    ) -> None:
+        self.js_heavy_hosts = {host.lower() for host in (js_heavy_hosts or [])}
+        self.min_samples = max(1, min_samples)
+        self.explore_every = max(2, explore_every)
+        self.shell_threshold = shell_threshold
+        self._connection = connect(db_path)
+        self._connection.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    async def prefers_browser(self, host: str) -> bool:
+        """Whether to skip plain HTTP for this capture."""
+        stats = await asyncio.to_thread(self._bump_decisions, host.lower())
+        if stats.http_attempts < self.min_samples:
+            browser_first = stats.host in self.js_heavy_hosts
+        else:
+            browser_first = stats.shell_rate >= self.shell_threshold and (
+                stats.escalations < self.min_samples or stats.win_rate >= 0.5
+            )
+        if browser_first and stats.decisions % self.explore_every == 0:
+            # Occasionally let HTTP try again so a host that stopped needing the browser is noticed.
+            return False
+        return browser_first
+
+    async def should_escalate(self, host: str) -> bool:
+        """Whether an HTTP capture classified as a shell is worth a browser render."""
+        stats = await self.get(host)
+        return stats.escalations < self.min_samples or stats.win_rate >= 0.2
+
+    async def record_http(self, host: str, verdict: Verdict) -> None:
+        await asyncio.to_thread(
+            self._increment,
+            host.lower(),
+            {"http_attempts": 1, "http_shells": int(verdict.needs_browser)},
+        )
+
+    async def record_escalation(self, host: str, won: bool) -> None:
+        await asyncio.to_thread(self._increment, host.lower(), {"escalations": 1, "escalation_wins": int(won)})
+
+    async def get(self, host: str) -> HostRenderStats:
+        return await asyncio.to_thread(self._get, host.lower())
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def _get(self, host: str) -> HostRenderStats:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT host, http_attempts, http_shells, escalations, escalation_wins, decisions "
+                "FROM render_stats WHERE host = ?",
+                (host,),
+            ).fetchone()
+        return HostRenderStats(**dict(row)) if row else HostRenderStats(host=host)
+
+    def _bump_decisions(self, host: str) -> HostRenderStats:
+        self._increment(host, {"decisions": 1})
+        return self._get(host)
+
+    def _increment(self, host: str, deltas: dict[str, int]) -> None:
+        assignments = ", ".join(f"{column} = {column} + ?" for column in deltas)
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                self._connection.execute(
+                    "INSERT INTO render_stats (host, updated_at) VALUES (?, ?) ON CONFLICT(host) DO NOTHING",
+                    (host, Settings.current_timestamp()),
+                )
+                self._connection.execute(
+                    f"UPDATE render_stats SET {assignments}, updated_at = ? WHERE host = ?",
+                    (*deltas.values(), Settings.current_timestamp(), host),
+                )
+                self._connection.execute(
+                    "UPDATE render_stats SET http_attempts = http_attempts / 2, http_shells = http_shells / 2, "
+                    "escalations = escalations / 2, escalation_wins = escalation_wins / 2 "
+                    "WHERE host = ? AND http_attempts >= ?",
+                    (host, _STATS_WINDOW),
+                )
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+            self._connection.execute("COMMIT")
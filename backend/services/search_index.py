@@ -0,0 +1,423 @@
+from __future__ import annotations
+
+import asyncio
+import html as html_lib
+import re
+import threading
+from dataclasses import dataclass
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from backend.core.sqlite import connect
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS search_documents (
+    id INTEGER PRIMARY KEY,
+    digest TEXT NOT NULL UNIQUE,
+    original_url TEXT NOT NULL,
+    host TEXT NOT NULL DEFAULT '',
+    captured_at TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS search_documents_host ON search_documents (host);
+CREATE VIRTUAL TABLE IF NOT EXISTS search_text USING fts5(
+    title, body, url, tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+DEFAULT_MAX_TEXT_CHARS = 200_000
+# Matches scored per query at most; see SearchIndex._search.
+DEFAULT_RANK_WINDOW = 10_000
+# Column weights for bm25(): title, body, url.
+_WEIGHTS = (8.0, 1.0, 2.0)
+_SNIPPET_TOKENS = 24
+_MARK_START = "\x02"
+_MARK_END = "\x03"
+# unicode61 only splits on spaces and punctuation, so text in scripts written
+# without spaces is indexed one character per token and searched as phrases.
+_UNSPACED = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff"
+_UNSPACED_RE = re.compile(f"[{_UNSPACED}]")
+# The spaces _segment() added: next to such a character, CJK punctuation or a highlight marker.
+_JOINED = _UNSPACED + "\u3000-\u303f\uff00-\uffef"
+_RESPACED_RE = re.compile(f"(?<=[{_JOINED}]) (?=[{_JOINED}\x02])|(?<=[{_JOINED}\x03]) (?=[{_JOINED}])")
+# Shorter prefixes expand to too many terms to be fast without a prefix index.
+_MIN_PREFIX_CHARS = 3
+_QUERY_TERM_RE = re.compile(r'"([^"]*)"|(\S+)')
+_WHITESPACE_RE = re.compile(r"\s+")
+_CAPTURE_URL_RE = re.compile(r"^Archived from: (\S+)$", re.MULTILINE)
+# Files written before the blob store say "Captured at".
+_CAPTURE_AT_RE = re.compile(r"^(?:First captured|Captured) at \(UTC\): (\S+)$", re.MULTILINE)
+# Where the capture comment must end; see SnapshotService._build_comment.
+_CAPTURE_COMMENT_BYTES = 4096
+# Elements whose text is never shown on the page.
+_HIDDEN_ELEMENTS = frozenset({"style", "script", "template"})
+# Elements that separate words even without surrounding whitespace.
+_BLOCK_ELEMENTS = frozenset(
+    {
+        "address", "article", "aside", "blockquote", "br", "dd", "div", "dl", "dt", "figcaption", "figure",
+        "footer", "form", "h1", "h2", "h3", "h4", "h5", "h6", "header", "hr", "li", "main", "nav", "ol", "p",
+        "pre", "section", "table", "td", "th", "tr", "ul",
+    }
+)  # fmt: skip
+
+
+@dataclass(slots=True)
+class IndexedDocument:
+    digest: str
+    original_url: str
+    captured_at: str
+    title: str
+    text: str
+    # Only for pre-blob-store <timestamp>_<hash>.html files, which have no catalog row.
+    path: Optional[str] = None
+
+
+@dataclass(slots=True)
+class SearchHit:
+    digest: str
+    original_url: str
+    captured_at: str
+    relative_path: str
+    title: str
+    # HTML-escaped text with <mark> around the matching terms.
+    snippet: str
+    score: float
+
+
+class TextExtractor(HTMLParser):
+    """Title and visible text of a page, fed in the same chunks as the sanitizer output.
+
+    Text beyond ``max_chars`` is not indexed; once that much has been
+    collected, further chunks are not even parsed.
+    """
+
+    def __init__(self, max_chars: int = DEFAULT_MAX_TEXT_CHARS) -> None:
+        super().__init__(convert_charrefs=True)
+        self.max_chars = max_chars
+        self.title = ""
+        self._parts: List[str] = []
+        self._size = 0
+        self._hidden = 0
+        self._in_title = False
+
+    @property
+    def full(self) -> bool:
+        return self._size >= self.max_chars
+
+    def feed(self, data: str) -> None:
+        if not self.full:
+            super().feed(data)
+
+    def text(self) -> str:
+        if not self.full:
+            self.close()
+        return _WHITESPACE_RE.sub(" ", "".join(self._parts)).strip()[: self.max_chars]
+
+    def handle_starttag(self, tag: str, attrs) -> None:
+        if tag == "title" and not self.title:
+            self._in_title = True
+        elif tag in _HIDDEN_ELEMENTS:
+            self._hidden += 1
+        elif tag in _BLOCK_ELEMENTS:
+            self._append(" ")
+
+    def handle_startendtag(self, tag: str, attrs) -> None:
+        if tag in _BLOCK_ELEMENTS:
+            self._append(" ")
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag == "title":
+            self._in_title = False
+        elif tag in _HIDDEN_ELEMENTS:
+            self._hidden = max(0, self._hidden - 1)
+        elif tag in _BLOCK_ELEMENTS:
+            self._append(" ")
+
+    def handle_data(self, data: str) -> None:
+        if self._in_title:
+            self.title = _WHITESPACE_RE.sub(" ", self.title + data).strip()[:1000]
+        elif not self._hidden:
+            self._append(data)
+
+    def _append(self, data: str) -> None:
+        self._parts.append(data)
+        self._size += len(data)
+
+
+def extract_document(
+    digest: str,
+    document: bytes,
+    max_chars: int = DEFAULT_MAX_TEXT_CHARS,
+    path: Optional[str] = None,
+) -> IndexedDocument:
+    """Index entry for a stored snapshot file, with URL and date taken from its capture comment.
+
+    A plain function of its arguments, so it can run in a process pool.
+    """
+    head = document[:_CAPTURE_COMMENT_BYTES].decode("utf-8", errors="replace")
+    url = _CAPTURE_URL_RE.search(head)
+    captured_at = _CAPTURE_AT_RE.search(head)
+    extractor = TextExtractor(max_chars)
+    extractor.feed(document.decode("utf-8", errors="replace"))
+    return IndexedDocument(
+        digest=digest,
+        original_url=url.group(1) if url else "",
+        captured_at=captured_at.group(1) if captured_at else "",
+        title=extractor.title,
+        text=extractor.text(),
+        path=path,
+    )
+
+
+class SearchIndex:
+    """SQLite FTS5 index over the title and text of stored snapshot documents.
+
+    Rows are keyed on the blob digest, so a page captured many times is indexed
+    once, under the URL and time it was first seen. It shares ``db_path`` with
+    :class:`~backend.services.blob_store.BlobStore`: hits are joined against
+    ``blobs``, so deleted snapshots drop out of results immediately and
+    :meth:`prune` reclaims their rows later. Pre-blob-store files are never
+    deleted by the service; their rows carry the file's ``path`` instead.
+
+    Queries matching more than ``rank_window`` documents are ranked among the
+    most recently indexed ``rank_window`` of them, which keeps common words fast.
+    """
+
+    def __init__(
+        self,
+        db_path: Path,
+        max_text_chars: int = DEFAULT_MAX_TEXT_CHARS,
+        rank_window: int = DEFAULT_RANK_WINDOW,
+    ) -> None:
+        self.max_text_chars = max_text_chars
+        self.rank_window = rank_window
+        self._connection = connect(db_path)
+        self._connection.executescript(_SCHEMA)
+        self._migrate()
+        self._lock = threading.Lock()
+
+    def extractor(self) -> TextExtractor:
+        return TextExtractor(self.max_text_chars)
+
+    async def add(self, documents: Iterable[IndexedDocument]) -> int:
+        """Index documents not indexed yet; returns how many were new."""
+        items = [document for document in documents if document.original_url]
+        if not items:
+            return 0
+        return await asyncio.to_thread(self._add, items)
+
+    async def search(
+        self,
+        query: str,
+        limit: int = 20,
+        offset: int = 0,
+        host: Optional[str] = None,
+    ) -> Tuple[List[SearchHit], Optional[int]]:
+        """Best matches first; the second element is the offset of the next page, or ``None``."""
+        expression = match_expression(query)
+        if not expression:
+            return [], None
+        return await asyncio.to_thread(self._search, expression, limit, offset, host.lower() if host else None)
+
+    async def unindexed(self, after: str = "", limit: int = 500) -> List[Tuple[str, str]]:
+        """``(digest, relative_path)`` of stored documents without an index entry, in digest order."""
+        return await asyncio.to_thread(self._unindexed, after, limit)
+
+    async def unindexed_paths(self, paths: Iterable[str]) -> List[str]:
+        """The pre-blob-store files among ``paths`` that have no index entry yet."""
+        items = sorted(set(paths))
+        if not items:
+            return []
+        return await asyncio.to_thread(self._unindexed_paths, items)
+
+    async def prune(self) -> int:
+        """Drop entries whose document is no longer stored."""
+        return await asyncio.to_thread(self._prune)
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def _add(self, documents: List[IndexedDocument]) -> int:
+        added = 0
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                for document in documents:
+                    cursor = self._connection.execute(
+                        "INSERT OR IGNORE INTO search_documents (digest, original_url, host, captured_at, path) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (
+                            document.digest,
+                            document.original_url,
+                            (urlparse(document.original_url).hostname or "").lower(),
+                            document.captured_at,
+                            document.path,
+                        ),
+                    )
+                    if not cursor.rowcount:
+                        continue
+                    self._connection.execute(
+                        "INSERT INTO search_text (rowid, title, body, url) VALUES (?, ?, ?, ?)",
+                        (
+                            cursor.lastrowid,
+                            _segment(document.title),
+                            _segment(document.text),
+                            document.original_url,
+                        ),
+                    )
+                    added += 1
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+            self._connection.execute("COMMIT")
+        return added
+
+    def _search(
+        self,
+        expression: str,
+        limit: int,
+        offset: int,
+        host: Optional[str],
+    ) -> Tuple[List[SearchHit], Optional[int]]:
+        where = "search_text MATCH ?"
+        params: list[object] = [expression]
+        if host:
+            where += " AND d.host = ?"
+            params.append(host)
+        weights = ", ".join(str(weight) for weight in _WEIGHTS)
+        with self._lock:
+            # Scoring costs time per matching row, and a query for very common words matches
+            # nearly every document. Rank only the newest rank_window matches; walking the
+            # rowids to find where they start is cheap.
+            floor = self._connection.execute(
+                f"SELECT search_text.rowid FROM search_text JOIN search_documents AS d ON d.id = search_text.rowid "
+                f"WHERE {where} ORDER BY search_text.rowid DESC LIMIT 1 OFFSET ?",
+                (*params, self.rank_window),
+            ).fetchone()
+            if floor is not None:
+                where += " AND search_text.rowid >= ?"
+                params.append(floor[0])
+            # Snippets are only built for the page being returned, not for every match.
+            rows = self._connection.execute(
+                f"""
+                WITH page AS (
+                    SELECT search_text.rowid AS id, d.digest, d.original_url, d.captured_at,
+                           COALESCE(b.path, d.path) AS path, bm25(search_text, {weights}) AS score
+                    FROM search_text
+                    JOIN search_documents AS d ON d.id = search_text.rowid
+                    LEFT JOIN blobs AS b ON b.digest = d.digest
+                    WHERE {where} AND (b.digest IS NOT NULL OR d.path IS NOT NULL)
+                    ORDER BY score
+                    LIMIT ? OFFSET ?
+                )
+                SELECT page.*, search_text.title AS title,
+                       snippet(search_text, 1, char(2), char(3), '…', {_SNIPPET_TOKENS}) AS snippet
+                FROM page
+                JOIN search_text ON search_text.rowid = page.id
+                WHERE search_text MATCH ?
+                ORDER BY page.score
+                """,
+                (*params, limit + 1, offset, expression),
+            ).fetchall()
+        hits = [
+            SearchHit(
+                digest=row["digest"],
+                original_url=row["original_url"],
+                captured_at=row["captured_at"],
+                relative_path=row["path"],
+                title=_unsegment(row["title"]),
+                snippet=_render_snippet(row["snippet"]),
+                # bm25() is lower for better matches; flip it so higher is better.
+                score=round(-row["score"], 4),
+            )
+            for row in rows[:limit]
+        ]
+        return hits, offset + limit if len(rows) > limit else None
+
+    def _unindexed(self, after: str, limit: int) -> List[Tuple[str, str]]:
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT b.digest, b.path FROM blobs AS b "
+                "LEFT JOIN search_documents AS d ON d.digest = b.digest "
+                "WHERE b.digest > ? AND b.path LIKE 'objects/%' AND d.id IS NULL "
+                "ORDER BY b.digest LIMIT ?",
+                (after, limit),
+            ).fetchall()
+        return [(row["digest"], row["path"]) for row in rows]
+
+    def _unindexed_paths(self, paths: List[str]) -> List[str]:
+        found: set[str] = set()
+        with self._lock:
+            for start in range(0, len(paths), 500):
+                chunk = paths[start : start + 500]
+                placeholders = ", ".join("?" * len(chunk))
+                found.update(
+                    row["path"]
+                    for row in self._connection.execute(
+                        f"SELECT path FROM search_documents WHERE path IN ({placeholders})",
+                        chunk,
+                    )
+                )
+        return [path for path in paths if path not in found]
+
+    def _prune(self) -> int:
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                ids = [
+                    row["id"]
+                    for row in self._connection.execute(
+                        "SELECT d.id FROM search_documents AS d LEFT JOIN blobs AS b ON b.digest = d.digest "
+                        "WHERE b.digest IS NULL AND d.path IS NULL"
+                    )
+                ]
+                for start in range(0, len(ids), 500):
+                    chunk = ids[start : start + 500]
+                    placeholders = ", ".join("?" * len(chunk))
+                    self._connection.execute(f"DELETE FROM search_text WHERE rowid IN ({placeholders})", chunk)
+                    self._connection.execute(f"DELETE FROM search_documents WHERE id IN ({placeholders})", chunk)
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+            self._connection.execute("COMMIT")
+        return len(ids)
+
+    def _migrate(self) -> None:
+        existing = {row["name"] for row in self._connection.execute("PRAGMA table_info(search_documents)")}
+        if "path" not in existing:
+            self._connection.execute("ALTER TABLE search_documents ADD COLUMN path TEXT")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS search_documents_path ON search_documents (path)")
+
+
+def match_expression(query: str) -> str:
+    """An FTS5 query matching every term of ``query``; ``"quoted text"`` is a phrase.
+
+    User input is never passed through as FTS5 syntax, so operators and stray
+    quotes cannot cause syntax errors. A bare term ending in ``*`` (at least
+    three characters before it) matches as a prefix.
+    """
+    terms: List[str] = []
+    for match in _QUERY_TERM_RE.finditer(query):
+        phrase, bare = match.group(1), match.group(2)
+        prefix = bare is not None and bare.endswith("*") and len(bare.rstrip("*")) >= _MIN_PREFIX_CHARS
+        text = phrase if phrase is not None else bare.rstrip("*")
+        text = _WHITESPACE_RE.sub(" ", _segment(text)).strip()
+        # Drop terms that are nothing but punctuation; the tokenizer would see no token at all.
+        if not any(character.isalnum() for character in text):
+            continue
+        terms.append('"' + text.replace('"', '""') + '"' + ("*" if prefix and not _UNSPACED_RE.search(text) else ""))
+    return " ".join(terms)
+
+
+def _segment(text: str) -> str:
+    return _UNSPACED_RE.sub(r" \g<0> ", text)
+
+
+def _unsegment(text: str) -> str:
+    return _RESPACED_RE.sub("", _WHITESPACE_RE.sub(" ", text).strip())
+
+
+def _render_snippet(snippet: str) -> str:
+    text = html_lib.escape(_unsegment(snippet))
+    return text.replace(_MARK_START, "<mark>").replace(_MARK_END, "</mark>")
@@ -1,20 +1,53 @@
 from __future__ import annotations
 
-import hashlib
+import asyncio
+import codecs
+import importlib.util
+import logging
 import re
-from dataclasses import dataclass
+import sqlite3
+import time
+from dataclasses import dataclass, field, replace
 from datetime import datetime, timezone
+from http.cookiejar import CookieJar, DefaultCookiePolicy
 from pathlib import Path
-from typing import Optional
+from typing import AsyncIterator, Iterable, Optional
 from urllib.parse import urlparse
 
-import aiofiles  # type: ignore[import-not-found]
 import httpx
 
+from backend.services.asset_archiver import AssetArchiver
+from backend.services.blob_store import BlobRef, BlobStore
+from backend.services import metrics
 from backend.services.browser_renderer import (
+    BrowserBusyError,
     BrowserRenderer,
     BrowserRenderingError,
 )
+from backend.services.capture_cache import CaptureCache
+from backend.services.html_sanitizer import StreamingSanitizer
+from backend.services.rate_limiter import HostRateLimiter, parse_retry_after, retry_delay
+from backend.services.render_classifier import PageStats, RenderClassifier
+from backend.services.search_index import IndexedDocument, SearchIndex, TextExtractor
+from backend.services.storage import StorageError
+from backend.services.validator_store import CaptureValidators, ValidatorStore
+
+logger = logging.getLogger(__name__)
+
+_RETRYABLE_STATUSES = frozenset({429, 502, 503, 504})
+_THROTTLE_STATUSES = frozenset({429, 503})
+
+# Bytes buffered before giving up on finding a <meta charset> (the HTML prescan length).
+_CHARSET_SNIFF_BYTES = 1024
+_META_CHARSET_RE = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?\s*([A-Za-z0-9_.:-]+)""", re.IGNORECASE)
+# Labels browsers decode with a wider codec than Python's codec of the same name.
+_CHARSET_ALIASES = {
+    "gb2312": "gb18030",
+    "gbk": "gb18030",
+    "x-gbk": "gb18030",
+    "iso-8859-1": "cp1252",
+    "ascii": "cp1252",
+}
 
 
 class SnapshotError(Exception):
@@ -25,13 +58,40 @@ class SnapshotUnsupportedError(SnapshotError):
     """Raised when the resource cannot be archived."""
 
 
+class _TransientFetchError(SnapshotError):
+    """An HTTP failure worth retrying: timeouts, dropped connections, 429/5xx."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None, throttled: bool = False) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+        # The origin asked us to slow down; back off the whole host, not just this URL.
+        self.throttled = throttled
+
+
 @dataclass(slots=True)
 class SnapshotMetadata:
     original_url: str
-    archived_path: Path
+    # None when snapshots live in remote storage.
+    archived_path: Optional[Path]
     archived_url: str
     relative_url: str
     captured_at: datetime
+    content_hash: str
+    # True when the origin answered 304 and the capture reuses the previous snapshot.
+    unchanged: bool = False
+    # True when the result was shared from a concurrent or recent capture of the same page.
+    reused: bool = False
+    # Seconds spent per capture stage, plus "total"; those of the original capture when reused.
+    timings: dict[str, float] = field(default_factory=dict)
+
+
+@dataclass(slots=True)
+class _HttpFetch:
+    # None when the origin answered 304 Not Modified.
+    blob: Optional[BlobRef]
+    etag: Optional[str]
+    last_modified: Optional[str]
+    stats: Optional[PageStats] = None
 
 
 class SnapshotService:
@@ -43,6 +103,22 @@ class SnapshotService:
         browser_renderer: Optional[BrowserRenderer] = None,
         js_heavy_hosts: Optional[list[str]] = None,
         session_store: Optional[Path] = None,
+        blob_store: Optional[BlobStore] = None,
+        validator_store: Optional[ValidatorStore] = None,
+        http_max_connections: int = 100,
+        http_max_keepalive_connections: int = 20,
+        http_keepalive_expiry: float = 30.0,
+        http2: bool = False,
+        max_body_bytes: int = 20 * 1024 * 1024,
+        asset_archiver: Optional[AssetArchiver] = None,
+        render_classifier: Optional[RenderClassifier] = None,
+        http_rate_limiter: Optional[HostRateLimiter] = None,
+        browser_rate_limiter: Optional[HostRateLimiter] = None,
+        http_max_retries: int = 3,
+        http_retry_backoff: float = 1.0,
+        http_retry_max_delay: float = 60.0,
+        capture_cache: Optional[CaptureCache] = None,
+        search_index: Optional[SearchIndex] = None,
     ) -> None:
         self.snapshot_root = snapshot_root
         self.snapshot_root.mkdir(parents=True, exist_ok=True)
@@ -51,41 +127,202 @@ class SnapshotService:
         self.browser_renderer = browser_renderer
         self.js_heavy_hosts = {host.lower() for host in (js_heavy_hosts or [])}
         self.session_store = session_store
+        self.validator_store = validator_store
+        self.blob_store = blob_store or BlobStore(snapshot_root, snapshot_root.parent / "catalog.sqlite3")
+        self.http_limits = httpx.Limits(
+            max_connections=http_max_connections,
+            max_keepalive_connections=http_max_keepalive_connections,
+            keepalive_expiry=http_keepalive_expiry,
+        )
+        self.http2 = http2
+        self.max_body_bytes = max_body_bytes
+        self.asset_archiver = asset_archiver
+        self.render_classifier = render_classifier
+        self.http_rate_limiter = http_rate_limiter
+        self.browser_rate_limiter = browser_rate_limiter
+        self.http_max_retries = max(0, http_max_retries)
+        self.http_retry_backoff = http_retry_backoff
+        self.http_retry_max_delay = http_retry_max_delay
+        self.capture_cache = capture_cache
+        self.search_index = search_index
+        self._client: Optional[httpx.AsyncClient] = None
+
+    async def startup(self) -> None:
+        self._get_client()
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            client, self._client = self._client, None
+            await client.aclose()
 
     async def create_snapshot(
         self,
         url: str,
         force_browser: bool = False,
         cookie_header: Optional[str] = None,
+        bypass_cache: bool = False,
+    ) -> SnapshotMetadata:
+        """Capture ``url``, sharing the work with identical concurrent (or, with a TTL, recent) requests.
+
+        ``bypass_cache`` skips recently finished captures but still joins one in flight.
+        """
+        if self.capture_cache is None:
+            return await self._capture(url, force_browser, cookie_header)
+        metadata = await self.capture_cache.get_or_capture(
+            CaptureCache.key(url, cookie_header, force_browser),
+            lambda: self._capture(url, force_browser, cookie_header),
+            bypass_cache=bypass_cache,
+        )
+        # A shared capture may have been requested under a differently spelled URL.
+        return metadata if metadata.original_url == url else replace(metadata, original_url=url)
+
+    async def _capture(
+        self,
+        url: str,
+        force_browser: bool,
+        cookie_header: Optional[str],
+    ) -> SnapshotMetadata:
+        timings, token = metrics.start_capture()
+        try:
+            with metrics.span("capture", url=url):
+                try:
+                    metadata = await self._capture_stages(url, force_browser, cookie_header)
+                except (StorageError, OSError) as exc:
+                    # Fail this URL only; callers gather captures and expect SnapshotError.
+                    raise SnapshotError(f"Storage error: {exc}") from exc
+        except SnapshotError as exc:
+            metrics.CAPTURES.inc(method=timings.method, outcome="failed")
+            metrics.FAILURES.inc(reason=_failure_reason(exc))
+            timings.finish()
+            raise
+        finally:
+            metrics.end_capture(token)
+        metadata.timings = timings.finish()
+        metrics.CAPTURES.inc(method=timings.method, outcome="unchanged" if metadata.unchanged else "captured")
+        return metadata
+
+    async def _capture_stages(
+        self,
+        url: str,
+        force_browser: bool,
+        cookie_header: Optional[str],
     ) -> SnapshotMetadata:
         captured_at = datetime.now(timezone.utc)
-        html: Optional[str] = None
-        use_browser = force_browser or self._should_use_browser(url)
+        blob: Optional[BlobRef] = None
+        use_browser = force_browser or await self._should_use_browser(url)
         http_error: Optional[SnapshotError] = None
 
+        fetched: Optional[_HttpFetch] = None
+
         if not use_browser:
+            validators = await self.validator_store.get(url, cookie_header) if self.validator_store else None
             try:
-                html = await self._fetch_via_http(url, captured_at, cookie_header)
+                fetched = await self._fetch_via_http(url, captured_at, cookie_header, validators)
+                if fetched.blob is None and validators is not None:
+                    blob = await self.blob_store.acquire(validators.content_hash)
+                    if blob is not None:
+                        return self._metadata_for(url, blob, captured_at, unchanged=True)
+                    # The snapshot we validated against was deleted; fetch the full body again.
+                    fetched = await self._fetch_via_http(url, captured_at, cookie_header, None)
+                blob = await self._escalate_if_shell(url, captured_at, cookie_header, fetched)
+            except SnapshotUnsupportedError:
+                # Not HTML or too large: a browser would only download it again.
+                raise
+            except _TransientFetchError as exc:
+                if exc.throttled:
+                    # Still rate limited after retrying; a browser visit would only add load.
+                    raise
+                http_error = exc
+                fetched = None
             except SnapshotError as exc:
                 http_error = exc
+                fetched = None
 
-        if html is None:
+        if blob is None:
             if self.browser_renderer is None:
                 raise http_error or SnapshotError("Browser renderer is not configured.")
-            html = await self._render_with_browser(url, captured_at, cookie_header)
+            blob = await self._capture_with_browser(url, captured_at, cookie_header)
+
+        if fetched is not None and self.validator_store and (fetched.etag or fetched.last_modified):
+            await self.validator_store.put(
+                url,
+                cookie_header,
+                CaptureValidators(etag=fetched.etag, last_modified=fetched.last_modified, content_hash=blob.digest),
+            )
+        return self._metadata_for(url, blob, captured_at)
+
+    async def _escalate_if_shell(
+        self,
+        url: str,
+        captured_at: datetime,
+        cookie_header: Optional[str],
+        fetched: _HttpFetch,
+    ) -> BlobRef:
+        """Re-render an HTTP capture in the browser when its content looks client-rendered."""
+        blob, stats = fetched.blob, fetched.stats
+        if self.render_classifier is None or stats is None:
+            return blob
+        host = urlparse(url).hostname or ""
+        verdict = stats.verdict()
+        await self.render_classifier.record_http(host, verdict)
+        if (
+            not verdict.needs_browser
+            or self.browser_renderer is None
+            or not await self.render_classifier.should_escalate(host)
+        ):
+            return blob
+        logger.info("HTTP capture looks client-rendered, escalating", extra={"url": url, "reason": verdict.reason})
+        rendered_stats = PageStats()
+        try:
+            rendered = await self._capture_with_browser(url, captured_at, cookie_header, rendered_stats)
+        except SnapshotError as exc:
+            # A full pool, a timeout or a crash says nothing about whether the browser helps on this
+            # host; only renders that finished count towards its win rate.
+            logger.warning("Browser escalation failed, keeping HTTP capture", extra={"url": url, "error": str(exc)})
+            metrics.ESCALATIONS.inc(result="failed")
+            return blob
+        won = rendered_stats.improved_on(stats)
+        await self.render_classifier.record_escalation(host, won)
+        metrics.ESCALATIONS.inc(result="won" if won else "lost")
+        timings = metrics.current_timings()
+        if timings is not None and not won:
+            timings.method = "http"
+        keep, drop = (rendered, blob) if won else (blob, rendered)
+        await self.blob_store.release([drop.digest])
+        return keep
 
-        filename = self._build_filename(url, captured_at)
-        archived_path = self.snapshot_root / filename
-        await self._write_file(archived_path, html)
-        relative_url = f"/snapshots/{filename}"
-        archived_url = f"{self.snapshot_base_url}/{filename}"
+    async def _capture_with_browser(
+        self,
+        url: str,
+        captured_at: datetime,
+        cookie_header: Optional[str],
+        stats: Optional[PageStats] = None,
+    ) -> BlobRef:
+        rendered_html = await self._render_with_browser(url, cookie_header)
+        timings = metrics.current_timings()
+        if timings is not None:
+            timings.method = "browser"
+        return await self._store_document(url, captured_at, self._iter_once(rendered_html), stats)
+
+    async def release_snapshots(self, content_hashes: Iterable[Optional[str]]) -> int:
+        """Drop the references held by deleted captures; unreferenced files are removed."""
+        return await self.blob_store.release(digest for digest in content_hashes if digest)
 
+    def _metadata_for(
+        self,
+        url: str,
+        blob: BlobRef,
+        captured_at: datetime,
+        unchanged: bool = False,
+    ) -> SnapshotMetadata:
         return SnapshotMetadata(
             original_url=url,
-            archived_path=archived_path,
-            archived_url=archived_url,
-            relative_url=relative_url,
+            archived_path=blob.path,
+            archived_url=f"{self.snapshot_base_url}/{blob.relative_path}",
+            relative_url=f"/snapshots/{blob.relative_path}",
             captured_at=captured_at,
+            content_hash=blob.digest,
+            unchanged=unchanged,
         )
 
     async def _fetch_via_http(
@@ -93,73 +330,288 @@ class SnapshotService:
         url: str,
         captured_at: datetime,
         cookie_header: Optional[str],
-    ) -> str:
+        validators: Optional[CaptureValidators] = None,
+    ) -> _HttpFetch:
+        """Fetch with the per-host rate limit, retrying transient failures with jittered backoff.
+
+        A ``Retry-After`` longer than ``http_retry_max_delay`` fails immediately
+        rather than tying up a worker.
+        """
+        attempt = 0
+        while True:
+            if self.http_rate_limiter is not None:
+                metrics.add_time("rate_limit_wait", await self.http_rate_limiter.acquire(url))
+            try:
+                with metrics.stage("http_fetch", url=url, attempt=attempt):
+                    return await self._fetch_once(url, captured_at, cookie_header, validators)
+            except _TransientFetchError as exc:
+                if attempt >= self.http_max_retries:
+                    raise
+                delay = exc.retry_after
+                if delay is None:
+                    delay = retry_delay(attempt, self.http_retry_backoff, self.http_retry_max_delay)
+                if delay > self.http_retry_max_delay:
+                    raise
+                logger.info(
+                    "Retrying HTTP fetch",
+                    extra={"url": url, "attempt": attempt + 1, "delay": round(delay, 2), "error": str(exc)},
+                )
+                if exc.throttled and self.http_rate_limiter is not None:
+                    # The next acquire() waits this out, along with every other request to the host.
+                    self.http_rate_limiter.block(url, delay)
+                else:
+                    with metrics.stage("retry_backoff"):
+                        await asyncio.sleep(delay)
+                attempt += 1
+
+    async def _fetch_once(
+        self,
+        url: str,
+        captured_at: datetime,
+        cookie_header: Optional[str],
+        validators: Optional[CaptureValidators] = None,
+    ) -> _HttpFetch:
+        """Stream the page straight through the sanitizer into the blob store.
+
+        Headers are checked before any of the body is read, so non-HTML and
+        oversized responses are abandoned without downloading them.
+        """
+        headers = validators.conditional_headers() if validators else {}
+        if cookie_header:
+            headers["Cookie"] = cookie_header
         try:
-            headers = {"User-Agent": "PageCopyBot/1.0"}
-            if cookie_header:
-                headers["Cookie"] = cookie_header
-            async with httpx.AsyncClient(
-                timeout=self.request_timeout,
-                follow_redirects=True,
-                headers=headers,
-            ) as client:
-                response = await client.get(url)
-            response.raise_for_status()
+            async with self._get_client().stream("GET", url, headers=headers) as response:
+                if response.status_code == 304 and validators is not None:
+                    return _HttpFetch(blob=None, etag=validators.etag, last_modified=validators.last_modified)
+                response.raise_for_status()
+                content_type = response.headers.get("content-type", "").lower()
+                if "text/html" not in content_type and "application/xhtml+xml" not in content_type:
+                    raise SnapshotUnsupportedError("Unsupported content type for snapshot.")
+                content_length = response.headers.get("content-length", "")
+                if content_length.isdigit() and int(content_length) > self.max_body_bytes:
+                    raise SnapshotUnsupportedError(self._too_large_message())
+                stats = PageStats()
+                blob = await self._store_document(url, captured_at, self._decode_body(response), stats)
+                return _HttpFetch(
+                    blob=blob,
+                    etag=response.headers.get("etag"),
+                    last_modified=response.headers.get("last-modified"),
+                    stats=stats,
+                )
         except httpx.TimeoutException as exc:
-            raise SnapshotError("HTTP fetch timed out.") from exc
+            raise _TransientFetchError("HTTP fetch timed out.") from exc
         except httpx.HTTPStatusError as exc:
-            status = exc.response.status_code if exc.response else "unknown"
-            raise SnapshotError(f"HTTP fetch failed with status {status}.") from exc
+            status = exc.response.status_code
+            message = f"HTTP fetch failed with status {status}."
+            if status in _RETRYABLE_STATUSES:
+                raise _TransientFetchError(
+                    message,
+                    retry_after=parse_retry_after(exc.response.headers.get("retry-after")),
+                    throttled=status in _THROTTLE_STATUSES,
+                ) from exc
+            raise SnapshotError(message) from exc
+        except httpx.TransportError as exc:
+            raise _TransientFetchError(f"HTTP fetch error: {exc}") from exc
         except httpx.RequestError as exc:
             raise SnapshotError(f"HTTP fetch error: {exc}") from exc
-        content_type = response.headers.get("content-type", "").lower()
-        if "text/html" not in content_type and "application/xhtml+xml" not in content_type:
-            raise SnapshotUnsupportedError("Unsupported content type for snapshot.")
 
-        comment = self._build_comment(url, captured_at)
-        content = self._sanitize_html(response.text, url)
-        return f"{comment}\n{content}"
+    async def _decode_body(self, response: httpx.Response) -> AsyncIterator[str]:
+        """Decode the body incrementally, enforcing ``max_body_bytes`` on the decompressed size."""
+        declared = response.charset_encoding
+        decoder: Optional[codecs.IncrementalDecoder] = None
+        head = b""
+        received = 0
+        async for chunk in response.aiter_bytes():
+            received += len(chunk)
+            if received > self.max_body_bytes:
+                raise SnapshotUnsupportedError(self._too_large_message())
+            if decoder is None:
+                # Hold the first bytes back until the encoding is known: a BOM needs
+                # 3 bytes, a <meta charset> may take up to the whole prescan window.
+                head += chunk
+                if len(head) < (3 if declared else _CHARSET_SNIFF_BYTES):
+                    continue
+                decoder = self._decoder_for(head, declared)
+                chunk, head = head, b""
+            text = decoder.decode(chunk)
+            if text:
+                yield text
+        if decoder is None:
+            decoder = self._decoder_for(head, declared)
+        text = decoder.decode(head, final=True)
+        if text:
+            yield text
 
-    async def _render_with_browser(
+    @staticmethod
+    def _decoder_for(head: bytes, declared: Optional[str]) -> codecs.IncrementalDecoder:
+        if head.startswith(codecs.BOM_UTF8):
+            encoding = "utf-8-sig"
+        elif head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+            encoding = "utf-16"
+        else:
+            encoding = declared
+            if encoding is None:
+                match = _META_CHARSET_RE.search(head)
+                encoding = match.group(1).decode("ascii") if match else "utf-8"
+            encoding = _CHARSET_ALIASES.get(encoding.lower(), encoding)
+        try:
+            factory = codecs.getincrementaldecoder(encoding)
+        except LookupError:
+            logger.warning("Unknown charset, decoding as UTF-8", extra={"charset": encoding})
+            factory = codecs.getincrementaldecoder("utf-8")
+        return factory(errors="replace")
+
+    async def _store_document(
         self,
         url: str,
         captured_at: datetime,
+        chunks: AsyncIterator[str],
+        stats: Optional[PageStats] = None,
+    ) -> BlobRef:
+        """Sanitize ``chunks`` into a new blob; the capture comment is left out of the hash."""
+        sanitizer = StreamingSanitizer(url)
+        stats = stats or PageStats()
+        extractor = self.search_index.extractor() if self.search_index is not None else None
+        header = f"{self._build_comment(url, captured_at)}\n".encode("utf-8")
+        if self.asset_archiver is not None:
+            # Rewriting asset links needs the whole page; it is bounded by max_body_bytes.
+            parts = []
+            async for chunk in chunks:
+                started = time.perf_counter()
+                parts.append(sanitizer.feed(chunk))
+                metrics.add_time("sanitize", time.perf_counter() - started)
+            with metrics.stage("sanitize"):
+                parts.append(sanitizer.close())
+                html = "".join(parts)
+                stats.feed(html)
+                stats.script_chars = sanitizer.dropped_script_chars
+            if extractor is not None:
+                with metrics.stage("index"):
+                    extractor.feed(html)
+            with metrics.stage("assets", url=url):
+                page = await self.asset_archiver.localize(html, url, self._get_client())
+            try:
+                with metrics.stage("write"):
+                    async with self.blob_store.writer(header) as writer:
+                        await writer.write(page.html.encode("utf-8"))
+                        blob = await writer.commit()
+                    await self.blob_store.link(blob.digest, page.assets)
+            finally:
+                await self.blob_store.release(page.assets)
+            await self._index_document(blob, url, captured_at, extractor)
+            return blob
+        # Per-chunk work is summed rather than spanned; whatever is left of the
+        # enclosing stage is time spent waiting on the network.
+        async with self.blob_store.writer(header) as writer:
+            async for chunk in chunks:
+                started = time.perf_counter()
+                out = sanitizer.feed(chunk)
+                stats.feed(out)
+                sanitized = time.perf_counter()
+                await writer.write(out.encode("utf-8"))
+                written = time.perf_counter()
+                metrics.add_time("sanitize", sanitized - started)
+                metrics.add_time("write", written - sanitized)
+                if extractor is not None:
+                    extractor.feed(out)
+                    metrics.add_time("index", time.perf_counter() - written)
+            with metrics.stage("sanitize"):
+                out = sanitizer.close()
+                stats.feed(out)
+                stats.script_chars = sanitizer.dropped_script_chars
+            with metrics.stage("write"):
+                await writer.write(out.encode("utf-8"))
+                blob = await writer.commit()
+        if extractor is not None:
+            with metrics.stage("index"):
+                extractor.feed(out)
+        await self._index_document(blob, url, captured_at, extractor)
+        return blob
+
+    async def _index_document(
+        self,
+        blob: BlobRef,
+        url: str,
+        captured_at: datetime,
+        extractor: Optional[TextExtractor],
+    ) -> None:
+        """Add a stored document to the search index; content seen before is already there."""
+        if extractor is None:
+            return
+        document = IndexedDocument(
+            digest=blob.digest,
+            original_url=url,
+            captured_at=captured_at.isoformat(),
+            title=extractor.title,
+            text=extractor.text(),
+        )
+        try:
+            with metrics.stage("index"):
+                await self.search_index.add([document])
+        except sqlite3.Error as exc:
+            # The snapshot itself is stored; the backfill script picks up what is missing here.
+            logger.warning("Search indexing failed", extra={"url": url, "error": str(exc)})
+
+    @staticmethod
+    async def _iter_once(text: str) -> AsyncIterator[str]:
+        yield text
+
+    def _too_large_message(self) -> str:
+        return f"Response body exceeds the {self.max_body_bytes} byte limit."
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            http2 = self.http2
+            if http2 and importlib.util.find_spec("h2") is None:
+                logger.warning("HTTP/2 requested but the 'h2' package is missing; falling back to HTTP/1.1")
+                http2 = False
+            # The pooled client is shared by every request, so it must never keep
+            # Set-Cookie values around; cookies only travel in per-request headers.
+            cookie_jar = CookieJar(policy=DefaultCookiePolicy(allowed_domains=[]))
+            self._client = httpx.AsyncClient(
+                timeout=self.request_timeout,
+                follow_redirects=True,
+                headers={"User-Agent": "PageCopyBot/1.0"},
+                cookies=cookie_jar,
+                limits=self.http_limits,
+                http2=http2,
+            )
+        return self._client
+
+    async def _render_with_browser(
+        self,
+        url: str,
         cookie_header: Optional[str],
     ) -> str:
         if not self.browser_renderer:
             raise SnapshotError("Browser renderer is not configured.")
+        if self.browser_rate_limiter is not None:
+            metrics.add_time("rate_limit_wait", await self.browser_rate_limiter.acquire(url))
         try:
             storage_state = self._resolve_storage_state(url)
             cookies = self._parse_cookie_header(cookie_header, url)
-            rendered_html = await self.browser_renderer.render(
-                url,
-                storage_state=storage_state,
-                cookies=cookies,
-            )
+            with metrics.stage("browser", url=url):
+                rendered_html = await self.browser_renderer.render(
+                    url,
+                    storage_state=storage_state,
+                    cookies=cookies,
+                )
         except BrowserRenderingError as exc:
             raise SnapshotError(str(exc)) from exc
-        comment = self._build_comment(url, captured_at)
-        content = self._sanitize_html(rendered_html, url)
-        return f"{comment}\n{content}"
+        return rendered_html
 
-    async def _write_file(self, path: Path, html: str) -> None:
-        async with aiofiles.open(path, "w", encoding="utf-8") as file:
-            await file.write(html)
-
-    def _build_filename(self, url: str, captured_at: datetime) -> str:
-        digest = hashlib.sha256(f"{url}{captured_at.timestamp()}".encode("utf-8")).hexdigest()[:10]
-        return f"{captured_at.strftime('%Y%m%d%H%M%S')}_{digest}.html"
-
-    def _should_use_browser(self, url: str) -> bool:
-        hostname = urlparse(url).hostname or ""
-        return hostname.lower() in self.js_heavy_hosts
+    async def _should_use_browser(self, url: str) -> bool:
+        hostname = (urlparse(url).hostname or "").lower()
+        if self.render_classifier is not None:
+            return await self.render_classifier.prefers_browser(hostname)
+        return hostname in self.js_heavy_hosts
 
     @staticmethod
     def _build_comment(url: str, captured_at: datetime) -> str:
         return (
             "<!--\n"
             f"Archived from: {url}\n"
-            f"Captured at (UTC): {captured_at.isoformat()}\n"
+            f"First captured at (UTC): {captured_at.isoformat()}\n"
             "Generated by PageCopy Snapshot Service\n"
             "-->"
         )
@@ -206,20 +658,22 @@ class SnapshotService:
             )
         return cookies or None
 
-    def _sanitize_html(self, html: str, url: str) -> str:
-        html_with_base = self._inject_base_tag(html, url)
-        return self._strip_scripts(html_with_base)
 
-    @staticmethod
-    def _inject_base_tag(html: str, url: str) -> str:
-        """Insert a <base> tag so relative assets resolve to the original origin."""
-        base_tag = f'<base href="{url}" />'
-        pattern = re.compile(r"(<head[^>]*>)", re.IGNORECASE)
-        if pattern.search(html):
-            return pattern.sub(rf"\1\n    {base_tag}", html, count=1)
-        return f"<head>{base_tag}</head>\n{html}"
-
-    @staticmethod
-    def _strip_scripts(html: str) -> str:
-        script_re = re.compile(r"<script\b[^>]*>.*?</script>", re.IGNORECASE | re.DOTALL)
-        return script_re.sub("", html)
+def _failure_reason(exc: SnapshotError) -> str:
+    """Coarse, low-cardinality label for the failures counter."""
+    if isinstance(exc, SnapshotUnsupportedError):
+        return "unsupported"
+    if isinstance(exc, _TransientFetchError):
+        return "throttled" if exc.throttled else "transient"
+    cause = exc.__cause__
+    if isinstance(cause, BrowserBusyError):
+        return "browser_busy"
+    if isinstance(cause, BrowserRenderingError):
+        return "browser_error"
+    if isinstance(cause, httpx.HTTPStatusError):
+        return "http_status"
+    if isinstance(cause, httpx.RequestError):
+        return "http_error"
+    if isinstance(cause, (StorageError, OSError)):
+        return "storage"
+    return "error"
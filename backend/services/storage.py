@@ -0,0 +1,275 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import uuid
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import AsyncIterator, Iterable, Optional
+
+import aiofiles  # type: ignore[import-not-found]
+
+try:
+    import boto3  # type: ignore[import-not-found]
+    from boto3.exceptions import S3UploadFailedError  # type: ignore[import-not-found]
+    from boto3.s3.transfer import TransferConfig  # type: ignore[import-not-found]
+    from botocore.config import Config as BotoConfig  # type: ignore[import-not-found]
+    from botocore.exceptions import BotoCoreError, ClientError  # type: ignore[import-not-found]
+except ImportError:  # pragma: no cover - optional dependency
+    boto3 = None
+
+_CHUNK_BYTES = 64 * 1024
+# DeleteObjects accepts at most this many keys per call.
+_S3_DELETE_BATCH = 1000
+
+
+class StorageError(Exception):
+    """Raised when the storage backend cannot complete an operation."""
+
+
+class StorageBackend(ABC):
+    """Where snapshot files live, addressed by slash-separated keys such as ``objects/ab/<digest>.html``."""
+
+    @abstractmethod
+    async def put_file(
+        self,
+        key: str,
+        source: Path,
+        content_type: Optional[str] = None,
+        content_encoding: Optional[str] = None,
+        cache_control: Optional[str] = None,
+    ) -> None:
+        """Store the local file ``source`` under ``key``; the backend may move or consume it."""
+
+    async def put(self, key: str, data: bytes, content_type: Optional[str] = None) -> None:
+        tmp_path = self.scratch_dir / f"{uuid.uuid4().hex}.part"
+        await asyncio.to_thread(tmp_path.write_bytes, data)
+        try:
+            await self.put_file(key, tmp_path, content_type=content_type)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[bytes]:
+        """The object's bytes, or ``None`` if it does not exist."""
+
+    @abstractmethod
+    async def exists(self, key: str) -> bool: ...
+
+    @abstractmethod
+    async def delete(self, keys: Iterable[str]) -> None:
+        """Remove ``keys``; missing keys are ignored."""
+
+    @abstractmethod
+    def stream(self, key: str, start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+        """Yield the object's bytes from ``start`` up to and including ``end``."""
+
+    @property
+    @abstractmethod
+    def scratch_dir(self) -> Path:
+        """Local directory for temporary files before they are stored."""
+
+    def local_path(self, key: str) -> Optional[Path]:
+        """Filesystem path of ``key`` when the backend is a local directory."""
+        return None
+
+    async def url_for(self, key: str) -> Optional[str]:
+        """A time-limited URL clients can fetch ``key`` from directly, if the backend has one."""
+        return None
+
+    async def aclose(self) -> None:
+        return None
+
+
+class LocalStorage(StorageBackend):
+    """Files under ``root``; the default, served by ``SnapshotStaticFiles``."""
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._scratch_dir = root / ".tmp"
+        self._scratch_dir.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def scratch_dir(self) -> Path:
+        return self._scratch_dir
+
+    async def put_file(
+        self,
+        key: str,
+        source: Path,
+        content_type: Optional[str] = None,
+        content_encoding: Optional[str] = None,
+        cache_control: Optional[str] = None,
+    ) -> None:
+        await asyncio.to_thread(self._move_into_place, source, self.root / key)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        try:
+            return await asyncio.to_thread((self.root / key).read_bytes)
+        except FileNotFoundError:
+            return None
+
+    async def exists(self, key: str) -> bool:
+        return await asyncio.to_thread((self.root / key).is_file)
+
+    async def delete(self, keys: Iterable[str]) -> None:
+        paths = [self.root / key for key in keys]
+        await asyncio.to_thread(lambda: [path.unlink(missing_ok=True) for path in paths])
+
+    async def stream(self, key: str, start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+        remaining = None if end is None else end - start + 1
+        async with aiofiles.open(self.root / key, "rb") as handle:
+            await handle.seek(start)
+            while remaining is None or remaining > 0:
+                chunk = await handle.read(_CHUNK_BYTES if remaining is None else min(_CHUNK_BYTES, remaining))
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+    def local_path(self, key: str) -> Optional[Path]:
+        return self.root / key
+
+    @staticmethod
+    def _move_into_place(source: Path, target: Path) -> None:
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(source, target)
+
+
+class S3Storage(StorageBackend):
+    """Objects in an S3-compatible bucket (AWS S3, MinIO, Ceph RGW, ...) via boto3.
+
+    One client, and with it one connection pool, is shared by all requests.
+    Files above ``multipart_threshold`` are uploaded in parallel parts. Calls
+    run in worker threads, since boto3 is synchronous. ``endpoint_url`` points
+    the driver at a local MinIO (or a moto server) for testing.
+    """
+
+    def __init__(
+        self,
+        bucket: str,
+        prefix: str = "",
+        endpoint_url: Optional[str] = None,
+        region: Optional[str] = None,
+        access_key_id: Optional[str] = None,
+        secret_access_key: Optional[str] = None,
+        scratch_dir: Path = Path("./data/snapshots/.tmp"),
+        max_pool_connections: int = 32,
+        multipart_threshold: int = 8 * 1024 * 1024,
+        multipart_chunksize: int = 8 * 1024 * 1024,
+        upload_concurrency: int = 4,
+        presign_expiry: int = 3600,
+    ) -> None:
+        if boto3 is None:
+            raise StorageError("S3 storage needs the 'boto3' package (pip install boto3).")
+        self.bucket = bucket
+        self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+        self.presign_expiry = presign_expiry
+        self._scratch_dir = scratch_dir
+        self._scratch_dir.mkdir(parents=True, exist_ok=True)
+        self._client = boto3.session.Session().client(
+            "s3",
+            endpoint_url=endpoint_url,
+            region_name=region,
+            aws_access_key_id=access_key_id,
+            aws_secret_access_key=secret_access_key,
+            config=BotoConfig(max_pool_connections=max_pool_connections, retries={"mode": "standard"}),
+        )
+        self._transfer = TransferConfig(
+            multipart_threshold=multipart_threshold,
+            multipart_chunksize=multipart_chunksize,
+            max_concurrency=upload_concurrency,
+        )
+
+    @property
+    def scratch_dir(self) -> Path:
+        return self._scratch_dir
+
+    async def put_file(
+        self,
+        key: str,
+        source: Path,
+        content_type: Optional[str] = None,
+        content_encoding: Optional[str] = None,
+        cache_control: Optional[str] = None,
+    ) -> None:
+        extra = {
+            name: value
+            for name, value in (
+                ("ContentType", content_type),
+                ("ContentEncoding", content_encoding),
+                ("CacheControl", cache_control),
+            )
+            if value
+        }
+        await self._call(
+            self._client.upload_file,
+            str(source),
+            self.bucket,
+            self._key(key),
+            ExtraArgs=extra or None,
+            Config=self._transfer,
+        )
+
+    async def get(self, key: str) -> Optional[bytes]:
+        try:
+            response = await self._call(self._client.get_object, Bucket=self.bucket, Key=self._key(key))
+        except FileNotFoundError:
+            return None
+        return await asyncio.to_thread(response["Body"].read)
+
+    async def exists(self, key: str) -> bool:
+        try:
+            await self._call(self._client.head_object, Bucket=self.bucket, Key=self._key(key))
+        except FileNotFoundError:
+            return False
+        return True
+
+    async def delete(self, keys: Iterable[str]) -> None:
+        objects = [{"Key": self._key(key)} for key in keys]
+        for start in range(0, len(objects), _S3_DELETE_BATCH):
+            await self._call(
+                self._client.delete_objects,
+                Bucket=self.bucket,
+                Delete={"Objects": objects[start : start + _S3_DELETE_BATCH], "Quiet": True},
+            )
+
+    async def stream(self, key: str, start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+        params = {"Bucket": self.bucket, "Key": self._key(key)}
+        if start or end is not None:
+            params["Range"] = f"bytes={start}-{'' if end is None else end}"
+        response = await self._call(self._client.get_object, **params)
+        body = response["Body"]
+        try:
+            while chunk := await asyncio.to_thread(body.read, _CHUNK_BYTES):
+                yield chunk
+        finally:
+            body.close()
+
+    async def url_for(self, key: str) -> Optional[str]:
+        return await asyncio.to_thread(
+            self._client.generate_presigned_url,
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": self._key(key)},
+            ExpiresIn=self.presign_expiry,
+        )
+
+    async def aclose(self) -> None:
+        await asyncio.to_thread(self._client.close)
+
+    def _key(self, key: str) -> str:
+        return self.prefix + key
+
+    @staticmethod
+    async def _call(method, *args, **kwargs):
+        try:
+            return await asyncio.to_thread(method, *args, **kwargs)
+        except ClientError as exc:
+            code = exc.response.get("Error", {}).get("Code", "")
+            if code in ("404", "NoSuchKey", "NotFound"):
+                raise FileNotFoundError(kwargs.get("Key", "")) from exc
+            raise StorageError(f"S3 {method.__name__} failed: {code or exc}") from exc
+        except (BotoCoreError, S3UploadFailedError) as exc:
+            raise StorageError(f"S3 {method.__name__} failed: {exc}") from exc
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from backend.core.config import Settings
+from backend.core.sqlite import connect
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS validators (
+    url TEXT NOT NULL,
+    auth TEXT NOT NULL DEFAULT '',
+    etag TEXT,
+    last_modified TEXT,
+    content_hash TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (url, auth)
+);
+"""
+
+
+@dataclass(slots=True)
+class CaptureValidators:
+    etag: Optional[str]
+    last_modified: Optional[str]
+    content_hash: str
+
+    def conditional_headers(self) -> dict[str, str]:
+        headers: dict[str, str] = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class ValidatorStore:
+    """HTTP validators (ETag / Last-Modified) from each URL's last successful capture.
+
+    Entries are keyed on the URL plus a fingerprint of the Cookie header, so a
+    logged-in capture never answers a conditional request for an anonymous one.
+    """
+
+    def __init__(self, db_path: Path) -> None:
+        self._connection = connect(db_path)
+        self._connection.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    async def get(self, url: str, cookie_header: Optional[str]) -> Optional[CaptureValidators]:
+        return await asyncio.to_thread(self._get, url, self._auth_key(cookie_header))
+
+    async def put(self, url: str, cookie_header: Optional[str], validators: CaptureValidators) -> None:
+        await asyncio.to_thread(self._put, url, self._auth_key(cookie_header), validators)
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def _get(self, url: str, auth: str) -> Optional[CaptureValidators]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT etag, last_modified, content_hash FROM validators WHERE url = ? AND auth = ?",
+                (url, auth),
+            ).fetchone()
+        if row is None:
+            return None
+        return CaptureValidators(etag=row["etag"], last_modified=row["last_modified"], content_hash=row["content_hash"])
+
+    def _put(self, url: str, auth: str, validators: CaptureValidators) -> None:
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO validators (url, auth, etag, last_modified, content_hash, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    url,
+                    auth,
+                    validators.etag,
+                    validators.last_modified,
+                    validators.content_hash,
+                    Settings.current_timestamp(),
+                ),
+            )
+
+    @staticmethod
+    def _auth_key(cookie_header: Optional[str]) -> str:
+        if not cookie_header:
+            return ""
+        return hashlib.sha256(cookie_header.encode("utf-8")).hexdigest()[:32]
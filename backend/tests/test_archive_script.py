@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import asyncio
+import gzip
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+
+from backend.scripts import archive
+from backend.services.blob_store import BlobStore
+from backend.services.history_repository import HistoryRepository
+from backend.services.snapshot_service import SnapshotService
+
+_SITEMAP = """<?xml version="1.0" encoding="UTF-8"?>
+<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+  <url><loc>https://a.example/1</loc></url>
+  <url><loc> https://b.example/2 </loc></url>
+</urlset>
+"""
+
+
+class _Origin:
+    def __init__(self) -> None:
+        self.fetched: list[str] = []
+        self.broken = {"/broken"}
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.fetched.append(str(request.url))
+        if request.url.path in self.broken:
+            return httpx.Response(404)
+        return httpx.Response(200, headers={"content-type": "text/html"}, text=f"<p>{request.url}</p>")
+
+
+def _archive(tmp_path: Path, monkeypatch: pytest.MonkeyPatch, origin: _Origin, *argv: str) -> tuple[int, list]:
+    """Run the CLI against a data directory under ``tmp_path``; returns the exit code and the history."""
+    data = tmp_path / "data"
+    blob_store = BlobStore(data / "snapshots", data / "catalog.sqlite3")
+    history = HistoryRepository(data / "history.sqlite3")
+    service = SnapshotService(
+        data / "snapshots",
+        "http://localhost/snapshots",
+        request_timeout=5,
+        blob_store=blob_store,
+    )
+    service._client = httpx.AsyncClient(transport=httpx.MockTransport(origin))
+
+    async def shutdown() -> None:
+        await service.aclose()
+
+    monkeypatch.setattr(archive, "get_snapshot_service", lambda: service)
+    monkeypatch.setattr(archive, "get_history_repository", lambda: history)
+    monkeypatch.setattr(archive, "shutdown_dependencies", shutdown)
+    monkeypatch.setattr(sys, "argv", ["archive", *argv, "--resume-file", str(data / "run.resume"), "--quiet"])
+
+    async def scenario() -> tuple[int, list]:
+        code = await archive.run(archive.parse_args())
+        entries, _ = await history.list_page(100)
+        return code, entries
+
+    try:
+        return asyncio.run(scenario())
+    finally:
+        history.close()
+        blob_store.close()
+
+
+def test_archive_run_then_resume(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    urls = tmp_path / "urls.txt"
+    urls.write_text(
+        "# comment\nhttps://a.example/1\nftp://skip.example/\nhttps://c.example/broken\n\nhttps://a.example/1\n",
+        encoding="utf-8",
+    )
+    sitemap = tmp_path / "sitemap.xml.gz"
+    sitemap.write_bytes(gzip.compress(_SITEMAP.encode()))
+
+    origin = _Origin()
+    code, entries = _archive(tmp_path, monkeypatch, origin, str(urls), str(sitemap))
+    assert code == 1
+    assert sorted(origin.fetched) == ["https://a.example/1", "https://b.example/2", "https://c.example/broken"]
+    assert sorted((entry.original_url, entry.status) for entry in entries) == [
+        ("https://a.example/1", "success"),
+        ("https://b.example/2", "success"),
+        ("https://c.example/broken", "failed"),
+    ]
+    stored = {path.stem for path in (tmp_path / "data" / "snapshots" / "objects").glob("*/*.html")}
+    assert stored == {entry.content_hash for entry in entries if entry.status == "success"}
+
+    # Running the same command again captures nothing.
+    origin = _Origin()
+    code, entries = _archive(tmp_path, monkeypatch, origin, str(urls), str(sitemap))
+    assert (code, origin.fetched, len(entries)) == (0, [], 3)
+
+    # --retry-failed only retries the failure; once it succeeds, the checkpoint remembers that.
+    origin = _Origin()
+    origin.broken = set()
+    code, entries = _archive(tmp_path, monkeypatch, origin, str(urls), str(sitemap), "--retry-failed")
+    assert (code, origin.fetched, len(entries)) == (0, ["https://c.example/broken"], 4)
+    resume = archive.ResumeLog(tmp_path / "data" / "run.resume")
+    assert resume.succeeded == {"https://a.example/1", "https://b.example/2", "https://c.example/broken"}
+    assert resume.failed == set()
+    resume.close()
+
+
+def test_resume_log_ignores_a_truncated_line(tmp_path: Path) -> None:
+    path = tmp_path / "run.resume"
+    path.write_text("success\thttps://a.example/\nfailed\thttps://b.example/\nsucc", encoding="utf-8")
+    resume = archive.ResumeLog(path)
+    assert (resume.succeeded, resume.failed) == ({"https://a.example/"}, {"https://b.example/"})
+    resume.close()
+
+
+def test_sitemap_index_is_followed(tmp_path: Path) -> None:
+    (tmp_path / "pages.xml").write_text(_SITEMAP, encoding="utf-8")
+    index = tmp_path / "index.xml"
+    index.write_text(
+        '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+        f"<sitemap><loc>{tmp_path / 'pages.xml'}</loc></sitemap></sitemapindex>",
+        encoding="utf-8",
+    )
+    urls = asyncio.run(archive.read_sources([str(index)], force_sitemap=False))
+    assert urls == ["https://a.example/1", "https://b.example/2"]
+
+
+def test_stdin_needs_a_resume_file(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(sys, "argv", ["archive", "-"])
+    assert asyncio.run(archive.run(archive.parse_args())) == 2
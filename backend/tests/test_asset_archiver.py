@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import asyncio
+from pathlib import Path
+
+import httpx
+
+from backend.services.asset_archiver import AssetArchiver
+from backend.services.blob_store import BlobStore
+
+_EVIL_TYPE = "image/x</style><script>alert(document.cookie)</script>"
+
+
+def _assets(request: httpx.Request) -> httpx.Response:
+    if request.url.path == "/evil.png":
+        return httpx.Response(200, headers={"content-type": _EVIL_TYPE}, content=b"\x89PNG\r\n\x1a\nxx")
+    return httpx.Response(200, headers={"content-type": "image/png"}, content=b"\x89PNG\r\n\x1a\nok")
+
+
+def _localize(tmp_path: Path, html: str) -> tuple[str, AssetArchiver]:
+    async def scenario() -> tuple[str, AssetArchiver]:
+        store = BlobStore(tmp_path / "snapshots", tmp_path / "catalog.sqlite3")
+        archiver = AssetArchiver(store, "http://localhost/snapshots")
+        async with httpx.AsyncClient(transport=httpx.MockTransport(_assets)) as client:
+            page = await archiver.localize(html, "https://example.com/page", client)
+        store.close()
+        return page.html, archiver
+
+    return asyncio.run(scenario())
+
+
+def test_content_type_cannot_break_out_of_style(tmp_path: Path) -> None:
+    html, _ = _localize(tmp_path, "<style>body{background:url(/evil.png)}</style><p>x</p>")
+    assert "<script" not in html and "</style>" in html
+    # The malformed type is dropped; the URL's extension decides instead.
+    assert 'url("data:image/png;base64,' in html
+
+
+def test_css_urls_are_escaped(tmp_path: Path) -> None:
+    store = BlobStore(tmp_path / "snapshots", tmp_path / "catalog.sqlite3")
+    archiver = AssetArchiver(store, "http://localhost/snapshots")
+    css = archiver._rewrite_css("a{background:url(x.png)}", "https://example.com/", lambda url: 'a"</style><b>\n')
+    assert css == 'a{background:url("a\\22 \\3c /style\\3e \\3c b\\3e \\a ")}'
+    store.close()
+
+
+def test_idle_host_slots_are_dropped(tmp_path: Path) -> None:
+    _, archiver = _localize(tmp_path, '<img src="/a.png"><img src="https://cdn.example/b.png">')
+    assert archiver._host_slots == {} and archiver._host_users == {}
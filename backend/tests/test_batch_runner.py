@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import asyncio
+from pathlib import Path
+
+import httpx
+
+from backend.services.batch_runner import BatchRunner
+from backend.services.blob_store import BlobStore
+from backend.services.snapshot_service import SnapshotService
+from backend.services.storage import LocalStorage, StorageError
+
+
+class _FlakyStorage(LocalStorage):
+    """Refuses to store files that contain ``b"broken"``."""
+
+    async def put_file(self, key: str, source: Path, **kwargs) -> None:
+        if b"broken" in source.read_bytes():
+            raise StorageError("bucket unavailable")
+        await super().put_file(key, source, **kwargs)
+
+
+def _page(request: httpx.Request) -> httpx.Response:
+    return httpx.Response(200, headers={"content-type": "text/html"}, text=f"<p>{request.url.path}</p>")
+
+
+def test_storage_failure_fails_only_that_url(tmp_path: Path) -> None:
+    async def scenario() -> None:
+        storage = _FlakyStorage(tmp_path / "snapshots")
+        blob_store = BlobStore(tmp_path / "snapshots", tmp_path / "catalog.sqlite3", storage=storage)
+        service = SnapshotService(
+            tmp_path / "snapshots",
+            "http://localhost/snapshots",
+            request_timeout=5,
+            blob_store=blob_store,
+        )
+        service._client = httpx.AsyncClient(transport=httpx.MockTransport(_page))
+        outcomes = await BatchRunner(service).run(["https://a.example/ok", "https://b.example/broken"])
+        await service.aclose()
+        blob_store.close()
+
+        assert [outcome.status for outcome in outcomes] == ["success", "failed"]
+        assert outcomes[1].error == "Storage error: bucket unavailable"
+
+    asyncio.run(scenario())
+
+
+def test_stopping_the_stream_releases_unyielded_captures(tmp_path: Path) -> None:
+    async def scenario() -> None:
+        blob_store = BlobStore(tmp_path / "snapshots", tmp_path / "catalog.sqlite3")
+        service = SnapshotService(
+            tmp_path / "snapshots",
+            "http://localhost/snapshots",
+            request_timeout=5,
+            blob_store=blob_store,
+        )
+        service._client = httpx.AsyncClient(transport=httpx.MockTransport(_page))
+        urls = [f"https://host{index}.example/page{index}" for index in range(4)]
+        stream = BatchRunner(service).iter_completed(urls)
+        _, first = await stream.__anext__()
+        # Let the other captures finish while the consumer is still busy, then disconnect.
+        await asyncio.sleep(0.2)
+        await stream.aclose()
+        await service.aclose()
+
+        rows = blob_store._connection.execute("SELECT digest, refcount FROM blobs").fetchall()
+        assert [(row["digest"], row["refcount"]) for row in rows] == [(first.metadata.content_hash, 1)]
+        blob_store.close()
+
+    asyncio.run(scenario())
+
+
+def test_idle_host_slots_are_dropped(tmp_path: Path) -> None:
+    async def scenario() -> BatchRunner:
+        blob_store = BlobStore(tmp_path / "snapshots", tmp_path / "catalog.sqlite3")
+        service = SnapshotService(
+            tmp_path / "snapshots",
+            "http://localhost/snapshots",
+            request_timeout=5,
+            blob_store=blob_store,
+        )
+        service._client = httpx.AsyncClient(transport=httpx.MockTransport(_page))
+        runner = BatchRunner(service, per_host_concurrency=1)
+        outcomes = await runner.run([f"https://host{index % 3}.example/{index}" for index in range(9)])
+        await service.aclose()
+        blob_store.close()
+        assert [outcome.status for outcome in outcomes] == ["success"] * 9
+        return runner
+
+    runner = asyncio.run(scenario())
+    assert runner._host_slots == {} and runner._host_users == {}
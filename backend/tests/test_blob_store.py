@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import asyncio
+from pathlib import Path
+
+from backend.services.blob_store import BlobStore
+
+
+def _store(tmp_path: Path) -> BlobStore:
+    return BlobStore(tmp_path / "snapshots", tmp_path / "catalog.sqlite3")
+
+
+def test_put_deduplicates_and_counts_references(tmp_path: Path) -> None:
+    async def scenario() -> None:
+        store = _store(tmp_path)
+        document = b"<p>same</p>"
+        digest = store.digest_of(document)
+        first = await store.put(digest, document)
+        second = await store.put(digest, document)
+        assert first.created and not second.created
+        assert first.relative_path == second.relative_path == f"objects/{digest[:2]}/{digest}.html"
+        assert first.path is not None and first.path.read_bytes() == document
+
+        assert await store.release([digest]) == 0
+        assert first.path.exists()
+        assert await store.release([digest]) == 1
+        assert not first.path.exists()
+        assert await store.lookup(digest) is None
+        store.close()
+
+    asyncio.run(scenario())
+
+
+def test_acquire_takes_a_reference_on_live_blobs_only(tmp_path: Path) -> None:
+    async def scenario() -> None:
+        store = _store(tmp_path)
+        ref = await store.put(store.digest_of(b"x"), b"x")
+        assert await store.acquire("0" * 64) is None
+        acquired = await store.acquire(ref.digest)
+        assert acquired is not None and not acquired.created
+        assert await store.release([ref.digest]) == 0
+        assert await store.release([ref.digest]) == 1
+        assert await store.acquire(ref.digest) is None
+        store.close()
+
+    asyncio.run(scenario())
+
+
+def test_release_cascades_to_linked_assets(tmp_path: Path) -> None:
+    async def scenario() -> None:
+        store = _store(tmp_path)
+        asset = await store.put_asset(b"body{}", ".css")
+        shared = await store.put_asset(b"\x89PNG", ".png")
+        page = await store.put(store.digest_of(b"<p>page</p>"), b"<p>page</p>")
+        # The page now holds the only reference on the stylesheet, which holds one on the image.
+        await store.link(page.digest, [asset.digest])
+        await store.link(asset.digest, [shared.digest])
+        assert await store.release([asset.digest, shared.digest]) == 0
+        assert (await store.lookup(page.digest)).children == [asset.digest]
+
+        assert await store.release([page.digest]) == 3
+        for ref in (page, asset, shared):
+            assert not ref.path.exists()
+        store.close()
+
+    asyncio.run(scenario())
+
+
+def test_writer_streams_into_the_store(tmp_path: Path) -> None:
+    async def scenario() -> None:
+        store = _store(tmp_path)
+        async with store.writer(header=b"<!-- captured -->\n") as writer:
+            await writer.write(b"<p>a</p>")
+            await writer.write(b"<p>b</p>")
+            ref = await writer.commit()
+        assert ref.digest == store.digest_of(b"<p>a</p><p>b</p>")
+        assert ref.path.read_bytes() == b"<!-- captured -->\n<p>a</p><p>b</p>"
+        assert not list(store.tmp_dir.glob("*.part"))
+        store.close()
+
+    asyncio.run(scenario())
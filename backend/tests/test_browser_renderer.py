@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from backend.services import browser_renderer
+from backend.services.browser_renderer import BrowserBusyError, BrowserRenderer
+
+
+def test_idle_host_slots_are_dropped(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(browser_renderer, "async_playwright", object())
+
+    async def scenario() -> None:
+        renderer = BrowserRenderer(max_concurrency=4, per_host_limit=1, queue_timeout=0.05)
+        gate = asyncio.Event()
+
+        async def fake_render(url, storage_state, cookies) -> str:
+            await gate.wait()
+            return url
+
+        renderer._render_with_retry = fake_render
+        first = asyncio.create_task(renderer.render("https://a.example/1"))
+        second = asyncio.create_task(renderer.render("https://a.example/2"))
+        other = asyncio.create_task(renderer.render("https://b.example/"))
+        await asyncio.sleep(0)
+        assert set(renderer._host_slots) == {"a.example", "b.example"}
+        # The second render times out waiting behind the first one; the host slot stays in use.
+        with pytest.raises(BrowserBusyError):
+            await second
+        assert set(renderer._host_slots) == {"a.example", "b.example"}
+
+        gate.set()
+        assert await asyncio.gather(first, other) == ["https://a.example/1", "https://b.example/"]
+        assert renderer._host_slots == {} and renderer._host_users == {}
+
+        # A fresh slot is created on the next render for the host.
+        assert await renderer.render("https://a.example/3") == "https://a.example/3"
+        assert renderer._host_slots == {}
+
+    asyncio.run(scenario())
@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timezone
+from pathlib import Path
+
+from backend.services.blob_store import BlobStore
+from backend.services.capture_cache import CaptureCache, normalize_url
+from backend.services.snapshot_service import SnapshotMetadata
+
+
+def _refcount(store: BlobStore, digest: str) -> int:
+    row = store._connection.execute("SELECT refcount FROM blobs WHERE digest = ?", (digest,)).fetchone()
+    return row["refcount"] if row else 0
+
+
+def _capturer(store: BlobStore, gate: asyncio.Event):
+    calls = []
+
+    async def capture() -> SnapshotMetadata:
+        calls.append(1)
+        await gate.wait()
+        ref = await store.put(store.digest_of(b"<p>x</p>"), b"<p>x</p>")
+        return SnapshotMetadata(
+            original_url="https://example.com/",
+            archived_path=ref.path,
+            archived_url=f"http://localhost/snapshots/{ref.relative_path}",
+            relative_url=f"/snapshots/{ref.relative_path}",
+            captured_at=datetime.now(timezone.utc),
+            content_hash=ref.digest,
+        )
+
+    return capture, calls
+
+
+def test_joined_callers_each_hold_a_reference_when_they_get_the_result(tmp_path: Path) -> None:
+    async def scenario() -> None:
+        store = BlobStore(tmp_path / "snapshots", tmp_path / "catalog.sqlite3")
+        cache = CaptureCache(store)
+        gate = asyncio.Event()
+        capture, calls = _capturer(store, gate)
+        key = CaptureCache.key("https://example.com/", None, False)
+        callers = [asyncio.create_task(cache.get_or_capture(key, capture)) for _ in range(3)]
+        await asyncio.sleep(0)
+        gate.set()
+        results = await asyncio.gather(*callers)
+        # No background task left to run: the references are already there.
+        assert _refcount(store, results[0].content_hash) == 3
+        assert calls == [1]
+        assert [result.reused for result in results] == [False, True, True]
+        assert cache.in_flight == 0
+        store.close()
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_callers_give_their_reference_back(tmp_path: Path) -> None:
+    async def scenario() -> None:
+        store = BlobStore(tmp_path / "snapshots", tmp_path / "catalog.sqlite3")
+        cache = CaptureCache(store)
+        gate = asyncio.Event()
+        capture, _ = _capturer(store, gate)
+        key = CaptureCache.key("https://example.com/", None, False)
+        leader = asyncio.create_task(cache.get_or_capture(key, capture))
+        follower = asyncio.create_task(cache.get_or_capture(key, capture))
+        await asyncio.sleep(0)
+        leader.cancel()
+        gate.set()
+        result = await follower
+        assert _refcount(store, result.content_hash) == 1
+
+        # With every caller gone, the capture's own reference is dropped too.
+        gate.clear()
+        other = CaptureCache.key("https://example.com/other", None, False)
+        lone = asyncio.create_task(cache.get_or_capture(other, capture))
+        await asyncio.sleep(0)
+        flight = cache._flights[other].task
+        lone.cancel()
+        gate.set()
+        await asyncio.wait([flight])
+        assert _refcount(store, result.content_hash) == 1
+        store.close()
+
+    asyncio.run(scenario())
+
+
+def test_normalize_url() -> None:
+    assert normalize_url("HTTPS://Ex.COM:443?a=1#x") == "https://ex.com/?a=1"
+    assert normalize_url("http://u:p@h:8080/p") == "http://u:p@h:8080/p"
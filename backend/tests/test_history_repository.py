@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from pathlib import Path
+from typing import List, Optional
+
+import pytest
+
+from backend.services.history_repository import HistoryEntry, HistoryQuery, HistoryRepository
+
+
+def _entry(index: int, url: str, status: str = "success") -> HistoryEntry:
+    return HistoryEntry(
+        id=f"id-{index:03d}",
+        original_url=url,
+        archived_url=None,
+        archived_relative_url=None,
+        status=status,
+        error=None,
+        captured_at=f"2024-01-01T00:{index // 60:02d}:{index % 60:02d}Z",
+    )
+
+
+def _pages(repository: HistoryRepository, limit: int, **filters) -> List[List[str]]:
+    async def collect() -> List[List[str]]:
+        pages: List[List[str]] = []
+        cursor: Optional[int] = None
+        while True:
+            entries, cursor = await repository.list_page(limit, cursor=cursor, **filters)
+            pages.append([entry.id for entry in entries])
+            if cursor is None:
+                return pages
+
+    return asyncio.run(collect())
+
+
+def _repository(tmp_path: Path) -> HistoryRepository:
+    repository = HistoryRepository(tmp_path / "history.sqlite3")
+    entries = [
+        _entry(
+            index,
+            f"https://{'a' if index % 2 else 'b'}.example.com/{index}",
+            "failed" if index % 3 == 0 else "success",
+        )
+        for index in range(25)
+    ]
+    asyncio.run(repository.append(entries))
+    return repository
+
+
+def test_pages_are_newest_first_without_gaps(tmp_path: Path) -> None:
+    repository = _repository(tmp_path)
+    pages = _pages(repository, 10)
+    assert [len(page) for page in pages] == [10, 10, 5]
+    assert [item for page in pages for item in page] == [f"id-{index:03d}" for index in reversed(range(25))]
+    repository.close()
+
+
+def test_exact_multiple_ends_without_an_empty_page(tmp_path: Path) -> None:
+    repository = _repository(tmp_path)
+    assert [len(page) for page in _pages(repository, 5)] == [5, 5, 5, 5, 5]
+    repository.close()
+
+
+def test_filters_apply_across_pages(tmp_path: Path) -> None:
+    repository = _repository(tmp_path)
+    failed = [item for page in _pages(repository, 3, status="failed") for item in page]
+    assert failed == [f"id-{index:03d}" for index in reversed(range(0, 25, 3))]
+
+    hosts = [item for page in _pages(repository, 4, host="A.example.com") for item in page]
+    assert hosts == [f"id-{index:03d}" for index in reversed(range(1, 25, 2))]
+
+    prefixed = [item for page in _pages(repository, 2, url_prefix="https://b.example.com/1") for item in page]
+    assert prefixed == ["id-018", "id-016", "id-014", "id-012", "id-010"]
+
+    window = _pages(
+        repository,
+        4,
+        captured_from="2024-01-01T00:00:05Z",
+        captured_to="2024-01-01T00:00:15Z",
+    )
+    assert [item for page in window for item in page] == [f"id-{index:03d}" for index in reversed(range(5, 15))]
+    repository.close()
+
+
+def test_append_ignores_duplicate_ids(tmp_path: Path) -> None:
+    repository = _repository(tmp_path)
+    asyncio.run(repository.append([_entry(3, "https://changed.example.com/")]))
+    entries, _ = asyncio.run(repository.list_page(100))
+    assert len(entries) == 25
+    assert next(entry for entry in entries if entry.id == "id-003").original_url == "https://a.example.com/3"
+    repository.close()
+
+
+@pytest.mark.parametrize(
+    ("query", "expected"),
+    [
+        (HistoryQuery(cursor=10), "INTEGER PRIMARY KEY (rowid<?)"),
+        (HistoryQuery(cursor=10, url_prefix="https://a."), "history_original_url_seq"),
+        (
+            HistoryQuery(cursor=10, captured_from="2024-01-01T00:00:05Z", captured_to="2024-01-01T00:00:15Z"),
+            "history_captured_at_seq",
+        ),
+        (HistoryQuery(cursor=10, host="a.example.com", url_prefix="https://a."), "history_host_seq (host=? AND seq<?)"),
+        (HistoryQuery(cursor=10, status="failed", captured_from="2024"), "history_status_seq (status=? AND seq<?)"),
+    ],
+)
+def test_page_queries_read_the_matching_index(tmp_path: Path, query: HistoryQuery, expected: str) -> None:
+    repository = HistoryRepository(tmp_path / "history.sqlite3")
+    sql, params = repository._page_query(10, query)
+    plan = " | ".join(row["detail"] for row in repository._connection.execute(f"EXPLAIN QUERY PLAN {sql}", params))
+    assert expected in plan
+    repository.close()
+
+
+def test_import_skips_lines_without_an_original_url(tmp_path: Path) -> None:
+    legacy = tmp_path / "history.jsonl"
+    lines = [
+        json.dumps({"id": "ok-1", "original_url": "https://a.example.com/", "status": "success"}),
+        json.dumps({"id": "no-url", "status": "failed"}),
+        json.dumps({"id": "null-url", "original_url": None}),
+        json.dumps(["not", "an", "object"]),
+        "{broken",
+        json.dumps({"id": "ok-2", "original_url": "https://b.example.com/"}),
+    ]
+    legacy.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    repository = HistoryRepository(tmp_path / "history.sqlite3", legacy_file=legacy)
+    entries, _ = asyncio.run(repository.list_page(10))
+    assert [entry.id for entry in entries] == ["ok-2", "ok-1"]
+    repository.close()
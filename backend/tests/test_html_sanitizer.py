@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import time
+
+import pytest
+
+from backend.services.html_sanitizer import StreamingSanitizer, iter_tags, parse_attributes, sanitize_html
+
+BASE = "https://example.com/a/"
+
+
+def _body(html: str) -> str:
+    return sanitize_html(html, BASE).replace(f'<head><base href="{BASE}" /></head>\n', "", 1)
+
+
+def _chunked(html: str, size: int) -> str:
+    sanitizer = StreamingSanitizer(BASE)
+    out = [sanitizer.feed(html[start : start + size]) for start in range(0, len(html), size)]
+    return "".join(out) + sanitizer.close()
+
+
+@pytest.mark.parametrize(
+    ("html", "expected"),
+    [
+        ("<p>hi</p><script>alert(1)</script><p>after</p>", "<p>hi</p><p>after</p>"),
+        ("<SCRIPT type=x>alert(1)</SCRIPT >ok", "ok"),
+        ("<scr<script>ipt>alert(1)</script>", "&lt;scr"),
+        ("<noscript><img src=a.png></noscript>", "<img src=a.png>"),
+        ('<div onclick="x()" class=c>x</div>', "<div class=c>x</div>"),
+        ("<div/onclick=alert(1)>x</div>", "<div>x</div>"),
+        ("<div\nONLOAD=alert(1)>x</div>", "<div>x</div>"),
+        ('<iframe srcdoc="<script>alert(1)</script>"></iframe>', "<iframe></iframe>"),
+        ('<a href="javascript:alert(1)">x</a>', "<a>x</a>"),
+        ('<a href=" \x01JaVa\nScRiPt:alert(1)">x</a>', "<a>x</a>"),
+        ('<a href="java&#x09;script:alert(1)">x</a>', "<a>x</a>"),
+        ('<a href="jav&Tab;ascript&colon;alert(1)">x</a>', "<a>x</a>"),
+        ("<form action=vbscript:x><button formaction='javascript:x'>", "<form><button>"),
+        (
+            '<svg><animate attributeName=href values="x;javascript:alert(1)"/></svg>',
+            "<svg><animate attributeName=href /></svg>",
+        ),
+        ('<svg><set attributeName=href to="javascript:alert(1)"/></svg>', "<svg><set attributeName=href /></svg>"),
+        ("<img alt=a\"b onerror=alert(1)>", "<img alt=a\"b>"),
+        ("<!--><img src=x onerror=alert(1)>", "<!--><img src=x>"),
+        ("<!---><img src=x onerror=alert(1)>", "<!---><img src=x>"),
+        ("<!-- a --!><img src=x onerror=alert(1)>", "<!-- a --!><img src=x>"),
+        ('<p title="<!--"><img src=x onerror=alert(1)>-->', '<p title="<!--"><img src=x>-->'),
+        ("</p <!-- ><img src=x onerror=alert(1)>-->", "</p <!-- ><img src=x>-->"),
+        ("</ <!-- ><img src=x onerror=alert(1)>-->", "</ <!-- ><img src=x>-->"),
+        (
+            "<svg><style><img src=x onerror=alert(1)></style></svg>",
+            "<svg><style>&lt;img src=x onerror=alert(1)></style></svg>",
+        ),
+        ("<textarea><script>x</script></textarea>", "<textarea>&lt;script>x&lt;/script></textarea>"),
+        ('<a"x <!-- ><img src=x onerror=alert(1)>-->', '&lt;a"x <!-- ><img src=x onerror=alert(1)>-->'),
+    ],
+)
+def test_removes_script_vectors(html: str, expected: str) -> None:
+    assert _body(html) == expected
+
+
+def test_keeps_safe_markup_as_is() -> None:
+    html = '<p class="a" data-x=\'1\'>3 < 4 &amp; <a href="https://e.com/?a=1&b=2">x</a><a href="data:,x">y</a></p>'
+    assert _body(html) == html
+
+
+def test_injects_base_into_head() -> None:
+    out = sanitize_html("<html><HEAD lang=en><title>t</title></head><body>x</body></html>", BASE)
+    assert out.startswith('<html><HEAD lang=en>\n    <base href="https://example.com/a/" /><title>t</title>')
+    assert sanitize_html("plain", BASE) == '<head><base href="https://example.com/a/" /></head>\nplain'
+
+
+def test_counts_dropped_script() -> None:
+    sanitizer = StreamingSanitizer(BASE)
+    sanitizer.feed("<script>12345</script>")
+    sanitizer.close()
+    assert sanitizer.dropped_script_chars == 5
+
+
+SAMPLES = [
+    "<!DOCTYPE html><html><head><title>a<b</title></head><body><p onclick=x>hi</p><script>s()</script>"
+    "<noscript><img src=n.png></noscript><a href='javascript:x'>l</a><!-- c --><style>p>a{}</style>x</body>",
+    '\t <p title="<b>">x</p></p <!-- ><svg><style><a></style></svg><textarea><!--</textarea>',
+    "<a x=<a x=<a x='<a x=\"<!--<!-->--!><?php x ?><![CDATA[ ]]></ x><div\"a>3 < 4</a",
+]
+
+
+@pytest.mark.parametrize("html", SAMPLES)
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64])
+def test_output_does_not_depend_on_chunking(html: str, size: int) -> None:
+    assert _chunked(html, size) == sanitize_html(html, BASE)
+
+
+@pytest.mark.parametrize(
+    "html",
+    [
+        "<div" + "a" * 50000,
+        "<div " + "a " * 25000,
+        "<div a" + "=" * 50000,
+        "<a x=" * 10000,
+        "<a =" * 10000 + "'>",
+        "<p title=\"" + "<a " * 15000 + '">',
+        "<" * 50000,
+        "<!--" + "-" * 50000,
+        "</a" + "b" * 50000,
+        '<a href="' + "java\tscript" * 5000,
+    ],
+)
+def test_pathological_input_is_linear(html: str) -> None:
+    started = time.perf_counter()
+    sanitize_html(html, BASE)
+    _chunked(html, 4096)
+    # Quadratic behaviour takes tens of seconds here.
+    assert time.perf_counter() - started < 2
+
+
+def test_iter_tags_skips_comments_and_raw_text() -> None:
+    html = '<P class=a><!-- <img src=c> --><style>a<b{}</style ><title>x</title><a title="<b>" href=/x></a'
+    tags = list(iter_tags(html))
+    assert [(tag.name, tag.is_end) for tag in tags] == [
+        ("P", False),
+        ("style", False),
+        ("style", True),
+        ("title", False),
+        ("title", True),
+        ("a", False),
+    ]
+    style = tags[1]
+    assert html[style.end : style.content_end] == "a<b{}"
+    assert html[tags[-1].start : tags[-1].end] == '<a title="<b>" href=/x>'
+
+
+def test_parse_attributes() -> None:
+    attrs = parse_attributes(" Href='/a?b=1&amp;c=2' hidden data-x = \"y\" /")
+    assert [(attr.name, attr.raw_value, attr.value) for attr in attrs] == [
+        ("Href", "'/a?b=1&amp;c=2'", "/a?b=1&c=2"),
+        ("hidden", None, ""),
+        ("data-x", '"y"', "y"),
+    ]
+    assert attrs[2].text == 'data-x = "y"'
@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from pathlib import Path
+
+from backend.core.config import Settings
+from backend.services.batch_runner import CaptureOutcome
+from backend.services.history_repository import HistoryRepository
+from backend.services.job_queue import JobQueue, JobWorkerPool
+
+
+def test_claims_are_fifo_and_exclusive(tmp_path: Path) -> None:
+    async def scenario() -> None:
+        queue = JobQueue(tmp_path / "jobs.sqlite3")
+        jobs = await queue.enqueue(["https://a.example/", "https://b.example/"])
+        first = await queue.claim("w1")
+        second = await queue.claim("w2")
+        assert [first.id, second.id] == [job.id for job in jobs]
+        assert (first.status, first.attempts) == ("running", 1)
+        assert await queue.claim("w3") is None
+        assert await queue.depth() == 0
+        queue.close()
+
+    asyncio.run(scenario())
+
+
+def test_expired_lease_is_claimed_again(tmp_path: Path) -> None:
+    async def scenario() -> None:
+        queue = JobQueue(tmp_path / "jobs.sqlite3", lease_seconds=0.05, max_attempts=2)
+        [job] = await queue.enqueue(["https://a.example/"])
+        assert (await queue.claim("w1")).id == job.id
+        assert await queue.claim("w2") is None
+        await asyncio.sleep(0.1)
+        retried = await queue.claim("w2")
+        assert (retried.id, retried.attempts) == (job.id, 2)
+        # The stale worker cannot renew a lease that has moved on.
+        assert not await queue.renew(job.id, "w1")
+        assert await queue.renew(job.id, "w2")
+
+        await asyncio.sleep(0.1)
+        assert await queue.claim("w3") is None
+        abandoned = await queue.get(job.id)
+        assert (abandoned.status, abandoned.error) == ("failed", "Job abandoned after repeated worker failures.")
+        queue.close()
+
+    asyncio.run(scenario())
+
+
+def test_release_requeues_without_spending_an_attempt(tmp_path: Path) -> None:
+    async def scenario() -> None:
+        queue = JobQueue(tmp_path / "jobs.sqlite3")
+        [job] = await queue.enqueue(["https://a.example/"], cookie_header="session=1")
+        await queue.claim("w1")
+        await queue.release(job.id)
+        requeued = await queue.get(job.id)
+        assert (requeued.status, requeued.attempts) == ("queued", 0)
+
+        claimed = await queue.claim("w2")
+        assert claimed.attempts == 1
+        await queue.complete(job.id, None, None, "boom")
+        finished = await queue.get(job.id)
+        assert (finished.status, finished.error, finished.cookie_header) == ("failed", "boom", None)
+        # Completed jobs are not handed back by a late release.
+        await queue.release(job.id)
+        assert (await queue.get(job.id)).status == "failed"
+        queue.close()
+
+    asyncio.run(scenario())
+
+
+class _SlowRunner:
+    """Stands in for a capture stuck waiting for a browser slot longer than the lease."""
+
+    def __init__(self, seconds: float) -> None:
+        self.seconds = seconds
+        self.calls = 0
+
+    async def capture(self, url: str, **_: object) -> CaptureOutcome:
+        self.calls += 1
+        await asyncio.sleep(self.seconds)
+        return CaptureOutcome(original_url=url, captured_at=Settings.current_timestamp(), error="done")
+
+
+def test_running_job_keeps_its_lease(tmp_path: Path) -> None:
+    async def scenario() -> None:
+        queue = JobQueue(tmp_path / "jobs.sqlite3", lease_seconds=0.15)
+        history = HistoryRepository(tmp_path / "history.sqlite3")
+        runner = _SlowRunner(0.6)
+        pool = JobWorkerPool(queue, runner, history, concurrency=1, poll_interval=0.01)
+        [job] = await queue.enqueue(["https://a.example/"])
+        pool.start()
+        while (await queue.get(job.id)).status == "queued":
+            await asyncio.sleep(0.01)
+        deadline = time.monotonic() + 0.5
+        while time.monotonic() < deadline:
+            assert await queue.claim("intruder") is None
+            await asyncio.sleep(0.03)
+        while (await queue.get(job.id)).status == "running":
+            await asyncio.sleep(0.02)
+        await pool.stop()
+
+        finished = await queue.get(job.id)
+        assert (finished.status, finished.attempts, runner.calls) == ("failed", 1, 1)
+        queue.close()
+        history.close()
+
+    asyncio.run(scenario())
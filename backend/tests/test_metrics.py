@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from backend.routers import metrics as metrics_router
+from backend.services.metrics import Counter, Histogram, MetricsRegistry, _Metric
+
+
+def test_metric_base_requires_samples() -> None:
+    with pytest.raises(TypeError):
+        _Metric("pagecopy_test", "Abstract.")  # type: ignore[abstract]
+
+
+def test_counter_exposition() -> None:
+    registry = MetricsRegistry()
+    counter = registry.counter("pagecopy_test_total", "Things counted.", ["kind"])
+    counter.inc(kind="b")
+    counter.inc(2, kind="a")
+    counter.inc(0.5, kind="a")
+
+    assert asyncio.run(registry.render()) == (
+        "# HELP pagecopy_test_total Things counted.\n"
+        "# TYPE pagecopy_test_total counter\n"
+        'pagecopy_test_total{kind="a"} 2.5\n'
+        'pagecopy_test_total{kind="b"} 1\n'
+    )
+
+
+def test_counter_rejects_wrong_labels() -> None:
+    counter = Counter("pagecopy_test_total", "Things counted.", ["kind"])
+    with pytest.raises(ValueError):
+        counter.inc(other="x")
+
+
+def test_histogram_buckets_are_cumulative() -> None:
+    histogram = Histogram("pagecopy_test_seconds", "Durations.", buckets=(1.0, 0.1))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value)
+
+    assert histogram.samples() == [
+        'pagecopy_test_seconds_bucket{le="0.1"} 2',
+        'pagecopy_test_seconds_bucket{le="1"} 3',
+        'pagecopy_test_seconds_bucket{le="+Inf"} 4',
+        "pagecopy_test_seconds_sum 3.65",
+        "pagecopy_test_seconds_count 4",
+    ]
+
+
+def test_label_values_are_escaped() -> None:
+    counter = Counter("pagecopy_test_total", "Things counted.", ["reason"])
+    counter.inc(reason='bad "quote"\\path\nnext')
+    assert counter.samples() == ['pagecopy_test_total{reason="bad \\"quote\\"\\\\path\\nnext"} 1']
+
+
+def test_gauges_are_read_at_scrape_time() -> None:
+    registry = MetricsRegistry()
+    depth = [3]
+
+    async def read() -> float:
+        return depth[0]
+
+    registry.gauge("pagecopy_test_depth", "Queue depth.", read)
+    first = asyncio.run(registry.render())
+    depth[0] = 7
+    second = asyncio.run(registry.render())
+    assert first.endswith("pagecopy_test_depth 3\n") and second.endswith("pagecopy_test_depth 7\n")
+
+
+class _Renderer:
+    def occupancy(self) -> dict[str, int]:
+        return {"active": 1, "capacity": 4, "waiting": 2}
+
+
+class _Queue:
+    async def depth(self) -> int:
+        return 5
+
+
+class _Cache:
+    in_flight = 0
+
+
+def test_metrics_route(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(metrics_router, "get_browser_renderer", _Renderer)
+    monkeypatch.setattr(metrics_router, "get_job_queue", _Queue)
+    monkeypatch.setattr(metrics_router, "get_capture_cache", _Cache)
+    app = FastAPI()
+    app.include_router(metrics_router.router, prefix="/api")
+
+    async def scenario() -> httpx.Response:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get("/api/metrics")
+
+    response = asyncio.run(scenario())
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "text/plain; version=0.0.4; charset=utf-8"
+    body = response.text
+    assert "# TYPE pagecopy_captures_total counter\n" in body
+    assert "# TYPE pagecopy_capture_seconds histogram\n" in body
+    assert "pagecopy_render_pool_active 1\n" in body
+    assert "pagecopy_render_pool_waiting 2\n" in body
+    assert "pagecopy_job_queue_depth 5\n" in body
+    assert "pagecopy_captures_in_flight 0\n" in body
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import asyncio
+import time
+
+from backend.services.rate_limiter import HostRateLimiter, TokenBucket, parse_retry_after
+
+
+def test_burst_is_free_then_paced_by_rate() -> None:
+    async def scenario() -> list[float]:
+        bucket = TokenBucket(rate=20, burst=2)
+        return [await bucket.acquire() for _ in range(4)]
+
+    waits = asyncio.run(scenario())
+    assert waits[:2] == [0.0, 0.0]
+    assert all(0.03 <= wait <= 0.2 for wait in waits[2:])
+
+
+def test_waiters_are_served_in_order() -> None:
+    async def scenario() -> list[int]:
+        bucket = TokenBucket(rate=50, burst=1)
+        served: list[int] = []
+
+        async def take(index: int) -> None:
+            await bucket.acquire()
+            served.append(index)
+
+        await asyncio.gather(*(take(index) for index in range(5)))
+        return served
+
+    assert asyncio.run(scenario()) == [0, 1, 2, 3, 4]
+
+
+def test_block_for_holds_back_tokens() -> None:
+    async def scenario() -> float:
+        bucket = TokenBucket(rate=100, burst=5)
+        bucket.block_for(0.1)
+        started = time.monotonic()
+        await bucket.acquire()
+        return time.monotonic() - started
+
+    assert asyncio.run(scenario()) >= 0.09
+
+
+def test_idle_only_when_full_and_unblocked() -> None:
+    bucket = TokenBucket(rate=1, burst=1)
+    assert bucket.idle
+    asyncio.run(bucket.acquire())
+    assert not bucket.idle
+    full = TokenBucket(rate=1, burst=1)
+    full.block_for(60)
+    assert not full.idle
+
+
+def test_host_rates_match_subdomains() -> None:
+    limiter = HostRateLimiter(rate=2, host_rates={"Example.com": 0, "api.example.com": 5})
+    assert limiter.rate_for("example.com") == 0
+    assert limiter.rate_for("www.example.com") == 0
+    assert limiter.rate_for("v1.api.example.com") == 5
+    assert limiter.rate_for("example.org") == 2
+
+
+def test_parse_retry_after() -> None:
+    assert parse_retry_after("120") == 120.0
+    assert parse_retry_after(" 0 ") == 0.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after(None) is None
+
+
+def test_unthrottled_bucket_still_honours_block() -> None:
+    async def scenario() -> tuple[float, float]:
+        bucket = TokenBucket(rate=0, burst=1)
+        assert await bucket.acquire() == 0.0
+        bucket.block_for(0.1)
+        started = time.monotonic()
+        await bucket.acquire()
+        blocked = time.monotonic() - started
+        return blocked, await bucket.acquire()
+
+    blocked, after = asyncio.run(scenario())
+    assert blocked >= 0.09
+    assert after == 0.0
+
+
+def test_limiter_block_applies_to_unthrottled_hosts() -> None:
+    async def scenario() -> float:
+        limiter = HostRateLimiter(rate=0)
+        limiter.block("https://example.com/a", 0.1)
+        return await limiter.acquire("https://example.com/b")
+
+    assert asyncio.run(scenario()) >= 0.09
@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import asyncio
+from pathlib import Path
+from typing import Optional
+
+import httpx
+import pytest
+
+from backend.services.blob_store import BlobStore
+from backend.services.browser_renderer import BrowserBusyError
+from backend.services.render_classifier import PageStats, RenderClassifier
+from backend.services.snapshot_service import SnapshotService
+
+_SHELL = '<html><body><div id="root"></div></body></html>'
+_ARTICLE = "<html><body><p>" + "rendered words " * 100 + "</p></body></html>"
+
+
+def _stats(html: str, script_chars: int = 0) -> PageStats:
+    stats = PageStats()
+    stats.feed(html)
+    stats.script_chars = script_chars
+    return stats
+
+
+@pytest.mark.parametrize(
+    ("html", "script_chars", "needs_browser", "reason"),
+    [
+        ("<p>" + "word " * 200 + "</p>", 0, False, "text"),
+        (_SHELL, 0, True, "spa_marker"),
+        ("<p>" + "word " * 40 + "</p>", 50_000, True, "script_heavy"),
+        ("<p>hi</p>", 0, True, "no_text"),
+        ("<p>" + "word " * 40 + "</p>", 0, False, "text"),
+    ],
+)
+def test_verdict(html: str, script_chars: int, needs_browser: bool, reason: str) -> None:
+    verdict = _stats(html, script_chars).verdict()
+    assert (verdict.needs_browser, verdict.reason) == (needs_browser, reason)
+
+
+def test_improved_on() -> None:
+    shell = _stats(_SHELL)
+    assert _stats(_ARTICLE).improved_on(shell)
+    # A little more text counts once the mount point is gone.
+    assert _stats("<p>a few words</p>").improved_on(shell)
+    assert not _stats("<p>a few words</p>").improved_on(_stats("<p>a few words too</p>"))
+    assert not _stats(_SHELL).improved_on(shell)
+
+
+def test_escalation_stops_on_hosts_where_the_browser_loses(tmp_path: Path) -> None:
+    async def scenario() -> None:
+        classifier = RenderClassifier(tmp_path / "catalog.sqlite3", min_samples=5)
+        for _ in range(4):
+            await classifier.record_escalation("lose.example", won=False)
+        assert await classifier.should_escalate("lose.example")
+        await classifier.record_escalation("lose.example", won=False)
+        assert not await classifier.should_escalate("lose.example")
+
+        for won in (True, False, False, False, False):
+            await classifier.record_escalation("mixed.example", won=won)
+        assert await classifier.should_escalate("mixed.example")
+        classifier.close()
+
+    asyncio.run(scenario())
+
+
+def test_shell_hosts_go_straight_to_the_browser(tmp_path: Path) -> None:
+    async def scenario() -> None:
+        classifier = RenderClassifier(tmp_path / "catalog.sqlite3", js_heavy_hosts=["spa.example"], min_samples=3)
+        assert await classifier.prefers_browser("spa.example")
+        assert not await classifier.prefers_browser("shell.example")
+        for _ in range(3):
+            await classifier.record_http("shell.example", _stats(_SHELL).verdict())
+        assert await classifier.prefers_browser("shell.example")
+        classifier.close()
+
+    asyncio.run(scenario())
+
+
+class _Renderer:
+    def __init__(self, html: Optional[str] = None) -> None:
+        self.html = html
+
+    async def render(self, url: str, storage_state=None, cookies=None) -> str:
+        if self.html is None:
+            raise BrowserBusyError("Browser render queue is full, try again later.")
+        return self.html
+
+
+def _escalate(tmp_path: Path, renderer: _Renderer) -> tuple[int, int]:
+    async def scenario() -> tuple[int, int]:
+        blob_store = BlobStore(tmp_path / "snapshots", tmp_path / "catalog.sqlite3")
+        classifier = RenderClassifier(tmp_path / "catalog.sqlite3")
+        service = SnapshotService(
+            tmp_path / "snapshots",
+            "http://localhost/snapshots",
+            request_timeout=5,
+            browser_renderer=renderer,
+            blob_store=blob_store,
+            render_classifier=classifier,
+        )
+        service._client = httpx.AsyncClient(
+            transport=httpx.MockTransport(lambda request: httpx.Response(200, html=_SHELL))
+        )
+        await service.create_snapshot("https://spa.example/")
+        await service.aclose()
+        stats = await classifier.get("spa.example")
+        classifier.close()
+        blob_store.close()
+        return stats.escalations, stats.escalation_wins
+
+    return asyncio.run(scenario())
+
+
+def test_finished_renders_are_recorded(tmp_path: Path) -> None:
+    assert _escalate(tmp_path, _Renderer(_ARTICLE)) == (1, 1)
+
+
+def test_busy_browser_is_not_a_lost_escalation(tmp_path: Path) -> None:
+    assert _escalate(tmp_path, _Renderer()) == (0, 0)
@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import asyncio
+import os
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("boto3")
+moto = pytest.importorskip("moto")
+
+from backend.services.blob_store import BlobStore  # noqa: E402
+from backend.services.storage import S3Storage  # noqa: E402
+
+_BUCKET = "snapshots"
+_PART = 5 * 1024 * 1024
+
+
+@pytest.fixture
+def s3(monkeypatch: pytest.MonkeyPatch):
+    for name in ("AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY", "AWS_SESSION_TOKEN"):
+        monkeypatch.setenv(name, "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    with moto.mock_aws():
+        import boto3
+
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket=_BUCKET)
+        yield client
+
+
+def _storage(tmp_path: Path) -> S3Storage:
+    return S3Storage(
+        _BUCKET,
+        prefix="/pagecopy/",
+        region="us-east-1",
+        scratch_dir=tmp_path / "scratch",
+        multipart_threshold=_PART,
+        multipart_chunksize=_PART,
+    )
+
+
+def test_objects_round_trip(s3, tmp_path: Path) -> None:
+    async def scenario() -> None:
+        storage = _storage(tmp_path)
+        source = tmp_path / "page.html.gz"
+        source.write_bytes(b"0123456789")
+        await storage.put_file(
+            "objects/ab/page.html.gz",
+            source,
+            content_type="text/html",
+            content_encoding="gzip",
+            cache_control="public, max-age=60",
+        )
+        head = s3.head_object(Bucket=_BUCKET, Key="pagecopy/objects/ab/page.html.gz")
+        assert (head["ContentType"], head["ContentEncoding"], head["CacheControl"]) == (
+            "text/html",
+            "gzip",
+            "public, max-age=60",
+        )
+
+        assert await storage.exists("objects/ab/page.html.gz")
+        assert not await storage.exists("objects/ab/missing.html")
+        assert await storage.get("objects/ab/page.html.gz") == b"0123456789"
+        assert await storage.get("objects/ab/missing.html") is None
+        assert b"".join([chunk async for chunk in storage.stream("objects/ab/page.html.gz", 2, 5)]) == b"2345"
+        assert b"".join([chunk async for chunk in storage.stream("objects/ab/page.html.gz", 7)]) == b"789"
+        url = await storage.url_for("objects/ab/page.html.gz")
+        assert "/pagecopy/objects/ab/page.html.gz?" in url and "Signature" in url
+
+        await storage.put("assets/cd/a.css", b"a{}", content_type="text/css")
+        await storage.delete(["objects/ab/page.html.gz", "assets/cd/a.css", "objects/ab/missing.html"])
+        assert s3.list_objects_v2(Bucket=_BUCKET).get("KeyCount") == 0
+        assert not list((tmp_path / "scratch").iterdir())
+        await storage.aclose()
+
+    asyncio.run(scenario())
+
+
+def test_large_files_are_uploaded_in_parts(s3, tmp_path: Path) -> None:
+    async def scenario() -> None:
+        storage = _storage(tmp_path)
+        data = os.urandom(2 * _PART + 1024)
+        await storage.put("assets/ef/big.bin", data)
+        head = s3.head_object(Bucket=_BUCKET, Key="pagecopy/assets/ef/big.bin")
+        # Multipart uploads get an ETag with the part count after the dash.
+        assert head["ETag"].strip('"').endswith("-3")
+        assert await storage.get("assets/ef/big.bin") == data
+        await storage.aclose()
+
+    asyncio.run(scenario())
+
+
+def test_blob_store_on_s3(s3, tmp_path: Path) -> None:
+    async def scenario() -> None:
+        storage = _storage(tmp_path)
+        blob_store = BlobStore(tmp_path / "snapshots", tmp_path / "catalog.sqlite3", storage=storage)
+        document = b"<p>hello</p>" * 100
+        ref = await blob_store.put(blob_store.digest_of(document), document)
+        assert await storage.get(ref.relative_path) == document
+        assert await blob_store.acquire(ref.digest) is not None
+
+        await blob_store.release([ref.digest])
+        assert await storage.exists(ref.relative_path)
+        await blob_store.release([ref.digest])
+        assert not await storage.exists(ref.relative_path)
+        blob_store.close()
+        await storage.aclose()
+
+    asyncio.run(scenario())
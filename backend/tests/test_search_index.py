@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import asyncio
+from pathlib import Path
+
+from backend.scripts.index_snapshots import _unindexed_documents
+from backend.services.blob_store import BlobStore
+from backend.services.search_index import SearchIndex, extract_document
+
+_LEGACY = (
+    b"<!--\nArchived from: https://old.example/page\nCaptured at (UTC): 2023-05-01T10:00:00+00:00\n"
+    b"Generated by PageCopy Snapshot Service\n-->\n<html><head><title>Old page</title></head>"
+    b"<body><p>legacyword</p></body></html>"
+)
+
+
+def test_extract_document_reads_legacy_capture_comments() -> None:
+    document = extract_document("d" * 64, _LEGACY)
+    assert document.original_url == "https://old.example/page"
+    assert document.captured_at == "2023-05-01T10:00:00+00:00"
+    assert document.title == "Old page"
+
+
+def test_legacy_snapshot_files_are_indexed_and_searchable(tmp_path: Path) -> None:
+    async def scenario() -> None:
+        store = BlobStore(tmp_path / "snapshots", tmp_path / "catalog.sqlite3")
+        index = SearchIndex(tmp_path / "catalog.sqlite3")
+        name = "20230501100000_0123456789.html"
+        (store.root / name).write_bytes(_LEGACY)
+        (store.root / "notes.html").write_bytes(_LEGACY)
+
+        found = [item async for item in _unindexed_documents(index, store)]
+        assert [(digest, path) for digest, _, path in found] == [(store.digest_of(_LEGACY), name)]
+        digest, document, path = found[0]
+        assert await index.add([extract_document(digest, document, path=path)]) == 1
+        assert [item async for item in _unindexed_documents(index, store)] == []
+
+        hits, _ = await index.search("legacyword")
+        assert [(hit.original_url, hit.relative_path) for hit in hits] == [("https://old.example/page", name)]
+        # No catalog row, but the file is still there: pruning keeps it.
+        assert await index.prune() == 0
+        assert len((await index.search("legacyword"))[0]) == 1
+        index.close()
+        store.close()
+
+    asyncio.run(scenario())
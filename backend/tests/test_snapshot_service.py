@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import asyncio
+import codecs
+from pathlib import Path
+
+import httpx
+import pytest
+
+from backend.services.batch_runner import BatchRunner
+from backend.services.blob_store import BlobStore
+from backend.services.snapshot_service import SnapshotService, SnapshotUnsupportedError
+from backend.services.validator_store import ValidatorStore
+
+_ETAG = '"v1"'
+_LAST_MODIFIED = "Wed, 21 Oct 2026 07:28:00 GMT"
+
+
+def _service(tmp_path: Path, handler) -> tuple[SnapshotService, BlobStore]:
+    blob_store = BlobStore(tmp_path / "snapshots", tmp_path / "catalog.sqlite3")
+    service = SnapshotService(
+        tmp_path / "snapshots",
+        "http://localhost/snapshots",
+        request_timeout=5,
+        blob_store=blob_store,
+        validator_store=ValidatorStore(tmp_path / "validators.sqlite3"),
+    )
+    service._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return service, blob_store
+
+
+class _ConditionalOrigin:
+    def __init__(self) -> None:
+        self.requests: list[httpx.Request] = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        if request.headers.get("if-none-match") == _ETAG:
+            return httpx.Response(304, headers={"etag": _ETAG})
+        return httpx.Response(
+            200,
+            headers={"content-type": "text/html", "etag": _ETAG, "last-modified": _LAST_MODIFIED},
+            text="<html><body><p>unchanged page</p></body></html>",
+        )
+
+
+def test_not_modified_reuses_the_stored_snapshot(tmp_path: Path) -> None:
+    async def scenario() -> None:
+        origin = _ConditionalOrigin()
+        service, blob_store = _service(tmp_path, origin)
+        runner = BatchRunner(service)
+        first = await runner.capture("https://example.com/page")
+        second = await runner.capture("https://example.com/page")
+        await service.aclose()
+
+        assert "if-none-match" not in origin.requests[0].headers
+        assert origin.requests[1].headers["if-none-match"] == _ETAG
+        assert origin.requests[1].headers["if-modified-since"] == _LAST_MODIFIED
+        assert not first.metadata.unchanged and second.metadata.unchanged
+        assert second.metadata.content_hash == first.metadata.content_hash
+        assert second.metadata.relative_url == first.metadata.relative_url
+        assert second.to_history_entry().unchanged
+        # One blob, referenced by both captures.
+        rows = blob_store._connection.execute("SELECT digest, refcount FROM blobs").fetchall()
+        assert [(row["digest"], row["refcount"]) for row in rows] == [(first.metadata.content_hash, 2)]
+        service.validator_store.close()
+        blob_store.close()
+
+    asyncio.run(scenario())
+
+
+def test_not_modified_refetches_when_the_snapshot_was_deleted(tmp_path: Path) -> None:
+    async def scenario() -> None:
+        origin = _ConditionalOrigin()
+        service, blob_store = _service(tmp_path, origin)
+        first = await service.create_snapshot("https://example.com/page")
+        await service.release_snapshots([first.content_hash])
+        second = await service.create_snapshot("https://example.com/page")
+        await service.aclose()
+
+        assert [request.headers.get("if-none-match") for request in origin.requests] == [None, _ETAG, None]
+        assert not second.unchanged and second.content_hash == first.content_hash
+        assert await blob_store.lookup(second.content_hash) is not None
+        service.validator_store.close()
+        blob_store.close()
+
+    asyncio.run(scenario())
+
+
+async def _chunked(body: bytes, size: int):
+    for start in range(0, len(body), size):
+        yield body[start : start + size]
+
+
+def _decode(tmp_path: Path, content_type: str, body: bytes, chunk_size: int = 7) -> str:
+    async def scenario() -> str:
+        service, blob_store = _service(tmp_path, lambda request: httpx.Response(404))
+        response = httpx.Response(200, headers={"content-type": content_type}, content=_chunked(body, chunk_size))
+        text = "".join([chunk async for chunk in service._decode_body(response)])
+        await service.aclose()
+        service.validator_store.close()
+        blob_store.close()
+        return text
+
+    return asyncio.run(scenario())
+
+
+_PADDING = "<!--" + "x" * 2000 + "-->"
+
+
+@pytest.mark.parametrize(
+    ("content_type", "body", "expected"),
+    [
+        # The header wins over a contradicting <meta>.
+        ("text/html; charset=utf-8", '<meta charset="windows-1252"><p>café</p>'.encode(), "café"),
+        # Without a header charset, <meta> decides, even when it straddles chunk boundaries.
+        ("text/html", '<meta charset="gbk"><p>中文</p>'.encode("gbk"), "中文"),
+        (
+            "text/html",
+            '<meta http-equiv="Content-Type" content="text/html; charset=Shift_JIS"><p>日本</p>'.encode("shift_jis"),
+            "日本",
+        ),
+        # Labels browsers widen: iso-8859-1 is decoded as windows-1252.
+        ("text/html; charset=iso-8859-1", "<p>\u201cq\u201d</p>".encode("cp1252"), "\u201cq\u201d"),
+        # A BOM beats the header.
+        ("text/html; charset=windows-1252", codecs.BOM_UTF8 + "<p>café</p>".encode(), "<p>café</p>"),
+        # No hints at all, or an unknown label: UTF-8, with undecodable bytes replaced.
+        ("text/html", "<p>café</p>".encode(), "café"),
+        ("text/html; charset=x-unknown", b"<p>caf\xe9</p>", "caf\ufffd"),
+        # <meta> past the prescan window is ignored.
+        ("text/html", (_PADDING + '<meta charset="gbk"><p>中文</p>').encode("gbk"), "\ufffd"),
+    ],
+)
+def test_decode_body_charset(tmp_path: Path, content_type: str, body: bytes, expected: str) -> None:
+    assert expected in _decode(tmp_path, content_type, body)
+
+
+def test_body_over_the_cap_is_abandoned_mid_stream(tmp_path: Path) -> None:
+    sent: list[int] = []
+
+    async def endless():
+        for index in range(1000):
+            sent.append(index)
+            yield b"<p>" + b"x" * 1020 + b"</p>"
+
+    async def scenario() -> None:
+        # Chunked, so there is no Content-Length to reject the response up front.
+        service, blob_store = _service(
+            tmp_path, lambda request: httpx.Response(200, headers={"content-type": "text/html"}, content=endless())
+        )
+        service.max_body_bytes = 16 * 1024
+        with pytest.raises(SnapshotUnsupportedError, match="16384 byte limit"):
+            await service.create_snapshot("https://example.com/huge")
+        await service.aclose()
+
+        assert len(sent) <= 17
+        assert blob_store._connection.execute("SELECT COUNT(*) FROM blobs").fetchone()[0] == 0
+        assert not list((tmp_path / "snapshots").rglob("*.html"))
+        service.validator_store.close()
+        blob_store.close()
+
+    asyncio.run(scenario())
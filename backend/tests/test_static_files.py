@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import asyncio
+import gzip
+from pathlib import Path
+
+import httpx
+from starlette.applications import Starlette
+from starlette.routing import Mount
+
+from backend.core.static_files import IMMUTABLE_CACHE_CONTROL, SnapshotStaticFiles
+
+_DIGEST = "ab" + "0" * 62
+_KEY = f"objects/ab/{_DIGEST}.html"
+_BODY = b"<!--\nArchived from: https://example.com/\n-->\n<html><body>" + b"<p>hello</p>" * 50 + b"</body></html>"
+_BROTLI = b"pretend-brotli-bytes"
+
+
+def _root(tmp_path: Path, keep_plain: bool = True) -> Path:
+    root = tmp_path / "snapshots"
+    (root / "objects" / "ab").mkdir(parents=True)
+    if keep_plain:
+        (root / _KEY).write_bytes(_BODY)
+    (root / f"{_KEY}.gz").write_bytes(gzip.compress(_BODY))
+    (root / f"{_KEY}.br").write_bytes(_BROTLI)
+    (root / "legacy.html").write_bytes(b"<p>legacy</p>")
+    return root
+
+
+def _get(root: Path, path: str, **headers: str) -> tuple[httpx.Response, bytes]:
+    """The response and its body exactly as sent, without httpx undoing Content-Encoding."""
+    app = Starlette(routes=[Mount("/snapshots", SnapshotStaticFiles(directory=root))])
+
+    async def scenario() -> tuple[httpx.Response, bytes]:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            headers.setdefault("accept-encoding", "identity")
+            async with client.stream("GET", f"/snapshots/{path}", headers=headers) as response:
+                return response, b"".join([chunk async for chunk in response.aiter_raw()])
+
+    return asyncio.run(scenario())
+
+
+def test_precompressed_copy_is_negotiated(tmp_path: Path) -> None:
+    root = _root(tmp_path)
+    cases = {
+        "br, gzip": ("br", _BROTLI),
+        "gzip;q=1, br;q=0": ("gzip", (root / f"{_KEY}.gz").read_bytes()),
+        "*": ("br", _BROTLI),
+        "identity": (None, _BODY),
+        "gzip;q=0": (None, _BODY),
+    }
+    for accept, (encoding, body) in cases.items():
+        response, raw = _get(root, _KEY, **{"accept-encoding": accept})
+        assert response.status_code == 200, accept
+        assert response.headers.get("content-encoding") == encoding, accept
+        assert raw == body, accept
+        assert response.headers["vary"] == "Accept-Encoding"
+        assert response.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+        assert response.headers["content-type"].startswith("text/html")
+
+
+def test_ranges_apply_to_the_compressed_copy(tmp_path: Path) -> None:
+    root = _root(tmp_path)
+    compressed = (root / f"{_KEY}.gz").read_bytes()
+    response, raw = _get(root, _KEY, **{"accept-encoding": "gzip", "range": "bytes=0-9"})
+    assert response.status_code == 206
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["content-range"] == f"bytes 0-9/{len(compressed)}"
+    assert raw == compressed[:10]
+
+    response, raw = _get(root, _KEY, range="bytes=-5")
+    assert (response.status_code, raw) == (206, _BODY[-5:])
+    assert "content-encoding" not in response.headers
+
+
+def test_etag_is_weak_and_answers_conditional_requests(tmp_path: Path) -> None:
+    root = _root(tmp_path)
+    response, _ = _get(root, _KEY, **{"accept-encoding": "gzip"})
+    etag = response.headers["etag"]
+    assert etag == f'W/"{_DIGEST}-gzip"'
+    assert _get(root, _KEY, **{"accept-encoding": "identity"})[0].headers["etag"] == f'W/"{_DIGEST}"'
+
+    for if_none_match in (etag, etag.removeprefix("W/"), f'"other", {etag}', "*"):
+        response, raw = _get(root, _KEY, **{"accept-encoding": "gzip", "if-none-match": if_none_match})
+        assert (response.status_code, raw) == (304, b""), if_none_match
+        assert response.headers["etag"] == etag
+    # Another representation's tag does not match.
+    assert _get(root, _KEY, **{"accept-encoding": "br", "if-none-match": etag})[0].status_code == 200
+
+    # A weak tag cannot validate a range; the full body is sent instead.
+    response, raw = _get(root, _KEY, range="bytes=0-9", **{"if-range": f'W/"{_DIGEST}"'})
+    assert (response.status_code, raw) == (200, _BODY)
+    last_modified = response.headers["last-modified"]
+    response, raw = _get(root, _KEY, range="bytes=0-9", **{"if-range": last_modified})
+    assert (response.status_code, raw) == (206, _BODY[:10])
+
+
+def test_gzip_only_copy_is_decompressed_for_identity_clients(tmp_path: Path) -> None:
+    root = _root(tmp_path, keep_plain=False)
+    response, raw = _get(root, _KEY)
+    assert (response.status_code, raw) == (200, _BODY)
+    assert "content-encoding" not in response.headers
+    assert response.headers["etag"] == f'W/"{_DIGEST}"'
+    response, raw = _get(root, _KEY, **{"if-none-match": f'"{_DIGEST}"'})
+    assert (response.status_code, raw) == (304, b"")
+
+
+def test_other_files_are_served_as_before(tmp_path: Path) -> None:
+    root = _root(tmp_path)
+    response, raw = _get(root, "legacy.html", **{"accept-encoding": "gzip"})
+    assert (response.status_code, raw) == (200, b"<p>legacy</p>")
+    assert "immutable" not in response.headers.get("cache-control", "")
+    assert _get(root, "objects/ab/missing.html")[0].status_code == 404
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import asyncio
+from pathlib import Path
+
+import httpx
+import pytest
+
+from backend.services.batch_runner import BatchRunner
+from backend.services.blob_store import BlobStore
+from backend.services.history_repository import HistoryRepository
+from backend.services.snapshot_service import SnapshotService
+from backend.services.warc_archive import (
+    DIGEST_HEADER,
+    PATH_HEADER,
+    WarcFormatError,
+    WarcWriter,
+    export_warcs,
+    import_warcs,
+    lookup_cdx,
+    read_record_at,
+)
+
+_BASE_URL = "http://localhost/snapshots"
+_URLS = ["https://a.example/one", "https://b.example/two"]
+
+
+def _page(request: httpx.Request) -> httpx.Response:
+    return httpx.Response(200, html=f"<html><body><p>{request.url.path}</p></body></html>")
+
+
+async def _capture(root: Path) -> tuple[BlobStore, HistoryRepository]:
+    blob_store = BlobStore(root / "snapshots", root / "catalog.sqlite3")
+    history = HistoryRepository(root / "history.sqlite3")
+    service = SnapshotService(root / "snapshots", _BASE_URL, request_timeout=5, blob_store=blob_store)
+    service._client = httpx.AsyncClient(transport=httpx.MockTransport(_page))
+    outcomes = await BatchRunner(service).run(_URLS)
+    await history.append(outcome.to_history_entry() for outcome in outcomes)
+    await service.aclose()
+    return blob_store, history
+
+
+def test_export_lookup_and_import_round_trip(tmp_path: Path) -> None:
+    async def scenario() -> None:
+        blob_store, history = await _capture(tmp_path / "source")
+        summary = await export_warcs(history, blob_store, tmp_path / "warc", _BASE_URL)
+        assert (summary.entries, summary.blobs, summary.missing) == (2, 2, 0)
+        assert summary.index is not None
+
+        line = lookup_cdx(summary.index, _URLS[0])
+        assert line is not None and line.original == _URLS[0]
+        record = read_record_at(tmp_path / "warc" / line.filename, line.offset, line.length)
+        stored = await blob_store.read(record.header(PATH_HEADER))
+        assert record.type == "resource" and record.payload == stored
+
+        target_store = BlobStore(tmp_path / "target" / "snapshots", tmp_path / "target" / "catalog.sqlite3")
+        target_history = HistoryRepository(tmp_path / "target" / "history.sqlite3")
+        first = await import_warcs(summary.files, target_history, target_store, _BASE_URL)
+        assert (first.entries, first.blobs, first.skipped) == (2, 2, 0)
+        second = await import_warcs(summary.files, target_history, target_store, _BASE_URL)
+        assert (second.entries, second.blobs, second.skipped) == (0, 0, 2)
+
+        entries, _ = await target_history.list_page(10)
+        assert sorted(entry.original_url for entry in entries) == _URLS
+        for entry in entries:
+            info = await target_store.lookup(entry.content_hash)
+            assert info is not None
+            assert await target_store.read(info.relative_path) == await blob_store.read(info.relative_path)
+        for store, repository in ((blob_store, history), (target_store, target_history)):
+            store.close()
+            repository.close()
+
+    asyncio.run(scenario())
+
+
+def test_import_rejects_documents_that_do_not_match_their_digest(tmp_path: Path) -> None:
+    async def scenario() -> None:
+        blob_store, history = await _capture(tmp_path / "source")
+        entries, _ = await history.list_page(1)
+        digest = entries[0].content_hash
+        writer = WarcWriter(tmp_path / "warc", "tampered")
+        writer.write(
+            "resource",
+            {
+                "WARC-Target-URI": entries[0].original_url,
+                DIGEST_HEADER: digest,
+                PATH_HEADER: blob_store.relative_path(digest),
+            },
+            b"<!--\nArchived from: https://evil.example/\n-->\n<p>not the captured page</p>",
+        )
+        writer.close()
+        target_store = BlobStore(tmp_path / "target" / "snapshots", tmp_path / "target" / "catalog.sqlite3")
+        target_history = HistoryRepository(tmp_path / "target" / "history.sqlite3")
+        with pytest.raises(WarcFormatError):
+            await import_warcs(writer.files, target_history, target_store, _BASE_URL)
+        # Nothing is stored under the digest, so later captures of the real page cannot dedupe onto it.
+        assert await target_store.lookup(digest) is None
+        for store, repository in ((blob_store, history), (target_store, target_history)):
+            store.close()
+            repository.close()
+
+    asyncio.run(scenario())
@@ -5,8 +5,9 @@ import type {
   HistoryResponse,
   SnapshotHistoryEntry,
   SnapshotRequestBody,
-  SnapshotResponse,
   SnapshotResult,
+  SnapshotStatus,
+  SnapshotStreamItem,
 } from './types';
 
 const API_BASE_URL = import.meta.env.VITE_API_BASE_URL ?? 'http://localhost:8000';
@@ -151,6 +152,9 @@ function App() {
   const [formError, setFormError] = useState<string | null>(null);
   const [requestError, setRequestError] = useState<string | null>(null);
   const [historyNotice, setHistoryNotice] = useState<string | null>(null);
+  const [historyCursor, setHistoryCursor] = useState<string | null>(null);
+  const [historyStatusFilter, setHistoryStatusFilter] = useState<'' | SnapshotStatus>('');
+  const [historyHostFilter, setHistoryHostFilter] = useState('');
   const [selectedHistoryIds, setSelectedHistoryIds] = useState<Set<string>>(new Set());
   const [cookieHeader, setCookieHeader] = useState('');
 
@@ -179,14 +183,25 @@ function App() {
     });
   }, [history, allHistoryIds]);
 
-  const fetchHistory = async () => {
+  const fetchHistory = async (cursor?: string | null) => {
     try {
-      const response = await fetch(`${API_BASE_URL}/api/history?limit=100`);
+      const params = new URLSearchParams({ limit: '100' });
+      if (cursor) {
+        params.set('cursor', cursor);
+      }
+      if (historyStatusFilter) {
+        params.set('status', historyStatusFilter);
+      }
+      if (historyHostFilter.trim()) {
+        params.set('host', historyHostFilter.trim());
+      }
+      const response = await fetch(`${API_BASE_URL}/api/history?${params.toString()}`);
       if (!response.ok) {
         throw new Error('无法获取历史记录 / Failed to load history');
       }
       const data: HistoryResponse = await response.json();
-      setHistory(data.items);
+      setHistory((prev) => (cursor ? [...prev, ...data.items] : data.items));
+      setHistoryCursor(data.next_cursor ?? null);
       setHistoryError(null);
     } catch (error) {
       console.error(error);
@@ -198,7 +213,7 @@ function App() {
 
   useEffect(() => {
     fetchHistory();
-  }, []);
+  }, [historyStatusFilter]);
 
   const handleSubmit = async (event: FormEvent<HTMLFormElement>) => {
     event.preventDefault();
@@ -224,21 +239,57 @@ function App() {
       cookie_header: cookieHeader.trim() ? cookieHeader.trim() : null,
     };
 
+    // 先占位，结果按完成顺序逐条填充 / Placeholders are filled in as each URL completes
+    setResults(
+      normalizedUrls.map((url) => ({
+        original_url: url,
+        archived_url: null,
+        archived_relative_url: null,
+        status: 'pending',
+        error: null,
+      })),
+    );
+
     try {
-      const response = await fetch(`${API_BASE_URL}/api/snapshots`, {
+      const response = await fetch(`${API_BASE_URL}/api/snapshots/stream`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
+          Accept: 'application/x-ndjson',
         },
         body: JSON.stringify(body),
       });
 
-      if (!response.ok) {
+      if (!response.ok || !response.body) {
         throw new Error(`请求失败，状态码 ${response.status}`);
       }
 
-      const data: SnapshotResponse = await response.json();
-      setResults(data.results);
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffered = '';
+      const applyLine = (line: string) => {
+        if (!line.trim()) {
+          return;
+        }
+        const item: SnapshotStreamItem = JSON.parse(line);
+        const { index, ...result } = item;
+        setResults((prev) => {
+          const next = [...prev];
+          next[index] = result;
+          return next;
+        });
+      };
+      for (;;) {
+        const { done, value } = await reader.read();
+        if (done) {
+          break;
+        }
+        buffered += decoder.decode(value, { stream: true });
+        const lines = buffered.split('\n');
+        buffered = lines.pop() ?? '';
+        lines.forEach(applyLine);
+      }
+      applyLine(buffered + decoder.decode());
       await fetchHistory();
     } catch (error) {
       console.error(error);
@@ -472,10 +523,32 @@ function App() {
             >
               复制全部可用链接
             </button>
-            <button type="button" onClick={fetchHistory}>
+            <button type="button" onClick={() => fetchHistory()}>
               刷新
             </button>
           </div>
+          <div className="history-filters">
+            <select
+              value={historyStatusFilter}
+              onChange={(event) => setHistoryStatusFilter(event.target.value as '' | SnapshotStatus)}
+              aria-label="Status filter"
+            >
+              <option value="">全部状态 / All</option>
+              <option value="success">success</option>
+              <option value="failed">failed</option>
+            </select>
+            <input
+              type="text"
+              placeholder="按域名筛选 / Filter by host"
+              value={historyHostFilter}
+              onChange={(event) => setHistoryHostFilter(event.target.value)}
+              onKeyDown={(event) => {
+                if (event.key === 'Enter') {
+                  fetchHistory();
+                }
+              }}
+            />
+          </div>
           {historyNotice && <p className="copy-feedback">{historyNotice}</p>}
         </div>
         {history.length > 0 ? (
@@ -551,6 +624,11 @@ function App() {
         ) : (
           <p className="helper">暂无历史记录，转存完成后会出现在这里。</p>
         )}
+        {historyCursor && (
+          <button type="button" className="load-more" onClick={() => fetchHistory(historyCursor)}>
+            加载更多 / Load more
+          </button>
+        )}
       </section>
     </div>
   );
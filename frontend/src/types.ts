@@ -1,23 +1,33 @@
 export type SnapshotStatus = 'success' | 'failed';
 
+export type SnapshotResultStatus = SnapshotStatus | 'pending';
+
 export interface SnapshotRequestBody {
   urls: string[];
   force_browser: boolean;
   cookie_header?: string | null;
+  bypass_cache?: boolean;
 }
 
 export interface SnapshotResult {
   original_url: string;
   archived_url: string | null;
   archived_relative_url: string | null;
-  status: SnapshotStatus;
+  status: SnapshotResultStatus;
   error: string | null;
+  unchanged?: boolean;
+  reused?: boolean;
+  timings?: Record<string, number> | null;
 }
 
 export interface SnapshotResponse {
   results: SnapshotResult[];
 }
 
+export interface SnapshotStreamItem extends SnapshotResult {
+  index: number;
+}
+
 export interface SnapshotHistoryEntry {
   id: string;
   original_url: string;
@@ -26,8 +36,12 @@ export interface SnapshotHistoryEntry {
   status: SnapshotStatus;
   error: string | null;
   captured_at: string;
+  content_hash?: string | null;
+  unchanged?: boolean;
+  timings?: Record<string, number> | null;
 }
 
 export interface HistoryResponse {
   items: SnapshotHistoryEntry[];
+  next_cursor: string | null;
 }